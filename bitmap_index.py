@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Bitmap Indexes for the Square OLAP Cube
+Compressed (roaring-style) bitmaps of fact-row positions for every value of
+the low-cardinality attributes slices filter on, so a multi-predicate slice
+is a few bitmap AND/OR operations before any fact column is read
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from dimension_store import dimension
+from star_schema import cache_dir, load_table, store_path, table_rows
+
+# Rows are split by the high 16 bits of their position into containers of
+# 65536; a container holds a sorted uint16 array up to this many members and
+# a 1024-word bitmap above it
+CONTAINER_BITS = 16
+CONTAINER_SIZE = 1 << CONTAINER_BITS
+ARRAY_LIMIT = 4096
+
+# Indexed attributes per fact table: the attribute name maps to the fact key
+# that joins its dimension, or None for a column of the fact itself
+INDEXED_ATTRIBUTES = {
+    'fact_sales_transaction': {
+        'customer_segment': ('customer_sk', 'dim_customer'),
+        'loyalty_tier': ('customer_sk', 'dim_customer'),
+        'is_weekend': ('date_sk', 'dim_date'),
+        'is_holiday': ('date_sk', 'dim_date'),
+        'is_peak_hour': ('time_sk', 'dim_time'),
+        'time_period': ('time_sk', 'dim_time'),
+        'item_type': ('item_sk', 'dim_item'),
+        'payment_type': ('payment_method_sk', 'dim_payment_method'),
+        'is_refund': None,
+        'is_void': None,
+        'is_comp': None,
+        'transaction_status': None,
+    },
+    'fact_item_sales': {
+        'is_weekend': ('date_sk', 'dim_date'),
+        'item_type': ('item_sk', 'dim_item'),
+        'is_returned': None,
+        'is_voided': None,
+        'is_comped': None,
+    },
+}
+
+
+def to_words(members):
+    """1024-word bitmap of a container's sorted uint16 members"""
+    bits = np.zeros(CONTAINER_SIZE, dtype=bool)
+    bits[members] = True
+    return np.packbits(bits, bitorder='little').view('<u8')
+
+
+def to_members(words):
+    """Sorted uint16 members of a 1024-word bitmap"""
+    bits = np.unpackbits(words.view(np.uint8), bitorder='little')
+    return np.flatnonzero(bits).astype(np.uint16)
+
+
+def normalize(words):
+    """Cheapest container for a bitmap: array when sparse, words when dense, None when empty"""
+    count = int(np.bitwise_count(words).sum())
+    if count == 0:
+        return None
+    return to_members(words) if count <= ARRAY_LIMIT else words
+
+
+def as_words(container):
+    """Container as a 1024-word bitmap"""
+    return container if container.dtype == np.uint64 else to_words(container)
+
+
+class Bitmap:
+    """Set of row positions stored as roaring-style array and bitmap containers"""
+
+    def __init__(self, containers=None):
+        self.containers = dict(sorted((containers or {}).items()))
+
+    @classmethod
+    def from_positions(cls, positions):
+        """Bitmap of an array of row positions"""
+        positions = np.unique(np.asarray(positions, dtype=np.int64))
+        high = positions >> CONTAINER_BITS
+        bounds = np.flatnonzero(np.diff(high)) + 1
+        containers = {}
+        for chunk in np.split(positions, bounds) if len(positions) else []:
+            members = (chunk & (CONTAINER_SIZE - 1)).astype(np.uint16)
+            containers[int(chunk[0] >> CONTAINER_BITS)] = \
+                members if len(members) <= ARRAY_LIMIT else to_words(members)
+        return cls(containers)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Bitmap of the True positions of a boolean mask"""
+        return cls.from_positions(np.flatnonzero(mask))
+
+    @classmethod
+    def full(cls, size):
+        """Bitmap of every position in range(size)"""
+        return cls.from_positions(np.arange(size))
+
+    def __and__(self, other):
+        containers = {}
+        for key in self.containers.keys() & other.containers.keys():
+            left, right = self.containers[key], other.containers[key]
+            if left.dtype == np.uint16 and right.dtype == np.uint16:
+                both = np.intersect1d(left, right, assume_unique=True)
+                if len(both):
+                    containers[key] = both
+            elif left.dtype == np.uint16 or right.dtype == np.uint16:
+                members, words = (left, right) if left.dtype == np.uint16 else (right, left)
+                kept = members[(words[members >> 6] >> (members & 63).astype(np.uint64)) & 1 == 1]
+                if len(kept):
+                    containers[key] = kept
+            else:
+                merged = normalize(left & right)
+                if merged is not None:
+                    containers[key] = merged
+        return Bitmap(containers)
+
+    def __or__(self, other):
+        containers = dict(self.containers)
+        for key, right in other.containers.items():
+            left = containers.get(key)
+            if left is None:
+                containers[key] = right
+            elif left.dtype == np.uint16 and right.dtype == np.uint16 and len(left) + len(right) <= ARRAY_LIMIT:
+                containers[key] = np.union1d(left, right)
+            else:
+                containers[key] = normalize(as_words(left) | as_words(right))
+        return Bitmap(containers)
+
+    def __sub__(self, other):
+        containers = {}
+        for key, left in self.containers.items():
+            right = other.containers.get(key)
+            if right is None:
+                containers[key] = left
+                continue
+            if left.dtype == np.uint16:
+                kept = left[~np.isin(left, to_members(as_words(right)), assume_unique=True)]
+                kept = kept if len(kept) else None
+            else:
+                kept = normalize(left & ~as_words(right))
+            if kept is not None:
+                containers[key] = kept
+        return Bitmap(containers)
+
+    def invert(self, size):
+        """Complement within range(size)"""
+        return Bitmap.full(size) - self
+
+    def __len__(self):
+        return sum(len(container) if container.dtype == np.uint16 else int(np.bitwise_count(container).sum())
+                   for container in self.containers.values())
+
+    def positions(self):
+        """Sorted int64 row positions"""
+        parts = [(key << CONTAINER_BITS) + (container if container.dtype == np.uint16
+                                            else to_members(container)).astype(np.int64)
+                 for key, container in self.containers.items()]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    @property
+    def nbytes(self):
+        return sum(container.nbytes for container in self.containers.values())
+
+
+def attribute_values(fact, attribute, data_dir='.'):
+    """Value of an indexed attribute for every fact row, projected through its join"""
+    join = INDEXED_ATTRIBUTES[fact][attribute]
+    if join is None:
+        values = load_table(fact, columns=[attribute], data_dir=data_dir)[attribute]
+        return values.astype(object).to_numpy()
+    column, table = join
+    keys = load_table(fact, columns=[column], data_dir=data_dir)[column]
+    return dimension(table, data_dir).labels(keys, attribute)
+
+
+def index_path(fact, attribute, data_dir='.'):
+    """Cache file of an attribute's bitmaps for the current fact and dimension contents"""
+    join = INDEXED_ATTRIBUTES[fact][attribute]
+    tables = [fact] + ([join[1]] if join else [])
+    payload = json.dumps({'attribute': attribute, 'join': join,
+                          'stores': [store_path(table, data_dir).name for table in tables]})
+    digest = hashlib.sha256(payload.encode()).hexdigest()[:16]
+    return cache_dir(data_dir) / 'bitmaps' / f"{fact}.{attribute}-{digest}.pkl"
+
+
+def build_index(fact, attribute, data_dir='.'):
+    """One bitmap of fact-row positions per non-null attribute value"""
+    values = pd.Series(attribute_values(fact, attribute, data_dir))
+    present = values.notna().to_numpy()
+    codes, uniques = pd.factorize(values[present])
+    positions = np.flatnonzero(present)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {uniques[code]: Bitmap.from_positions(positions[order[bounds[code]:bounds[code + 1]]])
+            for code in range(len(uniques))}
+
+
+_indexes = {}
+
+
+def open_index(fact, attribute, data_dir='.'):
+    """Bitmaps of an attribute, built on first use or after the fact or dimension changes"""
+    if attribute not in INDEXED_ATTRIBUTES.get(fact, {}):
+        raise ValueError(f"{fact}.{attribute} is not bitmap indexed")
+    path = index_path(fact, attribute, data_dir)
+    if path not in _indexes:
+        if path.exists():
+            # Stored as plain container dicts so the file does not depend on
+            # the module the Bitmap class was pickled from
+            stored = pd.read_pickle(path)
+            _indexes[path] = {value: Bitmap(containers) for value, containers in stored.items()}
+        else:
+            index = build_index(fact, attribute, data_dir)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            for stale in path.parent.glob(f"{fact}.{attribute}-*.pkl"):
+                stale.unlink()
+            tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+            pd.to_pickle({value: bitmap.containers for value, bitmap in index.items()}, tmp_path)
+            os.replace(tmp_path, path)
+            _indexes[path] = index
+    return _indexes[path]
+
+
+def matches(value, wanted):
+    """Whether an indexed value equals a predicate value (flags also match 'true'/'false')"""
+    if isinstance(value, (bool, np.bool_)) and isinstance(wanted, str):
+        return str(value).lower() == wanted.lower()
+    return value == wanted
+
+
+def select(fact, predicates, data_dir='.'):
+    """Bitmap of fact rows matching {attribute: [values]}: OR within an attribute, AND across"""
+    result = None
+    for attribute, wanted in predicates.items():
+        index = open_index(fact, attribute, data_dir)
+        wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+        rows = Bitmap()
+        for value, bitmap in index.items():
+            if any(matches(value, item) for item in wanted):
+                rows = rows | bitmap
+        result = rows if result is None else result & rows
+    return Bitmap.full(table_rows(fact, data_dir)) if result is None else result
+
+
+def indexed(fact, attribute, join_column=None):
+    """Whether an attribute (reached through join_column, or on the fact itself) is indexed"""
+    join = INDEXED_ATTRIBUTES.get(fact, {}).get(attribute, False)
+    if join is False:
+        return False
+    return (join is None) if join_column is None else (join is not None and join[0] == join_column)
+
+
+def main():
+    """Build the indexes and time a sample multi-predicate slice against a scan"""
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    print("Bitmap Indexes")
+    print("=" * 40)
+    for fact, attributes in INDEXED_ATTRIBUTES.items():
+        print(f"\n{fact} ({table_rows(fact, data_dir):,} rows)")
+        for attribute in attributes:
+            index = open_index(fact, attribute, data_dir)
+            sizes = ', '.join(f"{value}={len(bitmap):,}" for value, bitmap in index.items())
+            print(f"  {attribute}: {sizes} ({sum(bitmap.nbytes for bitmap in index.values()):,} bytes)")
+
+    fact = 'fact_sales_transaction'
+    predicates = {'customer_segment': ['VIP'], 'is_weekend': [True], 'is_refund': [False]}
+    started = time.perf_counter()
+    rows = select(fact, predicates, data_dir)
+    indexed_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    keep = np.ones(table_rows(fact, data_dir), dtype=bool)
+    for attribute, wanted in predicates.items():
+        keep &= pd.Series(attribute_values(fact, attribute, data_dir)).isin(wanted).to_numpy()
+    scan_seconds = time.perf_counter() - started
+    if not np.array_equal(rows.positions(), np.flatnonzero(keep)):
+        raise AssertionError("bitmap slice disagrees with the scan")
+    print(f"\nSlice {predicates}: {len(rows):,} rows "
+          f"(bitmaps {indexed_seconds * 1000:.2f} ms, scan {scan_seconds * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
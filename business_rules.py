@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Declarative Business-Rule Engine for the Square OLAP Cube
+Rules are plain data (expressions over a table's columns and its dimension
+attributes); all rules of a table compile into one vectorized function that
+evaluates every predicate in a single pass per chunk
+"""
+
+import ast
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from referential_integrity import FOREIGN_KEYS
+from star_schema import SCHEMA, iter_chunks, load_table
+
+# Each rule: name, table, check (must hold), optional when (rows it applies to),
+# issue (reported with the violation count) and ok (printed when it passes).
+# Expressions use column names, dim_<name>.<attribute> lookups resolved through
+# the table's foreign key, arithmetic, comparisons, and/or/not and FUNCTIONS.
+RULES = [
+    {
+        'name': 'non_negative_net_sales',
+        'table': 'fact_sales_transaction',
+        'when': 'not is_refund',
+        'check': 'net_sales_amount >= 0',
+        'issue': "Negative sales amounts for non-refunds",
+        'ok': "No invalid negative sales amounts",
+    },
+    {
+        'name': 'positive_quantity',
+        'table': 'fact_sales_transaction',
+        'check': 'item_quantity > 0',
+        'issue': "Zero or negative quantities",
+        'ok': "All quantities are positive",
+    },
+    {
+        'name': 'extended_price',
+        'table': 'fact_sales_transaction',
+        'check': 'abs(extended_price - unit_price * item_quantity) <= 0.01',
+        'issue': "Extended price calculation errors",
+        'ok': "Extended price calculations are correct",
+    },
+    {
+        'name': 'item_tax_rate',
+        'table': 'fact_sales_transaction',
+        'check': 'abs(tax_amount - net_sales_amount * dim_item.tax_rate) <= 0.10',
+        'issue': "Tax calculation variances",
+        'ok': "Tax calculations are within acceptable range",
+    },
+    {
+        'name': 'item_sales_extended_price',
+        'table': 'fact_item_sales',
+        'check': 'abs(extended_price - unit_price * quantity_sold) <= 0.01',
+        'issue': "Item sales extended price errors",
+        'ok': "Item sales extended prices are correct",
+    },
+    {
+        'name': 'item_sales_total_cost',
+        'table': 'fact_item_sales',
+        'check': 'abs(total_cost - cost_per_unit * quantity_sold) <= 0.01',
+        'issue': "Item sales total cost errors",
+        'ok': "Item sales total costs are correct",
+    },
+    # Timestamps evaluate as int64 epoch seconds; overtime is paid at 1.5x
+    {
+        'name': 'labor_clock_order',
+        'table': 'fact_labor_cost',
+        'check': 'clock_out_time > clock_in_time',
+        'issue': "Shifts clocking out before they clock in",
+        'ok': "All shifts clock out after clocking in",
+    },
+    {
+        'name': 'labor_hours_worked',
+        'table': 'fact_labor_cost',
+        'check': 'abs(hours_worked - ((clock_out_time - clock_in_time) / 3600 - break_hours)) <= 0.01',
+        'issue': "Hours worked differ from clock span minus breaks",
+        'ok': "Hours worked match clock span minus breaks",
+    },
+    {
+        'name': 'labor_hours_split',
+        'table': 'fact_labor_cost',
+        'check': 'abs(regular_hours + overtime_hours - hours_worked) <= 0.01',
+        'issue': "Regular and overtime hours do not sum to hours worked",
+        'ok': "Regular and overtime hours sum to hours worked",
+    },
+    {
+        'name': 'labor_regular_pay',
+        'table': 'fact_labor_cost',
+        'check': 'abs(regular_pay - regular_hours * hourly_rate) <= 0.01',
+        'issue': "Regular pay calculation errors",
+        'ok': "Regular pay equals regular hours x rate",
+    },
+    {
+        'name': 'labor_overtime_pay',
+        'table': 'fact_labor_cost',
+        'check': 'abs(overtime_pay - overtime_hours * hourly_rate * 1.5) <= 0.01',
+        'issue': "Overtime pay calculation errors",
+        'ok': "Overtime pay equals overtime hours x 1.5 x rate",
+    },
+    {
+        'name': 'labor_total_cost',
+        'table': 'fact_labor_cost',
+        'check': 'abs(total_labor_cost - (regular_pay + overtime_pay)) <= 0.01',
+        'issue': "Total labor cost does not sum regular and overtime pay",
+        'ok': "Total labor cost sums regular and overtime pay",
+    },
+    {
+        'name': 'labor_loaded_cost',
+        'table': 'fact_labor_cost',
+        'check': 'abs(total_loaded_cost - (total_labor_cost + benefits_cost + payroll_tax_cost)) <= 0.01',
+        'issue': "Total loaded cost does not add up",
+        'ok': "Total loaded cost sums labor, benefits and payroll tax",
+    },
+]
+
+# Row identifier reported as the sample value for each table's violations
+SAMPLE_COLUMNS = {
+    'fact_sales_transaction': 'transaction_sk',
+    'fact_item_sales': 'item_sales_sk',
+    'fact_labor_cost': 'labor_cost_sk',
+    'bridge_transaction_modifier': 'transaction_sk',
+}
+
+FUNCTIONS = {
+    'abs': np.abs,
+    'round': np.round,
+    'minimum': np.minimum,
+    'maximum': np.maximum,
+    'isnull': pd.isna,
+    'notnull': pd.notna,
+    'where': np.where,
+}
+
+SAMPLE_LIMIT = 5
+
+# Globals of compiled rule and measure code: no builtins, only numpy and FUNCTIONS
+SAFE_GLOBALS = {'__builtins__': {}, 'np': np, **FUNCTIONS}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.Call,
+    ast.Name, ast.Attribute, ast.Constant, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow, ast.FloorDiv, ast.USub, ast.UAdd,
+    ast.Not, ast.Invert, ast.And, ast.Or, ast.BitAnd, ast.BitOr,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+
+class Vectorize(ast.NodeTransformer):
+    """Rewrite a rule expression into elementwise numpy form.
+
+    Columns become locals, dim_x.attr lookups become gathered locals,
+    and/or/not become &, |, ~ and chained comparisons are split.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = set()
+        self.lookups = set()
+
+    def generic_visit(self, node):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"unsupported syntax in rule: {type(node).__name__}")
+        return super().generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id in FUNCTIONS:
+            return node
+        if node.id not in SCHEMA[self.table]:
+            raise ValueError(f"unknown column {node.id} in {self.table}")
+        self.columns.add(node.id)
+        return ast.Name(id=f"c_{node.id}", ctx=ast.Load())
+
+    def visit_Attribute(self, node):
+        if not isinstance(node.value, ast.Name) or node.value.id not in SCHEMA:
+            raise ValueError("lookups must look like dim_<name>.<attribute>")
+        dimension, attribute = node.value.id, node.attr
+        if attribute not in SCHEMA[dimension]:
+            raise ValueError(f"unknown attribute {dimension}.{attribute}")
+        self.columns.add(lookup_column(self.table, dimension))
+        self.lookups.add((dimension, attribute))
+        return ast.Name(id=f"l_{dimension}__{attribute}", ctx=ast.Load())
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ValueError("only these functions are allowed: " + ", ".join(FUNCTIONS))
+        if node.keywords:
+            raise ValueError("keyword arguments are not allowed in rules")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_BoolOp(self, node):
+        values = [self.visit(value) for value in node.values]
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        combined = values[0]
+        for value in values[1:]:
+            combined = ast.BinOp(left=combined, op=op, right=value)
+        return combined
+
+    def visit_UnaryOp(self, node):
+        node = self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        node = self.generic_visit(node)
+        operands = [node.left] + node.comparators
+        parts = [ast.Compare(left=operands[i], ops=[op], comparators=[operands[i + 1]])
+                 for i, op in enumerate(node.ops)]
+        combined = parts[0]
+        for part in parts[1:]:
+            combined = ast.BinOp(left=combined, op=ast.BitAnd(), right=part)
+        return combined
+
+
+def lookup_column(table, dimension):
+    """The fact column that joins a table to a dimension, taken from FOREIGN_KEYS"""
+    columns = {fk.column for fk in FOREIGN_KEYS.get(table, [])
+               if fk.parent == dimension and fk.where is None}
+    if len(columns) != 1:
+        raise ValueError(f"cannot resolve a single join from {table} to {dimension}")
+    return columns.pop()
+
+
+def check_expression(tree, names):
+    """Reject any node outside ALLOWED_NODES, calls other than FUNCTIONS and names outside names"""
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"unsupported syntax: {type(node).__name__}")
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS
+                                           or node.keywords):
+            raise ValueError("only positional calls of these functions are allowed: " + ", ".join(FUNCTIONS))
+        if isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in names:
+            raise ValueError(f"unknown name {node.id}")
+        if isinstance(node, ast.Attribute) and node.attr.startswith('_'):
+            raise ValueError(f"private attribute {node.attr}")
+
+
+def vectorize(expression, visitor):
+    """Parse one rule expression, check it against the allowlist and return its vectorized source text"""
+    tree = ast.parse(expression, mode='eval')
+    check_expression(tree, set(SCHEMA[visitor.table]) | set(SCHEMA))
+    return ast.unparse(visitor.visit(tree).body)
+
+
+def compile_rules(table, rules=None):
+    """Compile every rule for a table into one function evaluated once per chunk.
+
+    Returns a dict with the rules, the columns to read, the lookups to resolve
+    and 'evaluate', which maps (columns, lookups) to one violation mask per rule.
+    """
+    rules = [rule for rule in (rules if rules is not None else RULES) if rule['table'] == table]
+    visitor = Vectorize(table)
+    lines = []
+    for position, rule in enumerate(rules):
+        check = vectorize(rule['check'], visitor)
+        violated = f"~np.asarray({check}, dtype=np.bool_)"
+        if rule.get('when'):
+            violated = f"np.asarray({vectorize(rule['when'], visitor)}, dtype=np.bool_) & {violated}"
+        lines.append(f"    v{position} = np.broadcast_to({violated}, (rows,))")
+
+    columns = sorted(visitor.columns)
+    body = [f"    c_{column} = columns[{column!r}]" for column in columns]
+    body += [f"    l_{dimension}__{attribute} = lookups[{f'{dimension}.{attribute}'!r}]"
+             for dimension, attribute in sorted(visitor.lookups)]
+    outputs = ", ".join(f"v{position}" for position in range(len(rules)))
+    source = "\n".join(["def evaluate(columns, lookups, rows):"] + body + lines +
+                       [f"    return ({outputs}{',' if len(rules) == 1 else ''})"])
+
+    namespace = dict(SAFE_GLOBALS)
+    exec(compile(source, f"<rules:{table}>", 'exec'), namespace)
+    sample_column = SAMPLE_COLUMNS.get(table, columns[0] if columns else None)
+    read_columns = sorted(set(columns) | ({sample_column} if sample_column else set()))
+    return {
+        'table': table,
+        'rules': rules,
+        'columns': read_columns,
+        'lookups': sorted(visitor.lookups),
+        'sample_column': sample_column,
+        'evaluate': namespace['evaluate'],
+        'source': source,
+    }
+
+
+def load_lookup(table, dimension, attribute, data=None, data_dir='.'):
+    """Sorted dimension keys and the attribute values aligned to them"""
+    key = next(fk.parent_key for fk in FOREIGN_KEYS[table] if fk.parent == dimension)
+    frame = data[dimension][[key, attribute]] if data is not None else \
+        load_table(dimension, columns=[key, attribute], data_dir=data_dir)
+    frame = frame.sort_values(key)
+    return frame[key].to_numpy(dtype=np.int64), column_array(frame[attribute])
+
+
+def column_array(series):
+    """Numpy view of a column suitable for vectorized rule evaluation"""
+    if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object:
+        return series.to_numpy(dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        epochs = series.to_numpy().astype('datetime64[s]').view(np.int64)
+        missing = series.isna().to_numpy()
+        return np.where(missing, np.nan, epochs) if missing.any() else epochs
+    if pd.api.types.is_extension_array_dtype(series.dtype):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return series.to_numpy()
+
+
+def gather(keys, values, wanted):
+    """Resolve each wanted key to its attribute value (NaN/None when missing)"""
+    wanted = np.asarray(wanted)
+    present = ~pd.isna(wanted)
+    if not len(keys):
+        present[:] = False
+        keys, values = np.zeros(1, dtype=np.int64), np.full(1, np.nan)
+    slot = np.zeros(len(wanted), dtype=np.int64)
+    slot[present] = np.searchsorted(keys, wanted[present].astype(np.int64))
+    slot = np.minimum(slot, len(keys) - 1)
+    found = present & (keys[slot] == np.where(present, wanted, -1))
+    result = values[slot].astype(np.float64 if values.dtype.kind in 'iub' else values.dtype)
+    result[~found] = np.nan if result.dtype.kind == 'f' else None
+    return result
+
+
+def prepare_lookups(rule_set, data=None, data_dir='.'):
+    """Load the dimension attributes a compiled rule set needs"""
+    table = rule_set['table']
+    return {(dimension, attribute): load_lookup(table, dimension, attribute, data, data_dir)
+            for dimension, attribute in rule_set['lookups']}
+
+
+def evaluate_chunk(rule_set, chunk, lookup_tables, tally):
+    """Evaluate every rule of the set on one chunk and tally the violations"""
+    table = rule_set['table']
+    columns = {column: column_array(chunk[column]) for column in rule_set['columns']}
+    lookups = {}
+    for (dimension, attribute), (keys, values) in lookup_tables.items():
+        join = lookup_column(table, dimension)
+        lookups[f"{dimension}.{attribute}"] = gather(keys, values, columns[join])
+
+    masks = rule_set['evaluate'](columns, lookups, len(chunk))
+    sample = chunk[rule_set['sample_column']] if rule_set['sample_column'] else None
+    for rule, mask in zip(rule_set['rules'], masks):
+        entry = tally.setdefault(rule['name'], {'count': 0, 'samples': []})
+        count = int(mask.sum())
+        entry['count'] += count
+        room = SAMPLE_LIMIT - len(entry['samples'])
+        if count and room > 0 and sample is not None:
+            entry['samples'].extend(sample[mask].head(room).tolist())
+
+
+def merge_tallies(tallies):
+    """Merge rule tallies from independent partitions, keeping samples in partition order"""
+    merged = {}
+    for tally in tallies:
+        for name, entry in tally.items():
+            target = merged.setdefault(name, {'count': 0, 'samples': []})
+            target['count'] += entry['count']
+            target['samples'].extend(entry['samples'][:SAMPLE_LIMIT - len(target['samples'])])
+    return merged
+
+
+def rule_checks(rules):
+    """(check, issue, ok message) triples for reporting"""
+    return [(rule['name'], rule['issue'], rule.get('ok', f"{rule['name']} holds")) for rule in rules]
+
+
+def rule_tables(rules=None):
+    """Tables that have at least one rule, in schema order"""
+    tables = {rule['table'] for rule in (rules if rules is not None else RULES)}
+    return [name for name in SCHEMA if name in tables]
+
+
+def load_rules(path):
+    """Read additional rules from a JSON file holding a list of rule objects"""
+    rules = json.loads(Path(path).read_text())
+    for rule in rules:
+        missing = {'name', 'table', 'check', 'issue'} - set(rule)
+        if missing:
+            raise ValueError(f"rule {rule.get('name', '?')} is missing {sorted(missing)}")
+    return rules
+
+
+def run_rules(rules=None, chunk_size=1_000_000, data_dir='.'):
+    """Evaluate all rules with one streamed pass per table"""
+    rules = rules if rules is not None else RULES
+    tally = {}
+    for table in rule_tables(rules):
+        rule_set = compile_rules(table, rules)
+        lookups = prepare_lookups(rule_set, data_dir=data_dir)
+        for chunk in iter_chunks(table, chunk_size, columns=rule_set['columns'], data_dir=data_dir):
+            evaluate_chunk(rule_set, chunk, lookups, tally)
+    return tally
+
+
+def main():
+    """Evaluate the built-in business rules"""
+    print("Square Cube Business Rules")
+    print("=" * 40)
+    tally = run_rules()
+    for rule in RULES:
+        entry = tally.get(rule['name'], {'count': 0, 'samples': []})
+        if entry['count']:
+            print(f"✗ {rule['issue']}: {entry['count']} records (e.g. {entry['samples']})")
+        else:
+            print(f"✓ {rule.get('ok', rule['name'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Customer Cohorts for the Square OLAP Cube
+Assigns every customer the period of their first purchase and counts the
+customers of each cohort active in each later period, from one sort of the
+distinct (customer, period) pairs of fact_sales_transaction, by week or
+month and optionally sliced by preferred location or loyalty tier
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from dimension_store import dimension
+from star_schema import load_table
+
+GRANULARITIES = ['week', 'month']
+
+# Slice name -> (dim_customer attribute, dimension labelling it or None)
+SLICES = {
+    'location': ('preferred_location_sk', ('dim_location', 'location_name')),
+    'loyalty_tier': ('loyalty_tier', None),
+}
+
+
+def period_index(days, granularity):
+    """Integer period of each datetime64[D] day: Monday-started weeks or calendar months"""
+    days = np.asarray(days, dtype='datetime64[D]')
+    if granularity == 'week':
+        # 1970-01-01 was a Thursday; shifting by 3 days starts weeks on Monday
+        return (days.astype(np.int64) + 3) // 7
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f"unknown granularity: {granularity}")
+
+
+def period_label(period, granularity):
+    if granularity == 'week':
+        return str(np.datetime64(int(period) * 7 - 3, 'D'))
+    return str(np.datetime64(int(period), 'M'))
+
+
+def active_periods(granularity, data_dir='.'):
+    """Sorted distinct (customer_sk, period) pairs with a non-void purchase"""
+    sales = load_table('fact_sales_transaction', columns=['customer_sk', 'date_sk', 'is_void'],
+                       data_dir=data_dir)
+    keep = sales['customer_sk'].notna().to_numpy() & ~sales['is_void'].to_numpy()
+    customer = sales['customer_sk'].to_numpy(dtype=np.float64, na_value=np.nan)[keep].astype(np.int64)
+    dates = dimension('dim_date', data_dir).labels(sales['date_sk'][keep], 'date_value')
+    known = pd.notna(dates)
+    period = period_index(pd.to_datetime(pd.Series(dates[known])).to_numpy(), granularity)
+    customer = customer[known]
+    if not len(period):
+        return customer, period
+    base = int(period.min())
+    span = int(period.max()) - base + 1
+    pairs = np.unique(customer * span + (period - base))
+    return pairs // span, pairs % span + base
+
+
+def cohort_matrix(granularity='month', slice_by=None, data_dir='.'):
+    """Cohort x period-offset matrix of active customers.
+
+    Rows are (slice member,) cohort period labels, columns the offsets
+    0, 1, 2, ... from the cohort period; offset 0 is the cohort size (the
+    period's new customers).
+    """
+    customer, period = active_periods(granularity, data_dir)
+    starts = np.flatnonzero(np.r_[True, customer[1:] != customer[:-1]]) if len(customer) else \
+        np.empty(0, dtype=np.int64)
+    # Pairs are sorted by customer then period: each customer's first pair is its cohort
+    cohort = np.repeat(period[starts], np.diff(np.r_[starts, len(customer)]))
+    offset = period - cohort
+
+    keys = {'Cohort': cohort}
+    if slice_by is not None:
+        attribute, label = SLICES[slice_by]
+        customers = dimension('dim_customer', data_dir)
+        member = customers.labels(customer, attribute)
+        if label is not None:
+            member = dimension(label[0], data_dir).labels(member, label[1])
+        keys = {slice_by: pd.Series(member).fillna('Unknown').to_numpy(), **keys}
+    counts = pd.DataFrame({**keys, 'Offset': offset}).groupby(list(keys) + ['Offset']).size()
+    matrix = counts.unstack('Offset', fill_value=0)
+    if not matrix.empty:
+        matrix = matrix.reindex(columns=range(int(matrix.columns.max()) + 1), fill_value=0)
+    matrix.columns.name = 'Offset'
+    labels = [period_label(value, granularity) for value in matrix.index.get_level_values('Cohort')]
+    if slice_by is None:
+        matrix.index = pd.Index(labels, name='Cohort')
+    else:
+        matrix.index = pd.MultiIndex.from_arrays([matrix.index.get_level_values(slice_by), labels],
+                                                 names=[slice_by, 'Cohort'])
+    return matrix
+
+
+def retention(matrix):
+    """Customer Retention %: active customers per offset as a share of the cohort size"""
+    return matrix.div(matrix[0].where(matrix[0] > 0), axis=0) * 100
+
+
+def main():
+    """Print the cohort matrix (counts or retention %) for one granularity and slice"""
+    parser = argparse.ArgumentParser(description="Customer cohort retention matrix")
+    parser.add_argument('--granularity', choices=GRANULARITIES, default='month')
+    parser.add_argument('--by', choices=sorted(SLICES), help="slice cohorts by a customer attribute")
+    parser.add_argument('--percent', action='store_true', help="show Customer Retention %% instead of counts")
+    args = parser.parse_args()
+
+    matrix = cohort_matrix(args.granularity, args.by)
+    print(f"Customer Cohorts by {args.granularity}" + (f" and {args.by}" if args.by else ""))
+    print("=" * 40)
+    print(f"New customers: {int(matrix[0].sum()) if len(matrix) else 0}")
+    shown = retention(matrix).round(1) if args.percent else matrix
+    print(shown.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Shared Dimension Store for the Square OLAP Cube
+Maps every dimension's surrogate key to a dense row index and keeps each
+attribute as one contiguous array, so resolving labels for any result set is
+a single gather instead of a scan or a dict of row dicts
+"""
+
+import numpy as np
+import pandas as pd
+
+from star_schema import SCHEMA, load_table, store_path
+
+# Key ranges up to this many times the member count use a direct-address
+# index; sparser keys fall back to binary search
+DENSE_FACTOR = 8
+
+_dimensions = {}
+
+
+class Dimension:
+    """Surrogate-key index and lazily loaded attribute arrays for one dimension"""
+
+    def __init__(self, name, data_dir='.'):
+        self.name = name
+        self.data_dir = data_dir
+        self.key = next(iter(SCHEMA[name]))
+        keys = load_table(name, columns=[self.key], data_dir=data_dir)[self.key].to_numpy(dtype=np.int64)
+        self.size = len(keys)
+        self.attributes = {}
+        self.offset = int(keys.min()) if len(keys) else 0
+        self.dense = None
+        if len(keys) and keys.max() - keys.min() < max(DENSE_FACTOR * len(keys), 1 << 16):
+            self.dense = np.full(int(keys.max() - keys.min()) + 1, -1, dtype=np.int64)
+            self.dense[keys - self.offset] = np.arange(len(keys))
+        else:
+            self.order = np.argsort(keys, kind='stable')
+            self.sorted_keys = keys[self.order]
+
+    def rows(self, keys):
+        """Dense row index of each surrogate key (-1 for missing or null keys)"""
+        keys = pd.Series(np.asarray(keys))
+        present = keys.notna().to_numpy()
+        wanted = keys[present].to_numpy(dtype=np.int64)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if not self.size:
+            return rows
+        if self.dense is not None:
+            slot = wanted - self.offset
+            found = np.full(len(wanted), -1, dtype=np.int64)
+            inside = (slot >= 0) & (slot < len(self.dense))
+            found[inside] = self.dense[slot[inside]]
+        else:
+            slot = np.minimum(np.searchsorted(self.sorted_keys, wanted), self.size - 1)
+            found = np.where(self.sorted_keys[slot] == wanted, self.order[slot], -1)
+        rows[present] = found
+        return rows
+
+    def attribute(self, column):
+        """Contiguous array of one attribute, in row order"""
+        if column not in self.attributes:
+            series = load_table(self.name, columns=[column], data_dir=self.data_dir)[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype(object)
+            self.attributes[column] = series.to_numpy()
+        return self.attributes[column]
+
+    def take(self, rows, column):
+        """Attribute values at dense row indexes (None where the row is -1)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        values = self.attribute(column)[np.maximum(rows, 0)] if self.size else \
+            np.empty(len(rows), dtype=object)
+        missing = rows < 0
+        if missing.any():
+            values = values.astype(object)
+            values[missing] = None
+        return values
+
+    def labels(self, keys, column):
+        """Attribute values for a batch of surrogate keys (None where unresolved)"""
+        return self.take(self.rows(keys), column)
+
+    def lookup(self, keys, columns):
+        """DataFrame of the requested attributes aligned to keys"""
+        return pd.DataFrame({column: self.labels(keys, column) for column in columns})
+
+
+def dimension(name, data_dir='.'):
+    """Shared Dimension for a table, rebuilt only when its CSV changes"""
+    cache_key = (name, str(store_path(name, data_dir)))
+    if cache_key not in _dimensions:
+        _dimensions[cache_key] = Dimension(name, data_dir)
+    return _dimensions[cache_key]
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Mergeable Distinct Counts for the Square OLAP Cube
+A distinct-count sketch that stays exact (a set of 64-bit hashes) up to
+EXACT_LIMIT members and switches to HyperLogLog registers above it, so
+per-cell customer counts take bounded memory and still merge across chunks,
+partitions and rollup cells
+"""
+
+import hashlib
+import math
+
+import numpy as np
+import pandas as pd
+
+# 2^PRECISION registers (one byte each): 4,096 registers give ~1.6% standard error
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+# Exact hash sets are kept up to the size of the register array they replace
+EXACT_LIMIT = REGISTERS // 8
+MASK = (1 << 64) - 1
+
+
+def hash_value(value):
+    """64-bit hash of one key: splitmix64 for integers, BLAKE2b of the text otherwise"""
+    if isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)):
+        z = (int(value) + 0x9E3779B97F4A7C15) & MASK
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+        return z ^ (z >> 31)
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little')
+
+
+def hash_values(values):
+    """Vectorized hash_value: uint64 hashes of an array of keys"""
+    if isinstance(values, pd.Series) and pd.api.types.is_integer_dtype(values.dtype):
+        values = values.to_numpy(dtype=np.int64)
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        with np.errstate(over='ignore'):
+            z = values.astype(np.int64).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+    return np.fromiter((hash_value(value) for value in values), dtype=np.uint64, count=len(values))
+
+
+def register_updates(hashes):
+    """Register index and rank (position of the first set bit) of each hash"""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    index = (hashes >> np.uint64(64 - PRECISION)).astype(np.int64)
+    rest = hashes << np.uint64(PRECISION)
+    zeros = np.zeros(len(hashes), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_clear = (rest >> np.uint64(64 - shift)) == 0
+        zeros += np.where(top_clear, shift, 0)
+        rest = np.where(top_clear, rest << np.uint64(shift), rest)
+    rank = np.minimum(zeros + 1, 64 - PRECISION + 1)
+    return index, rank.astype(np.uint8)
+
+
+class DistinctSketch:
+    """Distinct-count state: exact below EXACT_LIMIT members, HyperLogLog above"""
+
+    def __init__(self):
+        self.hashes = set()
+        self.registers = None
+
+    @classmethod
+    def from_hashes(cls, hashes):
+        """Sketch of an array of precomputed uint64 hashes"""
+        sketch = cls()
+        sketch.add_hashes(hashes)
+        return sketch
+
+    @classmethod
+    def from_values(cls, values):
+        """Sketch of an array of keys"""
+        return cls.from_hashes(hash_values(values))
+
+    @property
+    def exact(self):
+        return self.registers is None
+
+    def add(self, value):
+        """Count one key"""
+        hashed = hash_value(value)
+        if self.registers is None:
+            self.hashes.add(hashed)
+            if len(self.hashes) > EXACT_LIMIT:
+                self.promote()
+        else:
+            index, rank = register_updates(np.array([hashed], dtype=np.uint64))
+            self.registers[index[0]] = max(self.registers[index[0]], rank[0])
+
+    def add_hashes(self, hashes):
+        """Count an array of precomputed hashes"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if self.registers is None:
+            self.hashes.update(np.unique(hashes).tolist())
+            if len(self.hashes) > EXACT_LIMIT:
+                self.promote()
+            return
+        index, rank = register_updates(hashes)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, values):
+        """Count an array of keys"""
+        self.add_hashes(hash_values(values))
+
+    def promote(self):
+        """Switch from the exact hash set to HyperLogLog registers"""
+        hashes = np.fromiter(self.hashes, dtype=np.uint64, count=len(self.hashes))
+        self.hashes = set()
+        self.registers = np.zeros(REGISTERS, dtype=np.uint8)
+        index, rank = register_updates(hashes)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """Fold another sketch into this one (exact while the union stays small)"""
+        if self.registers is None and other.registers is None:
+            self.hashes |= other.hashes
+            if len(self.hashes) > EXACT_LIMIT:
+                self.promote()
+        elif other.registers is None:
+            self.add_hashes(np.fromiter(other.hashes, dtype=np.uint64, count=len(other.hashes)))
+        else:
+            if self.registers is None:
+                self.promote()
+            np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def __or__(self, other):
+        return DistinctSketch().merge(self).merge(other)
+
+    def count(self):
+        """Distinct members: exact in exact mode, the HyperLogLog estimate otherwise"""
+        if self.registers is None:
+            return len(self.hashes)
+        alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+        estimate = alpha * REGISTERS ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * REGISTERS and empty:
+            estimate = REGISTERS * math.log(REGISTERS / empty)
+        return int(round(estimate))
+
+
+def group_sketches(keys, values=None, sketches=None):
+    """One sketch per distinct row of keys, from raw values or by merging sketches.
+
+    Returns keys' distinct rows (null keys kept) with a 'sketch' column.
+    """
+    key_columns = list(keys.columns)
+    groups = keys.groupby(key_columns, dropna=False, sort=False).ngroup().to_numpy()
+    order = np.argsort(groups, kind='stable')
+    bounds = np.flatnonzero(np.diff(groups[order])) + 1
+    slices = np.split(order, bounds) if len(order) else []
+    if values is not None:
+        hashes = hash_values(values)
+        states = [DistinctSketch.from_hashes(hashes[rows]) for rows in slices]
+    else:
+        states = []
+        for rows in slices:
+            state = DistinctSketch()
+            for sketch in sketches[rows]:
+                state.merge(sketch)
+            states.append(state)
+    firsts = [rows[0] for rows in slices]
+    cells = keys.iloc[firsts].reset_index(drop=True)
+    cells['sketch'] = pd.Series(states, dtype=object)
+    return cells
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Incremental Validation by Date Partition
+Remembers a content hash and the validation outcome of every date_sk
+partition, and on later runs validates only partitions that are new, changed,
+or reference dimension members (or parent transactions) that changed.
+Partition hashes are kept per block of rows, so only new or rewritten blocks
+are hashed again, and blocks before the previous row count are not even read
+when the table only had rows appended
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from business_rules import (RULES, SAMPLE_LIMIT, compile_rules, evaluate_chunk,
+                            merge_tallies, prepare_lookups, rule_tables)
+from referential_integrity import FOREIGN_KEYS, edge_name, load_key_sets, scan_table, table_columns
+from star_schema import (SCHEMA, appended_rows, cache_dir, iter_chunks, open_columns, open_store,
+                         slice_parts, store_path, table_rows, take_rows)
+
+STATE_FILE = 'validation_state.json'
+MEMBERS_FILE = 'validation_members.npz'
+PARTITION_COLUMN = 'date_sk'
+CHUNK_SIZE = 1_000_000
+# Rows per hashed block; a run rehashes only blocks that are new or whose bytes changed
+BLOCK_ROWS = 65_536
+
+# Tables validated partition by partition; the bridge has no date_sk of its
+# own and is partitioned by the date of the transaction it points at
+PARTITIONED_TABLES = ['fact_sales_transaction', 'fact_item_sales', 'fact_labor_cost',
+                      'bridge_transaction_modifier']
+
+
+def config_fingerprint(rules):
+    """Hash of the rule set and foreign-key map; stored outcomes are void if it changes"""
+    payload = json.dumps({'rules': rules, 'foreign_keys': {
+        table: [list(fk) for fk in edges] for table, edges in FOREIGN_KEYS.items()}},
+        sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_state(data_dir='.'):
+    """Previous partition outcomes and dimension member hashes"""
+    directory = cache_dir(data_dir)
+    try:
+        state = json.loads((directory / STATE_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        state = {'config': None, 'partitions': {}, 'blocks': {}}
+    members = {}
+    if (directory / MEMBERS_FILE).exists():
+        with np.load(directory / MEMBERS_FILE) as stored:
+            for name in stored.files:
+                dimension, part = name.rsplit('.', 1)
+                members.setdefault(dimension, {})[part] = stored[name]
+    return state, members
+
+
+def save_state(state, members, data_dir='.'):
+    """Persist partition outcomes (JSON) and member hashes (npz), each via a tmp file and os.replace"""
+    directory = cache_dir(data_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    arrays = {f"{dimension}.{part}": array
+              for dimension, parts in members.items() for part, array in parts.items()}
+    tmp_members = directory / f"{MEMBERS_FILE}.tmp{os.getpid()}"
+    with open(tmp_members, 'wb') as file:
+        np.savez(file, **arrays)
+    tmp_state = directory / f"{STATE_FILE}.tmp{os.getpid()}"
+    tmp_state.write_text(json.dumps(state))
+    # Outcomes first: a crash before the member hashes land only re-detects member changes
+    os.replace(tmp_state, directory / STATE_FILE)
+    os.replace(tmp_members, directory / MEMBERS_FILE)
+
+
+def transaction_dates(data_dir='.'):
+    """Sorted transaction_sk keys with their date_sk, for partitioning the bridge"""
+    columns = open_columns('fact_sales_transaction', ['transaction_sk', PARTITION_COLUMN], data_dir)
+    keys = np.asarray(columns['transaction_sk'], dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    return keys[order], np.asarray(columns[PARTITION_COLUMN], dtype=np.int64)[order]
+
+
+def partition_of(table, chunk, dates):
+    """date_sk partition of each row; bridge rows without a transaction get -1"""
+    if table != 'bridge_transaction_modifier':
+        return chunk[PARTITION_COLUMN].to_numpy(dtype=np.int64)
+    keys, values = dates
+    wanted = chunk['transaction_sk'].to_numpy(dtype=np.int64)
+    slot = np.minimum(np.searchsorted(keys, wanted), max(len(keys) - 1, 0))
+    found = (keys[slot] == wanted) if len(keys) else np.zeros(len(wanted), dtype=bool)
+    return np.where(found, values[slot] if len(keys) else -1, -1)
+
+
+def partition_columns(table):
+    """Columns needed to assign rows to partitions"""
+    return ['transaction_sk'] if table == 'bridge_transaction_modifier' else [PARTITION_COLUMN]
+
+
+def block_digests(table, dates, numbers, data_dir='.'):
+    """Digest of the stored bytes of the given BLOCK_ROWS-row blocks of a table.
+
+    Category labels are folded into every block, and bridge blocks also
+    cover the partition each row falls in, so a block's digest changes
+    whenever its rows' content or partition does. Digesting raw bytes costs
+    a sequential read; only the blocks whose digest moved are row-hashed.
+    """
+    mapped = open_columns(table, data_dir=data_dir)
+    labels = hashlib.blake2b(digest_size=16)
+    for column, array in mapped.items():
+        if isinstance(array, dict) and 'categories' in array:
+            labels.update(column.encode() + np.ascontiguousarray(array['categories']).tobytes())
+    rows = table_rows(table, data_dir)
+    digests = {}
+    for number in numbers:
+        block = slice(number * BLOCK_ROWS, min((number + 1) * BLOCK_ROWS, rows))
+        digest = labels.copy()
+        for array in mapped.values():
+            for part, values in slice_parts(array, block).items():
+                if part != 'categories':
+                    digest.update(np.ascontiguousarray(values).tobytes())
+        if table == 'bridge_transaction_modifier':
+            keys = pd.DataFrame({'transaction_sk': mapped['transaction_sk'][block]})
+            digest.update(partition_of(table, keys, dates).tobytes())
+        digests[number] = digest.hexdigest()
+    return digests
+
+
+def block_sums(table, first, dates, data_dir='.'):
+    """{partition: [rows, high, low]} row-hash sums of the block starting at row first"""
+    chunk = next(iter_chunks(table, BLOCK_ROWS, data_dir=data_dir, fixed_point=True,
+                             start=first, stop=first + BLOCK_ROWS))
+    row_hash = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    frame = pd.DataFrame({
+        'partition': partition_of(table, chunk, dates),
+        'high': (row_hash >> np.uint64(32)).astype(np.int64),
+        'low': (row_hash & np.uint64(0xFFFFFFFF)).astype(np.int64),
+    })
+    grouped = frame.groupby('partition').agg(rows=('high', 'size'), high=('high', 'sum'), low=('low', 'sum'))
+    return {str(partition): [int(row['rows']), int(row['high']), int(row['low'])]
+            for partition, row in grouped.iterrows()}
+
+
+def store_identity(table, data_dir='.'):
+    """Names of the stores a table's partition hashes depend on"""
+    return [store_path(name, data_dir).name for name in store_tables(table)]
+
+
+def store_tables(table):
+    """Tables whose stores a table's partition hashes depend on"""
+    return [table] + (['fact_sales_transaction'] if table == 'bridge_transaction_modifier' else [])
+
+
+def kept_blocks(table, previous, data_dir='.'):
+    """Leading stored blocks still valid because the stores only had rows appended.
+
+    Full blocks within the table's carried-over rows keep their sums. For
+    the bridge, appended transactions can only place rows that had no
+    transaction yet, so blocks from the first one holding partition -1 on
+    are rehashed.
+    """
+    if not previous['stores']:
+        return 0
+    kept = len(previous['blocks'])
+    for name, store in zip(store_tables(table), previous['stores']):
+        rows = appended_rows(name, store, data_dir)
+        if name == table:
+            kept = min(kept, rows // BLOCK_ROWS)
+        elif rows == 0:
+            return 0
+        elif store != store_path(name, data_dir).name:
+            kept = next((number for number, block in enumerate(previous['blocks'][:kept])
+                         if '-1' in block['sums']), kept)
+    return kept
+
+
+def partition_hashes(table, dates, previous=None, data_dir='.'):
+    """Order-insensitive content hash of every partition of a table.
+
+    Rows are hashed in blocks of BLOCK_ROWS and previous is the table's
+    stored {'stores', 'blocks'} from the last run: with the same stores
+    nothing is read, after an append the blocks before the previous row
+    count are kept unread, and the remaining blocks are hashed again when
+    new or when their bytes changed. Row hashes are split into 32-bit
+    halves and summed per partition in int64, which cannot overflow below
+    2**31 rows per partition. Returns (hashes, blocks to store).
+    """
+    stores = store_identity(table, data_dir)
+    previous = previous or {'stores': None, 'blocks': []}
+    if previous['stores'] == stores:
+        blocks = previous['blocks']
+    else:
+        old = previous['blocks']
+        kept = kept_blocks(table, previous, data_dir)
+        numbers = range(kept, -(-table_rows(table, data_dir) // BLOCK_ROWS))
+        digests = block_digests(table, dates, numbers, data_dir)
+        blocks = old[:kept] + [
+            old[number] if number < len(old) and old[number]['digest'] == digest else
+            {'digest': digest, 'sums': block_sums(table, number * BLOCK_ROWS, dates, data_dir)}
+            for number, digest in digests.items()]
+    sums = {}
+    for block in blocks:
+        for partition, (rows, high, low) in block['sums'].items():
+            total = sums.setdefault(partition, [0, 0, 0])
+            total[0] += rows
+            total[1] += high
+            total[2] += low
+    hashes = {partition: f"{rows}:{high:x}:{low:x}" for partition, (rows, high, low) in sums.items()}
+    return hashes, {'stores': stores, 'blocks': blocks}
+
+
+def member_hashes(dimension, previous=None, data_dir='.'):
+    """Sorted member keys of a dimension and a content hash per member.
+
+    previous is the dimension's entry from the last run; when the store is
+    unchanged it is returned as is, and when rows were only appended just
+    those rows are hashed and merged in.
+    """
+    key = next(iter(SCHEMA[dimension]))
+    store = store_path(dimension, data_dir).name
+    carried = appended_rows(dimension, str(previous['store']), data_dir) \
+        if previous and 'store' in previous else 0
+    if carried and store == str(previous['store']):
+        return previous
+    rows = table_rows(dimension, data_dir)
+    frame = take_rows(dimension, np.arange(carried, rows), data_dir=data_dir, fixed_point=True)
+    keys = frame[key].to_numpy(dtype=np.int64)
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    if carried:
+        keys = np.concatenate([previous['keys'], keys])
+        hashes = np.concatenate([previous['hashes'], hashes])
+    order = np.argsort(keys, kind='stable')
+    return {'keys': keys[order], 'hashes': hashes[order], 'store': np.array(store)}
+
+
+def changed_members(old, new):
+    """Keys that were added, removed or whose attributes changed"""
+    if old is None:
+        return None
+    common, old_at, new_at = np.intersect1d(old['keys'], new['keys'], return_indices=True)
+    edited = common[old['hashes'][old_at] != new['hashes'][new_at]]
+    return np.concatenate([edited, np.setxor1d(old['keys'], new['keys'])])
+
+
+def partitions_referencing(table, fk, keys, dates, chunk_size=CHUNK_SIZE, data_dir='.'):
+    """Partitions of a table with at least one row whose foreign key is in keys"""
+    found = set()
+    columns = list(dict.fromkeys([fk.column] + partition_columns(table)))
+    for chunk in iter_chunks(table, chunk_size, columns=columns, data_dir=data_dir):
+        hit = chunk[fk.column].isin(keys).to_numpy(dtype=bool)
+        if hit.any():
+            found.update(str(partition) for partition in np.unique(partition_of(table, chunk, dates)[hit]))
+    return found
+
+
+def partition_rows(table, partitions, dates, blocks, chunk_size=CHUNK_SIZE, data_dir='.'):
+    """Row positions of the selected partitions, grouped by partition.
+
+    Only the blocks whose stored sums hold one of the partitions are read.
+    """
+    wanted = np.array(sorted(int(partition) for partition in partitions), dtype=np.int64)
+    selected = set(partitions)
+    positions, labels = [], []
+    for number, block in enumerate(blocks):
+        if not selected & block['sums'].keys():
+            continue
+        first = number * BLOCK_ROWS
+        for chunk in iter_chunks(table, chunk_size, columns=partition_columns(table), data_dir=data_dir,
+                                 start=first, stop=first + BLOCK_ROWS):
+            partition = partition_of(table, chunk, dates)
+            hit = np.isin(partition, wanted)
+            positions.append(chunk.index.to_numpy()[hit])
+            labels.append(partition[hit])
+    if not positions:
+        return {}
+    positions, labels = np.concatenate(positions), np.concatenate(labels)
+    order = np.argsort(labels, kind='stable')
+    positions, labels = positions[order], labels[order]
+    bounds = np.flatnonzero(np.diff(labels)) + 1
+    return {str(group[0]): rows for group, rows in
+            zip(np.split(labels, bounds), np.split(positions, bounds)) if len(group)}
+
+
+def validate_partition(table, positions, rule_set, lookups, key_sets, chunk_size, data_dir='.'):
+    """Run the foreign-key scan and rules over one partition's rows"""
+    columns = table_columns(table)
+    if rule_set:
+        columns = list(dict.fromkeys(columns + rule_set['columns']))
+    tally = {}
+
+    def chunks():
+        for start in range(0, len(positions), chunk_size):
+            batch = positions[start:start + chunk_size]
+            chunk = take_rows(table, batch, columns=columns, data_dir=data_dir)
+            chunk.index = pd.Index(batch)
+            if rule_set:
+                evaluate_chunk(rule_set, chunk, lookups, tally)
+            yield chunk
+
+    fk_result = scan_table(table, chunks(), key_sets)
+    checks = {edge: {'count': len(entry['rows']), 'samples': entry['samples']}
+              for edge, entry in fk_result.items() if len(entry['rows'])}
+    checks.update({name: entry for name, entry in tally.items() if entry['count']})
+    return fk_result, checks
+
+
+def validate_incremental(rules=RULES, chunk_size=CHUNK_SIZE, data_dir='.'):
+    """Validate only new, changed or affected partitions and merge with stored outcomes.
+
+    Returns (fk_results, rule tally) in the shape validate_cube_data reports:
+    counts and samples cover every partition, while orphan row positions cover
+    the partitions validated in this run.
+    """
+    for name in SCHEMA:
+        open_store(name, data_dir)
+    state, old_members = load_state(data_dir)
+    fingerprint = config_fingerprint(rules)
+    if state.get('config') != fingerprint:
+        # Block hashes depend only on the data and survive a rule change
+        state = {'config': fingerprint, 'partitions': {}, 'blocks': state.get('blocks', {})}
+        old_members = {}
+    state.setdefault('blocks', {})
+
+    dates = transaction_dates(data_dir)
+    dimensions = sorted({fk.parent for edges in FOREIGN_KEYS.values() for fk in edges
+                         if fk.parent.startswith('dim_')})
+    members = {dimension: member_hashes(dimension, old_members.get(dimension), data_dir)
+               for dimension in dimensions}
+    changed = {dimension: changed_members(old_members.get(dimension), members[dimension])
+               for dimension in dimensions}
+
+    key_sets = load_key_sets(PARTITIONED_TABLES, data_dir=data_dir)
+    fk_results, tallies, changed_tables = {}, [], {}
+    for table in PARTITIONED_TABLES:
+        previous = state['partitions'].get(table, {})
+        hashes, state['blocks'][table] = partition_hashes(table, dates, state['blocks'].get(table), data_dir)
+        todo = {partition for partition, digest in hashes.items()
+                if previous.get(partition, {}).get('hash') != digest}
+        # New partitions count as changed too: a late parent on a new date
+        # can resolve orphans stored for older child partitions
+        changed_tables[table] = todo | (set(previous) - set(hashes))
+
+        for fk in FOREIGN_KEYS[table]:
+            keys = changed.get(fk.parent)
+            if fk.parent in changed and keys is None:
+                todo |= set(hashes)
+            elif keys is not None and len(keys):
+                todo |= partitions_referencing(table, fk, keys, dates, chunk_size, data_dir)
+            elif fk.parent in changed_tables and changed_tables[fk.parent]:
+                # Parent transactions changed: recheck same-day partitions and any
+                # partition whose stored outcome has orphans on this edge
+                edge = edge_name(table, fk)
+                todo |= changed_tables[fk.parent] & set(hashes)
+                todo |= {partition for partition, outcome in previous.items()
+                         if edge in outcome.get('checks', {}) and partition in hashes}
+
+        rule_set = compile_rules(table, rules) if table in rule_tables(rules) else None
+        lookups = prepare_lookups(rule_set, data_dir=data_dir) if rule_set else {}
+        outcomes = {partition: outcome for partition, outcome in previous.items()
+                    if partition in hashes and partition not in todo}
+        fresh = []
+        for partition, positions in partition_rows(table, todo, dates, state['blocks'][table]['blocks'],
+                                                            chunk_size, data_dir).items():
+            fk_result, checks = validate_partition(table, positions, rule_set, lookups, key_sets,
+                                                   chunk_size, data_dir)
+            outcomes[partition] = {'hash': hashes[partition], 'checks': checks}
+            fresh.append(fk_result)
+        state['partitions'][table] = outcomes
+        print(f"✓ {table}: validated {len(todo)} of {len(hashes)} partitions")
+
+        ordered = [outcomes[partition]['checks'] for partition in sorted(outcomes, key=int)]
+        merged = merge_tallies(ordered)
+        fk_results[table] = {}
+        for fk in FOREIGN_KEYS[table]:
+            edge = edge_name(table, fk)
+            rows = [result[edge]['rows'] for result in fresh if edge in result]
+            entry = merged.pop(edge, {'count': 0, 'samples': []})
+            fk_results[table][edge] = {
+                'rows': np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64),
+                'count': entry['count'],
+                'samples': entry['samples'][:SAMPLE_LIMIT],
+            }
+        tallies.append(merged)
+
+    save_state(state, members, data_dir)
+    return fk_results, merge_tallies(tallies)
+
+
+def main():
+    """Run an incremental validation pass and report what was rechecked"""
+    print("Square Cube Incremental Validation")
+    print("=" * 40)
+    fk_results, tally = validate_incremental()
+    orphans = sum(entry['count'] for edges in fk_results.values() for entry in edges.values())
+    violations = sum(entry['count'] for entry in tally.values())
+    print(f"\nOrphaned references: {orphans}, rule violations: {violations}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Market-Basket Analysis for the Square OLAP Cube
+Groups sales lines into baskets by transaction_id, joins the modifier bridge
+and keeps sparse, mergeable co-occurrence counts (item x item per basket,
+item x modifier per line) from which support, confidence, lift and
+FP-growth frequent itemsets are computed
+"""
+
+import argparse
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from dimension_store import dimension
+from star_schema import iter_chunks, load_table
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_MIN_SUPPORT = 0.01
+
+LINE_COLUMNS = ['transaction_sk', 'transaction_id', 'item_sk', 'is_void', 'is_refund']
+
+
+class BasketCounts:
+    """Sparse co-occurrence counts of a set of baskets; merge() adds two disjoint sets.
+
+    Baskets count transactions, lines count item sales lines: MODIFIER
+    lines are left out, their modifiers are counted through the bridge on
+    the parent line. Item and pair counts are basket counts; modifier and
+    attachment counts are line counts.
+    Patterns holds each distinct basket (sorted item tuple) with its count,
+    the weighted transactions FP-growth mines.
+    """
+
+    def __init__(self):
+        self.baskets = 0
+        self.lines = 0
+        self.items = Counter()
+        self.pairs = Counter()
+        self.patterns = Counter()
+        self.item_lines = Counter()
+        self.modifiers = Counter()
+        self.attachments = Counter()
+
+    def add_lines(self, lines, bridge_keys, bridge_modifiers, modifier_items=()):
+        """Count a frame of sales lines holding whole baskets.
+
+        bridge_keys is the bridge's line key (transaction_sk) sorted, with
+        bridge_modifiers the modifier of each of those bridge rows.
+        modifier_items are the item keys whose lines are modifier lines.
+        """
+        basket = pd.factorize(lines['transaction_id'])[0]
+        self.baskets += int(basket.max()) + 1 if len(basket) else 0
+        products = ~np.isin(lines['item_sk'].to_numpy(dtype=np.int64), modifier_items)
+        lines, basket = lines[products], basket[products]
+        item = lines['item_sk'].to_numpy(dtype=np.int64)
+        self.lines += len(lines)
+        self.item_lines.update(pd.Series(item).value_counts().to_dict())
+
+        held = pd.DataFrame({'basket': basket, 'item': item}).drop_duplicates().sort_values(['basket', 'item'])
+        self.items.update(held['item'].value_counts().to_dict())
+        pairs = held.merge(held, on='basket', suffixes=('_a', '_b'))
+        pairs = pairs[pairs['item_a'] < pairs['item_b']]
+        self.pairs.update(pairs.groupby(['item_a', 'item_b']).size().to_dict())
+        self.patterns.update(held.groupby('basket', sort=False)['item'].agg(tuple).value_counts().to_dict())
+
+        line_keys = lines['transaction_sk'].to_numpy(dtype=np.int64)
+        starts = np.searchsorted(bridge_keys, line_keys, side='left')
+        stops = np.searchsorted(bridge_keys, line_keys, side='right')
+        counts = stops - starts
+        if counts.sum():
+            line = np.repeat(np.arange(len(lines)), counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            attached = pd.DataFrame({'line': line, 'item': item[line],
+                                     'modifier': bridge_modifiers[np.repeat(starts, counts) + offsets]})
+            attached = attached.drop_duplicates(['line', 'modifier'])
+            self.modifiers.update(attached['modifier'].value_counts().to_dict())
+            self.attachments.update(attached.groupby(['item', 'modifier']).size().to_dict())
+
+    def merge(self, other):
+        """Fold in the counts of a disjoint set of baskets"""
+        self.baskets += other.baskets
+        self.lines += other.lines
+        for name in ('items', 'pairs', 'patterns', 'item_lines', 'modifiers', 'attachments'):
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+
+def basket_chunks(chunk_size=DEFAULT_CHUNK_SIZE, data_dir='.'):
+    """Completed, non-void, non-refund sales lines in chunks that never split a basket.
+
+    Lines of a transaction are expected to be contiguous in the extract, so
+    the trailing basket of each chunk is held back and prepended to the next
+    one. Contiguity is checked within each emitted frame and against the ids
+    of the frame before it, so only one chunk of ids is kept; a transaction
+    whose lines reappear there raises ValueError.
+    """
+    previous = set()
+
+    def complete(lines):
+        nonlocal previous
+        ids = lines['transaction_id'].to_numpy()
+        runs = pd.Series(ids[np.append(True, ids[1:] != ids[:-1])])
+        repeated = set(runs[runs.duplicated()]) | previous.intersection(runs)
+        if repeated:
+            raise ValueError(f"lines of transaction {min(repeated)} are not contiguous in fact_sales_transaction")
+        previous = set(runs)
+        return valid_lines(lines)
+
+    pending = None
+    for chunk in iter_chunks('fact_sales_transaction', chunk_size, columns=LINE_COLUMNS, data_dir=data_dir):
+        if pending is not None:
+            chunk = pd.concat([pending, chunk])
+        ids = chunk['transaction_id'].to_numpy()
+        # The trailing run of the last id, not every line sharing it
+        other = np.flatnonzero(ids != ids[-1])
+        tail = np.arange(len(ids)) > (other[-1] if len(other) else -1)
+        pending = chunk[tail]
+        if (~tail).any():
+            yield complete(chunk[~tail])
+    if pending is not None and len(pending):
+        yield complete(pending)
+
+
+def valid_lines(lines):
+    return lines[~(lines['is_void'] | lines['is_refund']).to_numpy()]
+
+
+def bridge_index(data_dir='.'):
+    """Bridge line keys sorted, with the modifier of each"""
+    bridge = load_table('bridge_transaction_modifier', columns=['transaction_sk', 'modifier_sk'],
+                        data_dir=data_dir)
+    keys = bridge['transaction_sk'].to_numpy(dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    return keys[order], bridge['modifier_sk'].to_numpy(dtype=np.int64)[order]
+
+
+def count_baskets(chunk_size=DEFAULT_CHUNK_SIZE, data_dir='.'):
+    """BasketCounts of the whole sales fact, one chunk at a time"""
+    bridge_keys, bridge_modifiers = bridge_index(data_dir)
+    items = dimension('dim_item', data_dir)
+    modifier_items = items.attribute('item_sk')[items.attribute('item_type') == 'MODIFIER'].astype(np.int64)
+    total = BasketCounts()
+    for lines in basket_chunks(chunk_size, data_dir):
+        counts = BasketCounts()
+        counts.add_lines(lines, bridge_keys, bridge_modifiers, modifier_items)
+        total.merge(counts)
+    return total
+
+
+def item_pairs(counts, min_support=DEFAULT_MIN_SUPPORT):
+    """Item x item co-occurrence with support, both confidences and lift"""
+    rows = []
+    for (a, b), together in counts.pairs.items():
+        support = together / counts.baskets
+        if support < min_support:
+            continue
+        rows.append({
+            'item_a': a, 'item_b': b, 'Baskets': together, 'Support': support,
+            'Confidence A->B': together / counts.items[a],
+            'Confidence B->A': together / counts.items[b],
+            'Lift': together * counts.baskets / (counts.items[a] * counts.items[b]),
+        })
+    frame = pd.DataFrame(rows, columns=['item_a', 'item_b', 'Baskets', 'Support',
+                                        'Confidence A->B', 'Confidence B->A', 'Lift'])
+    return frame.sort_values(['Lift', 'Baskets', 'item_a', 'item_b'], ascending=[False, False, True, True],
+                             kind='stable').reset_index(drop=True)
+
+
+def modifier_attachments(counts, min_support=0.0):
+    """Item x modifier attachment: share of the item's lines carrying the modifier, and lift"""
+    rows = []
+    for (item, modifier), together in counts.attachments.items():
+        support = together / counts.lines
+        if support < min_support:
+            continue
+        confidence = together / counts.item_lines[item]
+        rows.append({'item_sk': item, 'modifier_sk': modifier, 'Lines': together, 'Support': support,
+                     'Confidence': confidence,
+                     'Lift': confidence / (counts.modifiers[modifier] / counts.lines)})
+    frame = pd.DataFrame(rows, columns=['item_sk', 'modifier_sk', 'Lines', 'Support', 'Confidence', 'Lift'])
+    return frame.sort_values(['Confidence', 'Lines', 'item_sk', 'modifier_sk'],
+                             ascending=[False, False, True, True], kind='stable').reset_index(drop=True)
+
+
+class FPNode:
+    __slots__ = ('item', 'count', 'parent', 'children')
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+def fp_tree(transactions, min_count):
+    """FP-tree of weighted transactions: (header of nodes per item, frequent item counts)"""
+    totals = Counter()
+    for items, count in transactions:
+        for item in items:
+            totals[item] += count
+    frequent = {item: total for item, total in totals.items() if total >= min_count}
+    root = FPNode(None, None)
+    header = defaultdict(list)
+    for items, count in transactions:
+        node = root
+        for item in sorted((item for item in items if item in frequent), key=lambda item: (-frequent[item], item)):
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = FPNode(item, node)
+                header[item].append(child)
+            child.count += count
+            node = child
+    return header, frequent
+
+
+def fp_growth(transactions, min_count, max_size=None, suffix=()):
+    """Yield (itemset, count) for every itemset in at least min_count transactions"""
+    header, frequent = fp_tree(transactions, min_count)
+    for item in sorted(frequent, key=lambda item: (frequent[item], item)):
+        itemset = suffix + (item,)
+        yield tuple(sorted(itemset)), frequent[item]
+        if max_size is not None and len(itemset) >= max_size:
+            continue
+        conditional = []
+        for node in header[item]:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            if path:
+                conditional.append((path, node.count))
+        yield from fp_growth(conditional, min_count, max_size, itemset)
+
+
+def frequent_itemsets(counts, min_support=DEFAULT_MIN_SUPPORT, min_size=2, max_size=None):
+    """Frequent itemsets of at least min_size items, with basket count and support"""
+    min_count = max(1, int(np.ceil(min_support * counts.baskets)))
+    rows = [{'items': itemset, 'Baskets': count, 'Support': count / counts.baskets}
+            for itemset, count in fp_growth(list(counts.patterns.items()), min_count, max_size)
+            if len(itemset) >= min_size]
+    frame = pd.DataFrame(rows, columns=['items', 'Baskets', 'Support'])
+    return frame.sort_values(['Baskets', 'items'], ascending=[False, True], kind='stable').reset_index(drop=True)
+
+
+def main():
+    """Item pairs, modifier attachments and frequent itemsets of the sales fact"""
+    parser = argparse.ArgumentParser(description="Market-basket co-occurrence of items and modifiers")
+    parser.add_argument('--min-support', type=float, default=DEFAULT_MIN_SUPPORT,
+                        help="minimum share of baskets for pairs and itemsets")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    counts = count_baskets(args.chunk_size)
+    items = dimension('dim_item')
+    print("Market-Basket Analysis")
+    print("=" * 40)
+    print(f"{counts.baskets:,} baskets, {counts.lines:,} lines, "
+          f"{sum(counts.attachments.values()):,} modifier attachments")
+
+    pairs = item_pairs(counts, args.min_support)
+    pairs.insert(0, 'Item A', items.labels(pairs.pop('item_a'), 'item_name'))
+    pairs.insert(1, 'Item B', items.labels(pairs.pop('item_b'), 'item_name'))
+    print(f"\nItem pairs (support >= {args.min_support:.0%})")
+    print(pairs.head(10).round(3).to_string(index=False))
+
+    attached = modifier_attachments(counts)
+    attached.insert(0, 'Item', items.labels(attached.pop('item_sk'), 'item_name'))
+    attached.insert(1, 'Modifier', items.labels(attached.pop('modifier_sk'), 'item_name'))
+    print("\nModifier attachment by item")
+    print(attached.head(10).round(3).to_string(index=False))
+
+    itemsets = frequent_itemsets(counts, args.min_support)
+    itemsets['items'] = [' + '.join(items.labels(list(itemset), 'item_name')) for itemset in itemsets['items']]
+    print(f"\nFrequent itemsets (FP-growth, support >= {args.min_support:.0%})")
+    print(itemsets.head(10).round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
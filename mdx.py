@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+MDX Subset for the Square_Sales_Analytics Cube
+Parses SELECT ... ON COLUMNS/ROWS FROM [cube] WHERE (...) statements with
+WITH MEMBER calculated measures, {sets}, CROSSJOIN / *, .MEMBERS, TOPCOUNT /
+BOTTOMCOUNT and NON EMPTY, and compiles them to the OLAP engine's vectorized
+aggregation. Crossjoined levels are grouped together in one aggregation, so
+NON EMPTY axes only ever hold the member tuples that occur in the facts
+"""
+
+import math
+import re
+import sys
+from collections import namedtuple
+
+import pandas as pd
+
+from olap_engine import CUBE_NAME, LEVELS, level_members, measure_names, query, ranked
+
+TOKEN = re.compile(r"\s*(?:(\[(?:[^\]]|\]\])*\])|(\d+(?:\.\d+)?)|([A-Za-z_][A-Za-z_0-9]*)|('[^']*')|(.))",
+                   re.DOTALL)
+
+KEYWORDS = {'WITH', 'MEMBER', 'AS', 'SELECT', 'NON', 'EMPTY', 'ON', 'COLUMNS', 'ROWS', 'FROM', 'WHERE',
+            'CROSSJOIN', 'TOPCOUNT', 'BOTTOMCOUNT', 'MEMBERS'}
+AXES = {'COLUMNS': 0, 'ROWS': 1, '0': 0, '1': 1}
+# Most member tuples an axis without NON EMPTY may list before execution refuses
+DENSE_LIMIT = 1_000_000
+
+# One axis (or the slicer) compiled for the engine: grouped levels, member
+# filters per level, measures, and an optional (count, measure, bottom) rank
+Axis = namedtuple('Axis', ['levels', 'filters', 'measures', 'rank'], defaults=[(), {}, (), None])
+Statement = namedtuple('Statement', ['calculated', 'axes', 'non_empty', 'cube', 'slicer'])
+
+
+class MdxSyntaxError(ValueError):
+    """Raised for statements outside the supported MDX subset"""
+
+
+def tokenize(text):
+    """Split MDX into (kind, value) tokens: name, number, word, string or symbol"""
+    tokens = []
+    text = re.sub(r'--[^\n]*|//[^\n]*|/\*.*?\*/', ' ', text, flags=re.DOTALL)
+    for match in TOKEN.finditer(text):
+        name, number, word, string, symbol = match.groups()
+        if name:
+            tokens.append(('name', name[1:-1].replace(']]', ']')))
+        elif number:
+            tokens.append(('number', number))
+        elif word:
+            tokens.append(('keyword', word.upper()) if word.upper() in KEYWORDS else ('word', word))
+        elif string:
+            tokens.append(('string', string[1:-1]))
+        elif symbol and not symbol.isspace():
+            tokens.append(('symbol', symbol))
+    return tokens
+
+
+class Parser:
+    """Recursive-descent parser producing engine-ready axes"""
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (value and token[1] != value):
+            raise MdxSyntaxError(f"expected {value or kind}, found {token[1] or 'end of statement'}")
+        self.position += 1
+        return token[1]
+
+    def accept(self, kind, value):
+        if self.peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def statement(self):
+        calculated = {}
+        if self.accept('keyword', 'WITH'):
+            while self.accept('keyword', 'MEMBER'):
+                path = self.path()
+                if len(path) != 2 or path[0] != 'Measures':
+                    raise MdxSyntaxError("only calculated [Measures] members are supported")
+                self.take('keyword', 'AS')
+                calculated[path[1]] = self.expression()
+        self.take('keyword', 'SELECT')
+        axes, non_empty = {}, {}
+        while True:
+            empty = self.accept('keyword', 'NON')
+            if empty:
+                self.take('keyword', 'EMPTY')
+            axis = self.set_expression()
+            self.take('keyword', 'ON')
+            name = self.take()
+            if name not in AXES or AXES[name] in axes:
+                raise MdxSyntaxError(f"unsupported or repeated axis {name}")
+            axes[AXES[name]], non_empty[AXES[name]] = axis, empty
+            if not self.accept('symbol', ','):
+                break
+        self.take('keyword', 'FROM')
+        cube = self.take('name')
+        slicer = Axis()
+        if self.accept('keyword', 'WHERE'):
+            slicer = self.set_expression()
+        if self.peek()[0] is not None:
+            raise MdxSyntaxError(f"unexpected {self.peek()[1]}")
+        return Statement(calculated, axes, non_empty, cube, slicer)
+
+    def expression(self):
+        """Calculated-member formula, rewritten into derived-measure syntax"""
+        if self.peek()[0] == 'string':
+            return re.sub(r'\[Measures\]\.', '', self.take('string'))
+        parts, depth = [], 0
+        while self.peek()[0] is not None:
+            kind, value = self.peek()
+            if depth == 0 and (kind == 'keyword' and value in ('SELECT', 'MEMBER') or (kind, value) == ('symbol', ',')):
+                break
+            if kind == 'name':
+                path = self.path()
+                parts.append(f"[{path[-1]}]")
+                continue
+            depth += (value == '(') - (value == ')')
+            parts.append(value)
+            self.position += 1
+        return ' '.join(parts)
+
+    def path(self):
+        """Dotted [name] path, with a trailing MEMBERS kept as 'MEMBERS'"""
+        parts = [self.take('name')]
+        while self.accept('symbol', '.'):
+            parts.append('MEMBERS' if self.accept('keyword', 'MEMBERS') else self.take('name'))
+        return parts
+
+    def set_expression(self):
+        axis = self.set_term()
+        while self.accept('symbol', '*'):
+            axis = crossjoin(axis, self.set_term())
+        return axis
+
+    def set_term(self):
+        kind, value = self.peek()
+        if (kind, value) == ('symbol', '{'):
+            self.take()
+            axis = Axis()
+            if not self.accept('symbol', '}'):
+                axis = self.set_expression()
+                while self.accept('symbol', ','):
+                    axis = union(axis, self.set_expression())
+                self.take('symbol', '}')
+            return axis
+        if (kind, value) == ('symbol', '('):
+            self.take()
+            axis = self.set_expression()
+            while self.accept('symbol', ','):
+                axis = crossjoin(axis, self.set_expression())
+            self.take('symbol', ')')
+            return axis
+        if kind == 'keyword' and value == 'CROSSJOIN':
+            self.take()
+            self.take('symbol', '(')
+            axis = self.set_expression()
+            while self.accept('symbol', ','):
+                axis = crossjoin(axis, self.set_expression())
+            self.take('symbol', ')')
+            return axis
+        if kind == 'keyword' and value in ('TOPCOUNT', 'BOTTOMCOUNT'):
+            self.take()
+            self.take('symbol', '(')
+            axis = self.set_expression()
+            self.take('symbol', ',')
+            count = int(float(self.take('number')))
+            self.take('symbol', ',')
+            by = self.path()
+            self.take('symbol', ')')
+            if axis.rank or by[0] != 'Measures':
+                raise MdxSyntaxError(f"{value} needs a set and a [Measures] member")
+            return axis._replace(rank=(count, by[-1], value == 'BOTTOMCOUNT'))
+        if kind == 'name':
+            return member_set(self.path())
+        raise MdxSyntaxError(f"unexpected {value or 'end of statement'}")
+
+
+def level_name(path):
+    """Engine level for [Dim].[Level] or [Dim].[Level].[Level]"""
+    name = f"{path[0]}.{path[1]}"
+    if name not in LEVELS or (len(path) == 3 and path[2] != path[1]):
+        raise MdxSyntaxError(f"unknown level [{'].['.join(path)}]")
+    return name
+
+
+def member_set(path):
+    """Axis for a measure, a level's MEMBERS or one named member"""
+    if path[0] == 'Measures':
+        return Axis(measures=(path[1],))
+    if path[-1] == 'MEMBERS':
+        return Axis(levels=(level_name(path[:-1]),))
+    if len(path) < 3:
+        raise MdxSyntaxError(f"[{'].['.join(path)}] is not a member")
+    name = level_name(path[:2])
+    return Axis(levels=(name,), filters={name: [path[-1]]})
+
+
+def crossjoin(left, right):
+    """Levels of both sets grouped together; filters on a shared level intersect"""
+    if left.rank or right.rank:
+        raise MdxSyntaxError("TOPCOUNT must enclose the whole crossjoin")
+    filters = dict(left.filters)
+    for name, allowed in right.filters.items():
+        filters[name] = [member for member in filters[name] if member in allowed] if name in filters else allowed
+    return Axis(tuple(dict.fromkeys(left.levels + right.levels)), filters,
+                tuple(dict.fromkeys(left.measures + right.measures)))
+
+
+def union(left, right):
+    """Members of two sets over the same levels (or two measure lists)"""
+    if left.rank or right.rank or set(left.levels) != set(right.levels):
+        raise MdxSyntaxError("set members must share the same levels")
+    filters = {}
+    for name in left.levels:
+        if name in left.filters and name in right.filters:
+            filters[name] = list(dict.fromkeys(left.filters[name] + right.filters[name]))
+    return Axis(left.levels, filters, tuple(dict.fromkeys(left.measures + right.measures)))
+
+
+def parse(text):
+    """Parse an MDX statement into a Statement"""
+    statement = Parser(text).statement()
+    if statement.cube != CUBE_NAME:
+        raise MdxSyntaxError(f"unknown cube [{statement.cube}]")
+    return statement
+
+
+def execute(text, rollups=None, data_dir='.'):
+    """Run an MDX statement; returns row-axis member columns followed by one column per cell.
+
+    The measures may sit on either axis. Levels on the column axis are
+    pivoted into column headers ('member | measure'). Without NON EMPTY on
+    the rows every combination of the requested members is listed, empty
+    cells as NaN, up to DENSE_LIMIT tuples; with it only tuples that occur
+    in the facts are returned.
+    """
+    statement = parse(text)
+    axes = [statement.axes.get(index, Axis()) for index in (0, 1)]
+    measures = [name for axis in axes + [statement.slicer] for name in axis.measures]
+    measures = list(dict.fromkeys(measures)) or ['Net Sales Amount']
+    for name in measures:
+        if name not in statement.calculated and name not in measure_names():
+            raise MdxSyntaxError(f"unknown measure [{name}]")
+    columns, rows = axes
+    if columns.rank:
+        raise MdxSyntaxError("TOPCOUNT is supported on the row axis")
+
+    filters = dict(statement.slicer.filters)
+    for axis in (columns, rows):
+        for name, allowed in axis.filters.items():
+            filters[name] = [member for member in filters[name] if member in allowed] if name in filters \
+                else list(allowed)
+    filters = {name: resolve_members(name, allowed, data_dir) for name, allowed in filters.items()}
+    levels = list(dict.fromkeys(rows.levels + columns.levels))
+    if rows.rank:
+        count, by, bottom = rows.rank
+        result = ranked(measures, levels, by, count=count, bottom=bottom, filters=filters, rollups=rollups,
+                        data_dir=data_dir, calculated=statement.calculated)
+    else:
+        result = query(measures, levels, filters, rollups, data_dir, statement.calculated)
+        if not statement.non_empty.get(1, False) and levels:
+            result = densify(result, levels, filters, data_dir)
+
+    if columns.levels:
+        result = result.pivot_table(index=list(rows.levels) or None, columns=list(columns.levels),
+                                    values=measures, aggfunc='first', sort=False, dropna=False)
+        result.columns = [' | '.join(str(part) for part in column[1:]) + f" | {column[0]}"
+                          for column in result.columns]
+        result = result.reset_index() if rows.levels else result.reset_index(drop=True)
+    if statement.non_empty.get(0, False) and len(result):
+        cells = [column for column in result.columns if column not in rows.levels]
+        result = result.drop(columns=[column for column in cells if result[column].isna().all()])
+    return result
+
+
+def resolve_members(name, wanted, data_dir='.'):
+    """Member labels of a level named in MDX (matched on their text, so [2024] finds year 2024)"""
+    labels = {str(label): label for label in level_members(name, data_dir)[0]}
+    return [labels.get(member, member) for member in wanted]
+
+
+def densify(result, levels, filters, data_dir='.'):
+    """Every combination of the levels' (filtered) members, in hierarchy order, empty cells NaN.
+
+    Raises ValueError before allocating when there are more than DENSE_LIMIT
+    combinations.
+    """
+    labels = []
+    for name in levels:
+        members = level_members(name, data_dir)[0]
+        labels.append([member for member in members if member in filters[name]] if name in filters else members)
+    size = math.prod(len(members) for members in labels)
+    if size > DENSE_LIMIT:
+        raise ValueError(f"{' x '.join(levels)} has {size:,} member combinations, more than {DENSE_LIMIT:,}; "
+                         "use NON EMPTY on ROWS or filter the levels")
+    grid = pd.MultiIndex.from_product(labels, names=levels).to_frame(index=False)
+    return grid.merge(result, on=levels, how='left')
+
+
+def documented_examples(path='olap_cube_definition.md'):
+    """The ```mdx blocks of the cube definition"""
+    with open(path) as handle:
+        return re.findall(r"```mdx\n(.*?)```", handle.read(), flags=re.DOTALL)
+
+
+def main():
+    """Run the MDX examples of the cube definition, or statements given as arguments"""
+    statements = sys.argv[1:] or documented_examples()
+    for number, text in enumerate(statements, 1):
+        print(f"MDX query {number}")
+        print("=" * 40)
+        print(execute(text).round(2).to_string(index=False))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,778 @@
+#!/usr/bin/env python3
+"""
+OLAP Query Engine for the Square_Sales_Analytics Cube
+Executes the measures and hierarchies of olap_cube_definition.md over the
+star-schema column store: a query names measures, group-by levels and level
+filters; the engine plans the dimension joins per fact table, aggregates
+vectorized on integer member codes and evaluates derived measures on the
+aggregated columns
+"""
+
+import argparse
+import ast
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from bitmap_index import indexed, select
+from business_rules import SAFE_GLOBALS, Vectorize, check_expression, vectorize
+from dimension_store import dimension
+from distinct_count import DistinctSketch, group_sketches
+from star_schema import SCHEMA, cache_dir, load_table, store_path, take_rows
+
+CUBE_NAME = 'Square_Sales_Analytics'
+
+# hops: the fact column that enters the first dimension, then (attribute,
+# dimension) pairs for snowflaked joins. label: a dimension column or a
+# function of the dimension DataFrame. order: columns that sort the members
+Level = namedtuple('Level', ['hops', 'label', 'order'], defaults=[None])
+
+
+def _joined(*parts):
+    """Label function joining dimension columns with spaces, e.g. 'December 2024'"""
+    return lambda frame: frame[list(parts)].astype(str).agg(' '.join, axis=1)
+
+
+LEVELS = {
+    'Time.Year': Level([('date_sk', 'dim_date')], 'year_number'),
+    'Time.Quarter': Level([('date_sk', 'dim_date')], _joined('quarter_name', 'year_number'),
+                          ['year_number', 'quarter_number']),
+    'Time.Month': Level([('date_sk', 'dim_date')], _joined('month_name', 'year_number'),
+                        ['year_number', 'month_number']),
+    'Time.Week': Level([('date_sk', 'dim_date')],
+                       lambda frame: 'Week ' + frame['week_number'].astype(str) + ' ' +
+                       frame['year_number'].astype(str),
+                       ['year_number', 'week_number']),
+    'Time.Day': Level([('date_sk', 'dim_date')],
+                      lambda frame: frame['date_value'].dt.strftime('%Y-%m-%d'), ['date_value']),
+    'Time.Weekday': Level([('date_sk', 'dim_date')], 'day_name', ['day_of_week']),
+    'Time.Hour': Level([('time_sk', 'dim_time')], 'hour_24'),
+    'Time.Time Period': Level([('time_sk', 'dim_time')], 'time_period', ['hour_24']),
+    'Location.State': Level([('location_sk', 'dim_location')], 'state'),
+    'Location.City': Level([('location_sk', 'dim_location')], 'city'),
+    'Location.Store': Level([('location_sk', 'dim_location')], 'location_name', ['location_sk']),
+    'Product.Category': Level([('item_sk', 'dim_item'), ('category_sk', 'dim_category')],
+                              lambda frame: frame['category_path'].str.split('/').str[0],
+                              ['display_order']),
+    'Product.Subcategory': Level([('item_sk', 'dim_item')], 'subcategory'),
+    'Product.Item': Level([('item_sk', 'dim_item')], 'item_name', ['item_sk']),
+    'Product.Item Type': Level([('item_sk', 'dim_item')], 'item_type'),
+    'Product.Modifier': Level([('modifier_sk', 'dim_item')], 'item_name', ['item_sk']),
+    'Customer.Segment': Level([('customer_sk', 'dim_customer')], 'customer_segment'),
+    'Customer.Loyalty Tier': Level([('customer_sk', 'dim_customer')], 'loyalty_tier'),
+    'Customer.Customer': Level([('customer_sk', 'dim_customer')], 'full_name', ['customer_sk']),
+    'Customer.Gender': Level([('customer_sk', 'dim_customer')], 'gender'),
+    'Employee.Department': Level([('employee_sk', 'dim_employee')], 'department'),
+    'Employee.Job Title': Level([('employee_sk', 'dim_employee')], 'job_title'),
+    'Employee.Employee': Level([('employee_sk', 'dim_employee')], 'full_name', ['employee_sk']),
+    'Payment.Payment Type': Level([('payment_method_sk', 'dim_payment_method')], 'payment_type'),
+    'Payment.Card Brand': Level([('payment_method_sk', 'dim_payment_method')], 'card_brand'),
+    'Payment.Payment Method': Level([('payment_method_sk', 'dim_payment_method')],
+                                    'payment_method_name', ['payment_method_sk']),
+}
+
+# Many-to-many levels: an entry column that lives on a bridge table, joined to
+# the fact on a shared column. Fact rows fan out to one row per bridge match,
+# so a line without modifiers has no Product.Modifier member
+BRIDGES = {'modifier_sk': ('bridge_transaction_modifier', 'transaction_sk')}
+
+# Drill paths of the cube definition's hierarchies, coarsest level first
+HIERARCHIES = {
+    'Time': ['Time.Year', 'Time.Quarter', 'Time.Month', 'Time.Week', 'Time.Day', 'Time.Hour',
+             'Time.Time Period'],
+    'Location': ['Location.State', 'Location.City', 'Location.Store'],
+    'Product': ['Product.Category', 'Product.Subcategory', 'Product.Item'],
+    'Customer': ['Customer.Segment', 'Customer.Loyalty Tier', 'Customer.Customer'],
+    'Employee': ['Employee.Department', 'Employee.Job Title', 'Employee.Employee'],
+    'Payment': ['Payment.Payment Type', 'Payment.Card Brand', 'Payment.Payment Method'],
+}
+
+# Base measures aggregate one fact column: sum, count (rows), distinct (exact)
+# or approx_distinct (a mergeable sketch, exact up to EXACT_LIMIT members).
+# where: optional row filter in business-rule expression syntax
+# bridged: optional BRIDGES column; only fact rows with a row in that bridge count
+BaseMeasure = namedtuple('BaseMeasure', ['fact', 'column', 'aggregate', 'where', 'bridged'],
+                         defaults=[None, None])
+
+BASE_MEASURES = {
+    'Gross Sales Amount': BaseMeasure('fact_sales_transaction', 'gross_sales_amount', 'sum'),
+    'Net Sales Amount': BaseMeasure('fact_sales_transaction', 'net_sales_amount', 'sum'),
+    'Transaction Count': BaseMeasure('fact_sales_transaction', 'transaction_id', 'distinct'),
+    'Item Quantity': BaseMeasure('fact_sales_transaction', 'item_quantity', 'sum'),
+    'Total Discounts': BaseMeasure('fact_sales_transaction', 'discount_amount', 'sum'),
+    'Total Comps': BaseMeasure('fact_sales_transaction', 'comp_amount', 'sum'),
+    'Total Modifiers': BaseMeasure('fact_sales_transaction', 'modifier_amount', 'sum'),
+    'Customer Count': BaseMeasure('fact_sales_transaction', 'customer_sk', 'approx_distinct'),
+    'Transactions with Modifiers': BaseMeasure('fact_sales_transaction', 'transaction_id', 'distinct',
+                                               bridged='modifier_sk'),
+    'Line Item Count': BaseMeasure('fact_sales_transaction', 'transaction_sk', 'count'),
+    'Total Cost': BaseMeasure('fact_item_sales', 'total_cost', 'sum'),
+    'Labor Cost': BaseMeasure('fact_labor_cost', 'total_labor_cost', 'sum'),
+    'Total Hours Worked': BaseMeasure('fact_labor_cost', 'hours_worked', 'sum'),
+}
+
+# Derived measures are expressions over other measures, evaluated on the
+# aggregated columns; division by zero yields NaN
+DERIVED_MEASURES = {
+    'Average Transaction Value': '[Net Sales Amount] / [Transaction Count]',
+    'Gross Profit': '[Net Sales Amount] - [Total Cost]',
+    'Gross Profit Margin %': '[Gross Profit] / [Net Sales Amount] * 100',
+    'Labor Cost %': '[Labor Cost] / [Net Sales Amount] * 100',
+    'Discount Rate %': '[Total Discounts] / [Gross Sales Amount] * 100',
+    'Average Visit Frequency': '[Transaction Count] / [Customer Count]',
+    'Items per Transaction': '[Item Quantity] / [Transaction Count]',
+    'Modifier Attachment Rate': '[Transactions with Modifiers] / [Transaction Count] * 100',
+    'Sales per Employee Hour': '[Net Sales Amount] / [Total Hours Worked]',
+}
+
+# Materialized pre-aggregations; queries are routed to the smallest one whose
+# grain covers them. Grain entries are fact key columns or level names
+ROLLUPS = [
+    {'name': 'sales_day_store_category_segment', 'fact': 'fact_sales_transaction',
+     'grain': ['date_sk', 'location_sk', 'Product.Category', 'Customer.Segment']},
+    {'name': 'sales_day_store', 'fact': 'fact_sales_transaction', 'grain': ['date_sk', 'location_sk']},
+    {'name': 'sales_day_item', 'fact': 'fact_sales_transaction', 'grain': ['date_sk', 'item_sk']},
+    {'name': 'item_sales_day_store_item', 'fact': 'fact_item_sales',
+     'grain': ['date_sk', 'location_sk', 'item_sk']},
+    {'name': 'labor_day_store_employee', 'fact': 'fact_labor_cost',
+     'grain': ['date_sk', 'location_sk', 'employee_sk']},
+]
+
+# Ranking selects candidates from slices of this many members and merges them,
+# so no step sorts the full member set
+RANK_SLICE = 1 << 16
+
+MEASURE_REFERENCE = re.compile(r'\[([^\]]+)\]')
+
+
+def measure_names():
+    """Every measure the cube exposes"""
+    return list(BASE_MEASURES) + list(DERIVED_MEASURES)
+
+
+def derived_definitions(calculated=None):
+    """Derived measures plus a query's calculated measures ({name: expression})"""
+    return {**DERIVED_MEASURES, **(calculated or {})}
+
+
+def compile_derived(expression, calculated=None):
+    """Compile a derived-measure expression into (function of measure columns, references)"""
+    references = list(dict.fromkeys(MEASURE_REFERENCE.findall(expression)))
+    for name in references:
+        if name not in BASE_MEASURES and name not in derived_definitions(calculated):
+            raise ValueError(f"unknown measure [{name}]")
+    source = MEASURE_REFERENCE.sub(lambda match: f"m{references.index(match.group(1))}", expression)
+    tree = ast.parse(source, mode='eval')
+    check_expression(tree, {f"m{i}" for i in range(len(references))})
+    code = compile(tree, f"<measure:{expression}>", 'eval')
+    namespace = SAFE_GLOBALS
+
+    def evaluate(columns):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = eval(code, namespace, {f"m{i}": columns[name] for i, name in enumerate(references)})
+        values = np.asarray(values, dtype=np.float64)
+        return np.where(np.isfinite(values), values, np.nan)
+
+    return evaluate, references
+
+
+def base_measures(measures, calculated=None):
+    """Base measures a query needs, expanding derived and calculated measures recursively"""
+    needed = []
+    derived = derived_definitions(calculated)
+
+    def expand(name):
+        if name in BASE_MEASURES:
+            needed.append(name)
+        elif name in derived:
+            for reference in compile_derived(derived[name], calculated)[1]:
+                expand(reference)
+        else:
+            raise ValueError(f"unknown measure [{name}]")
+
+    for name in measures:
+        expand(name)
+    return list(dict.fromkeys(needed))
+
+
+def level_members(name, data_dir='.'):
+    """Member labels of a level in hierarchy order and the member code of each dimension row"""
+    level = LEVELS[name]
+    table = level.hops[-1][1]
+    frame = load_table(table, data_dir=data_dir)
+    labels = frame[level.label] if isinstance(level.label, str) else level.label(frame)
+    order = frame[level.order or ([level.label] if isinstance(level.label, str) else [])]
+    members = pd.DataFrame({'label': labels.to_numpy(dtype=object)})
+    for position, column in enumerate(order):
+        members[f"order{position}"] = order[column].to_numpy()
+    keys = [column for column in members if column.startswith('order')] + ['label']
+    first = members.sort_values(keys, kind='stable').drop_duplicates('label')
+    labels = first['label'].tolist()
+    codes = pd.Index(labels).get_indexer(members['label'])
+    return labels, codes
+
+
+def resolve_rows(level, fact_frame, data_dir='.'):
+    """Row index into the level's last dimension for every fact row (-1 if unresolved)"""
+    column, table = level.hops[0]
+    rows = dimension(table, data_dir).rows(fact_frame[column])
+    for attribute, next_table in level.hops[1:]:
+        keys = dimension(table, data_dir).take(rows, attribute)
+        rows = dimension(next_table, data_dir).rows(keys)
+        table = next_table
+    return rows
+
+
+def level_codes(name, fact_frame, members, data_dir='.'):
+    """Member code of every fact row for one level (-1 for unresolved members)"""
+    rows = resolve_rows(LEVELS[name], fact_frame, data_dir)
+    codes = members[name][1]
+    return np.where(rows >= 0, codes[np.maximum(rows, 0)], -1)
+
+
+def entry_column(fact, name):
+    """Fact column a level is joined through (a bridge's shared column for bridged levels)"""
+    column = LEVELS[name].hops[0][0]
+    if column in SCHEMA[fact]:
+        return column
+    if column in BRIDGES and BRIDGES[column][1] in SCHEMA[fact]:
+        return BRIDGES[column][1]
+    return None
+
+
+def check_reachable(fact, levels):
+    """Raise if a level cannot be joined from a fact table"""
+    for name in levels:
+        if entry_column(fact, name) is None:
+            raise ValueError(f"level [{name}] is not reachable from {fact}")
+
+
+def fan_out(frame, levels, data_dir='.'):
+    """Join the bridge tables of any many-to-many levels, one row per bridge match"""
+    for column in dict.fromkeys(LEVELS[name].hops[0][0] for name in levels):
+        if column in BRIDGES and column not in frame.columns:
+            table, shared = BRIDGES[column]
+            bridge = load_table(table, columns=[shared, column], data_dir=data_dir)
+            frame = frame.merge(bridge, on=shared, how='inner')
+    return frame
+
+
+def bridged_mask(column, frame, data_dir='.'):
+    """Fact rows with at least one row in the bridge of a BRIDGES column"""
+    table, shared = BRIDGES[column]
+    keys = load_table(table, columns=[shared], data_dir=data_dir)[shared].to_numpy()
+    return np.isin(frame[shared].to_numpy(), keys)
+
+
+def where_mask(fact, expression, frame):
+    """Vectorized row filter for a measure's where clause"""
+    visitor = Vectorize(fact)
+    source = vectorize(expression, visitor)
+    columns = {f"c_{column}": frame[column].to_numpy() for column in visitor.columns}
+    return np.asarray(eval(source, SAFE_GLOBALS, columns), dtype=bool)
+
+
+def indexed_predicates(fact, filters):
+    """Level filters a fact's bitmap indexes can answer, as {attribute: [values]}"""
+    predicates = {}
+    for name, allowed in filters.items():
+        level = LEVELS[name]
+        if len(level.hops) == 1 and isinstance(level.label, str) and \
+                indexed(fact, level.label, level.hops[0][0]):
+            predicates[level.label] = list(allowed)
+    return predicates
+
+
+def read_fact(fact, columns, filters, data_dir='.'):
+    """Fact columns for a query, gathering only the rows its indexed filters select"""
+    predicates = indexed_predicates(fact, filters)
+    if not predicates:
+        return load_table(fact, columns=columns, data_dir=data_dir, fixed_point=True)
+    rows = select(fact, predicates, data_dir).positions()
+    return take_rows(fact, rows, columns=columns, data_dir=data_dir, fixed_point=True)
+
+
+def fact_columns(fact, names, levels, filters):
+    """Columns of a fact table a query reads"""
+    columns = [entry_column(fact, name) for name in list(levels) + list(filters)]
+    for name in names:
+        measure = BASE_MEASURES[name]
+        columns.append(measure.column)
+        if measure.where:
+            visitor = Vectorize(fact)
+            vectorize(measure.where, visitor)
+            columns.extend(visitor.columns)
+        if measure.bridged:
+            columns.append(BRIDGES[measure.bridged][1])
+    return list(dict.fromkeys(columns))
+
+
+def member_codes(name, frame, members, data_dir='.'):
+    """Member codes for a level, from labels stored in a rollup or by joining fact keys"""
+    if name in frame.columns:
+        return pd.Index(members[name][0]).get_indexer(frame[name])
+    return level_codes(name, frame, members, data_dir)
+
+
+def measure_inputs(fact, names, frame, data_dir='.'):
+    """Per-row additive values and distinct-value frames for base measures read from a fact"""
+    values, distinct = {}, {}
+    for name in names:
+        measure = BASE_MEASURES[name]
+        selected = where_mask(fact, measure.where, frame) if measure.where else None
+        if measure.bridged:
+            bridged = bridged_mask(measure.bridged, frame, data_dir)
+            selected = bridged if selected is None else selected & bridged
+        if measure.aggregate in ('distinct', 'approx_distinct'):
+            pairs = frame.assign(value=frame[measure.column])
+            pairs = pairs if selected is None else pairs[selected]
+            distinct[name] = pairs[pairs['value'].notna().to_numpy()]
+        else:
+            value = frame[measure.column].to_numpy() if measure.aggregate == 'sum' else \
+                np.ones(len(frame), dtype=np.int64)
+            values[name] = value if selected is None else np.where(selected, value, 0)
+    return values, distinct
+
+
+def group_keys(frame, levels, filters, members, data_dir='.'):
+    """Member codes of the group-by levels and the rows that pass the filters"""
+    keep = np.ones(len(frame), dtype=bool)
+    for name, allowed in filters.items():
+        labels = members[name][0]
+        wanted = [labels.index(value) for value in allowed if value in labels]
+        keep &= np.isin(member_codes(name, frame, members, data_dir), wanted)
+    keys = pd.DataFrame({name: member_codes(name, frame, members, data_dir)[keep] for name in levels})
+    if not levels:
+        keys['__all__'] = np.zeros(int(keep.sum()), dtype=np.int64)
+    return keys, keep
+
+
+def fact_partials(fact, names, levels, filters, members, rollups=None, data_dir='.'):
+    """Partial aggregates of one fact table's base measures by level member codes.
+
+    Returns the additive sums (money still in cents) indexed by member codes
+    and, per distinct-count measure, the deduplicated (codes, value) pairs
+    or, for approximate ones, one DistinctSketch per cell; all of them roll
+    up to any subset of the levels. Reads the smallest
+    materialized rollup that covers the levels and filters, and the fact
+    table itself only when no rollup does; fact reads are narrowed by the
+    bitmap indexes of any indexed filter attributes first.
+    """
+    check_reachable(fact, list(levels) + list(filters))
+    rollup = route(fact, list(levels) + list(filters), rollups, data_dir)
+    if rollup is None:
+        frame = read_fact(fact, fact_columns(fact, names, levels, filters), filters, data_dir)
+        frame = fan_out(frame, list(levels) + list(filters), data_dir)
+        values, distinct = measure_inputs(fact, names, frame, data_dir)
+    else:
+        frame = rollup['cells']
+        values = {name: frame[name].to_numpy() for name in names if name not in rollup['distinct']}
+        distinct = {name: rollup['distinct'][name] for name in names if name in rollup['distinct']}
+
+    keys, keep = group_keys(frame, levels, filters, members, data_dir)
+    key_columns = list(keys.columns)
+    sums = None
+    if values:
+        sums = keys.assign(**{name: value[keep] for name, value in values.items()})
+        sums = sums.groupby(key_columns, sort=False)[list(values)].sum()
+    states = {}
+    for name, pairs in distinct.items():
+        pair_keys, pair_keep = group_keys(pairs, levels, filters, members, data_dir)
+        if 'sketch' in pairs.columns:
+            states[name] = group_sketches(pair_keys, sketches=pairs['sketch'].to_numpy()[pair_keep])
+        elif BASE_MEASURES[name].aggregate == 'approx_distinct':
+            states[name] = group_sketches(pair_keys, values=pairs['value'][pair_keep])
+        else:
+            pair_keys['value'] = pairs['value'].to_numpy()[pair_keep]
+            states[name] = pair_keys.drop_duplicates()
+    return sums, states
+
+
+def roll_up(partials, levels):
+    """Partials of a finer grain aggregated up to a subset of its levels"""
+    sums, states = partials
+    key_columns = list(levels) or ['__all__']
+    if sums is not None:
+        cells = sums.reset_index().assign(__all__=0)
+        sums = cells.groupby(key_columns, sort=False)[list(sums.columns)].sum()
+    states = {name: group_sketches(pairs.assign(__all__=0)[key_columns], sketches=pairs['sketch'].to_numpy())
+              if 'sketch' in pairs.columns else pairs.assign(__all__=0)[key_columns + ['value']].drop_duplicates()
+              for name, pairs in states.items()}
+    return sums, states
+
+
+def finish_partials(fact, names, partials):
+    """Measure columns from partials: money sums in dollars, distinct states counted"""
+    sums, states = partials
+    results = []
+    if sums is not None:
+        sums = sums.copy()
+        for name in sums.columns:
+            measure = BASE_MEASURES[name]
+            if measure.aggregate == 'sum' and SCHEMA[fact][measure.column] == 'money':
+                sums[name] = sums[name] / 100.0
+        results.append(sums)
+    for name, pairs in states.items():
+        key_columns = [column for column in pairs.columns if column not in ('value', 'sketch')]
+        if 'sketch' in pairs.columns:
+            results.append(pairs.set_index(key_columns)['sketch'].map(DistinctSketch.count).rename(name))
+        else:
+            results.append(pairs.groupby(key_columns, sort=False).size().rename(name))
+    return pd.concat(results, axis=1)[names] if results else pd.DataFrame()
+
+
+def aggregate_fact(fact, names, levels, filters, members, rollups=None, data_dir='.'):
+    """Aggregate one fact table's base measures by level member codes"""
+    return finish_partials(fact, names, fact_partials(fact, names, levels, filters, members, rollups, data_dir))
+
+
+def rollup_signature(spec, data_dir='.'):
+    """Digest of a rollup's definition and the stores it is built from"""
+    measures = {name: list(measure) for name, measure in BASE_MEASURES.items() if measure.fact == spec['fact']}
+    tables = [spec['fact']] + [table for name in spec['grain'] if name in LEVELS
+                               for _, table in LEVELS[name].hops] + \
+        [BRIDGES[measure.bridged][0] for measure in BASE_MEASURES.values()
+         if measure.fact == spec['fact'] and measure.bridged]
+    payload = json.dumps({'spec': spec, 'measures': measures,
+                          'stores': [store_path(table, data_dir).name for table in tables]}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def rollup_path(spec, data_dir='.'):
+    """Cache file of a rollup for the current fact and dimension contents"""
+    return cache_dir(data_dir) / 'rollups' / f"{spec['name']}-{rollup_signature(spec, data_dir)}.pkl"
+
+
+def build_rollup(spec, data_dir='.'):
+    """Materialize a rollup: additive measures per grain cell plus distinct-value states.
+
+    Grain entries are fact key columns (finer levels are re-derived through
+    the dimensions at query time) or level names (stored as member labels).
+    Exact distinct counts keep their deduplicated (grain, value) pairs and
+    approximate ones a DistinctSketch per grain cell, so both merge when a
+    query rolls the rollup up further.
+    """
+    fact = spec['fact']
+    column_grain = [name for name in spec['grain'] if name not in LEVELS]
+    level_grain = [name for name in spec['grain'] if name in LEVELS]
+    check_reachable(fact, level_grain)
+    names = [name for name, measure in BASE_MEASURES.items() if measure.fact == fact]
+    frame = load_table(fact, columns=list(dict.fromkeys(column_grain + fact_columns(fact, names, level_grain, {}))),
+                       data_dir=data_dir, fixed_point=True)
+
+    grain = pd.DataFrame({column: frame[column] for column in column_grain})
+    for name in level_grain:
+        members = {name: level_members(name, data_dir)}
+        labels = np.array(members[name][0] + [None], dtype=object)
+        grain[name] = labels[level_codes(name, frame, members, data_dir)]
+
+    values, distinct = measure_inputs(fact, names, frame, data_dir)
+    cells = grain.assign(**values).groupby(spec['grain'], dropna=False, sort=True)[list(values)].sum()
+    states = {}
+    for name, pairs in distinct.items():
+        if BASE_MEASURES[name].aggregate == 'approx_distinct':
+            states[name] = group_sketches(grain.loc[pairs.index], values=pairs['value'])
+        else:
+            state = grain.loc[pairs.index].assign(value=pairs['value'].to_numpy())
+            states[name] = state.drop_duplicates().reset_index(drop=True)
+    return {'name': spec['name'], 'grain': spec['grain'], 'cells': cells.reset_index(),
+            'distinct': states, 'rows': len(cells)}
+
+
+def open_rollup(spec, data_dir='.'):
+    """Load a rollup, materializing it on first use or after its sources change"""
+    path = rollup_path(spec, data_dir)
+    if path.exists():
+        return pd.read_pickle(path)
+    rollup = build_rollup(spec, data_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for stale in path.parent.glob(f"{spec['name']}-*.pkl"):
+        stale.unlink()
+    tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    pd.to_pickle(rollup, tmp_path)
+    os.replace(tmp_path, path)
+    return rollup
+
+
+def covers(spec, levels):
+    """Whether a rollup's grain can answer every level (directly or through a key column)"""
+    grain = set(spec['grain'])
+    return all(name in grain or LEVELS[name].hops[0][0] in grain for name in levels)
+
+
+def route(fact, levels, rollups=None, data_dir='.'):
+    """Smallest rollup of a fact covering the levels, or None to read the fact table"""
+    best = None
+    for spec in (ROLLUPS if rollups is None else rollups):
+        if spec['fact'] == fact and covers(spec, levels):
+            rollup = open_rollup(spec, data_dir)
+            if best is None or rollup['rows'] < best['rows']:
+                best = rollup
+    return best
+
+
+def load_rollups(path):
+    """Read rollup definitions ({name, fact, grain}) from a JSON file"""
+    with open(path) as handle:
+        specs = json.load(handle)
+    for spec in specs:
+        if set(spec) != {'name', 'fact', 'grain'} or spec['fact'] not in SCHEMA:
+            raise ValueError(f"invalid rollup definition: {spec}")
+    return specs
+
+
+def query(measures, levels=(), filters=None, rollups=None, data_dir='.', calculated=None):
+    """Evaluate measures grouped by levels, with optional {level: [member labels]} filters.
+
+    Base measures from different fact tables are aggregated separately at the
+    same grain and joined on the level members (drill-across); derived
+    measures are then evaluated on the joined columns. Returns a DataFrame
+    with one column per level (member labels) followed by the measures, rows
+    in hierarchy order. rollups defaults to ROLLUPS; pass [] to always read
+    the fact tables. calculated adds query-scoped {name: expression}
+    measures in derived-measure syntax.
+    """
+    levels = list(levels)
+    filters = dict(filters or {})
+    check_levels(levels + list(filters))
+    needed = base_measures(measures, calculated)
+    members = {name: level_members(name, data_dir) for name in dict.fromkeys(levels + list(filters))}
+
+    parts = [aggregate_fact(fact, names, levels, filters, members, rollups, data_dir)
+             for fact, names in facts_of(needed).items()]
+    cells = pd.concat(parts, axis=1).fillna(0).sort_index()
+    return result_frame(cells, measures, needed, levels, members, calculated)
+
+
+def check_levels(levels):
+    """Raise on level names the cube does not define"""
+    for name in levels:
+        if name not in LEVELS:
+            raise ValueError(f"unknown level [{name}]")
+
+
+def facts_of(needed):
+    """Base measures grouped by the fact table they aggregate"""
+    by_fact = {}
+    for name in needed:
+        by_fact.setdefault(BASE_MEASURES[name].fact, []).append(name)
+    return by_fact
+
+
+def result_frame(cells, measures, needed, levels, members, calculated=None):
+    """Member labels of the levels followed by the measures, derived measures evaluated"""
+    columns = {name: cells[name].to_numpy() for name in needed}
+    for name in measures:
+        if name not in columns:
+            columns[name] = derived_values(name, columns, calculated)
+
+    result = pd.DataFrame(index=range(len(cells)))
+    codes = cells.index.to_frame(index=False)
+    for name in levels:
+        labels = np.array(members[name][0] + [None], dtype=object)
+        result[name] = labels[codes[name].to_numpy()]
+    for name in measures:
+        result[name] = columns[name]
+    return result
+
+
+def rollup_sets(levels):
+    """ROLLUP(levels): every prefix of a drill path, down to the grand total"""
+    levels = list(levels)
+    return [levels[:size] for size in range(len(levels), -1, -1)]
+
+
+def cube_sets(levels):
+    """CUBE(levels): every subset of the levels, including the grand total"""
+    levels = list(levels)
+    return [list(subset) for size in range(len(levels), -1, -1)
+            for subset in itertools.combinations(levels, size)]
+
+
+def partial_size(partials):
+    """Number of cells held by a fact's partial aggregates"""
+    sums, states = partials
+    return len(sums) if sums is not None else max(len(pairs) for pairs in states.values())
+
+
+def grouping_sets(measures, sets, filters=None, rollups=None, data_dir='.'):
+    """Evaluate measures for several grouping sets (GROUPING SETS) from one scan per fact.
+
+    Each fact table is read once, at the grain of the union of all sets;
+    every set is then rolled up from the smallest partial aggregate already
+    computed for a superset of its levels, so a full drill path costs one
+    aggregation. Returns one DataFrame with a column per level (None where a
+    set rolls the level up), a SQL-style 'Grouping ID' (bit set for each
+    rolled-up level, first level most significant) and the measures. Rows are
+    in drill-down order: each subtotal precedes its members, the grand total
+    comes first. Use rollup_sets / cube_sets to expand ROLLUP and CUBE.
+    """
+    sets = [list(dict.fromkeys(grouping)) for grouping in sets]
+    levels = list(dict.fromkeys(name for grouping in sets for name in grouping))
+    filters = dict(filters or {})
+    check_levels(levels + list(filters))
+    needed = base_measures(measures)
+    members = {name: level_members(name, data_dir) for name in dict.fromkeys(levels + list(filters))}
+    ordered = [tuple(name for name in levels if name in grouping) for grouping in sets]
+
+    cells = {grouping: [] for grouping in ordered}
+    for fact, names in facts_of(needed).items():
+        computed = {tuple(levels): fact_partials(fact, names, levels, filters, members, rollups, data_dir)}
+        for grouping in sorted(set(ordered), key=len, reverse=True):
+            if grouping not in computed:
+                sources = [key for key in computed if set(grouping) <= set(key)]
+                source = min(sources, key=lambda key: partial_size(computed[key]))
+                computed[grouping] = roll_up(computed[source], grouping)
+            cells[grouping].append(finish_partials(fact, names, computed[grouping]))
+
+    blocks, codes = [], []
+    for grouping in dict.fromkeys(ordered):
+        block = pd.concat(cells[grouping], axis=1).fillna(0).sort_index()
+        frame = result_frame(block, measures, needed, grouping, members)
+        block_codes = block.index.to_frame(index=False)
+        rolled = [name for name in levels if name not in grouping]
+        for name in rolled:
+            frame[name] = None
+            block_codes[name] = -2
+        frame.insert(0, 'Grouping ID', sum(1 << (len(levels) - 1 - levels.index(name)) for name in rolled))
+        blocks.append(frame[levels + ['Grouping ID'] + list(measures)])
+        codes.append(block_codes[levels] if levels else pd.DataFrame(index=block.index))
+    result = pd.concat(blocks, ignore_index=True)
+    if levels:
+        order = pd.concat(codes, ignore_index=True).sort_values(levels, kind='stable').index
+        result = result.loc[order].reset_index(drop=True)
+    return result
+
+
+def derived_values(name, columns, calculated=None):
+    """Evaluate a derived measure, evaluating the derived measures it references first"""
+    evaluate, references = compile_derived(derived_definitions(calculated)[name], calculated)
+    for reference in references:
+        if reference not in columns:
+            columns[reference] = derived_values(reference, columns, calculated)
+    return evaluate(columns)
+
+
+def select_ranked(values, count, bottom=False):
+    """Positions of the count largest (smallest if bottom) values, best first.
+
+    Each slice of RANK_SLICE members contributes its own top count through a
+    partial selection; the sorted candidate lists are then merged through a
+    heap. Ties go to the earlier position and NaN (empty) values never rank.
+    """
+    keys = np.asarray(values, dtype=np.float64)
+    keys = keys if bottom else -keys
+    valid = np.flatnonzero(~np.isnan(keys))
+    candidates = []
+    for start in range(0, len(valid), RANK_SLICE):
+        part = valid[start:start + RANK_SLICE]
+        size = min(count, len(part))
+        if size <= 0:
+            continue
+        kth = np.partition(keys[part], size - 1)[size - 1]
+        better = part[keys[part] < kth]
+        local = np.concatenate([better, part[keys[part] == kth][:size - len(better)]])
+        local = local[np.lexsort((local, keys[local]))]
+        candidates.append(list(zip(keys[local].tolist(), local.tolist())))
+    return [position for _, position in itertools.islice(heapq.merge(*candidates), max(count, 0))]
+
+
+def ranked(measures, levels, by, count=None, percent=None, bottom=False, filters=None, rollups=None,
+           data_dir='.', calculated=None):
+    """TOPCOUNT / BOTTOMCOUNT / BOTTOMPERCENT: level members ranked by one measure.
+
+    Only the ranking measure is aggregated over every member; the limit is
+    then pushed into the remaining measures, which are aggregated just for
+    the winning members by filtering on them. percent keeps that share of
+    the non-empty members (rounded up). Returns the levels, the measures
+    and the ranking measure, best first.
+    """
+    levels = list(levels)
+    filters = dict(filters or {})
+    ranking = query([by], levels, filters, rollups, data_dir, calculated)
+    if percent is not None:
+        count = math.ceil(ranking[by].notna().sum() * percent / 100)
+    winners = ranking.iloc[select_ranked(ranking[by].to_numpy(), count, bottom)].reset_index(drop=True)
+
+    others = [name for name in measures if name != by]
+    columns = levels + list(dict.fromkeys(list(measures) + [by]))
+    if not others or winners.empty:
+        return winners.assign(**{name: np.nan for name in others})[columns]
+    narrowed = dict(filters)
+    for name in levels:
+        if winners[name].notna().all():
+            narrowed[name] = list(dict.fromkeys(winners[name]))
+    rest = query(others, levels, narrowed, rollups, data_dir, calculated)
+    return winners.merge(rest, on=levels, how='left')[columns] if levels else \
+        winners.assign(**{name: rest[name].to_numpy() for name in others})[columns]
+
+
+def top_count(measures, levels, by, count, filters=None, rollups=None, data_dir='.'):
+    """TOPCOUNT(levels, count, by)"""
+    return ranked(measures, levels, by, count=count, filters=filters, rollups=rollups, data_dir=data_dir)
+
+
+def bottom_count(measures, levels, by, count, filters=None, rollups=None, data_dir='.'):
+    """BOTTOMCOUNT(levels, count, by)"""
+    return ranked(measures, levels, by, count=count, bottom=True, filters=filters, rollups=rollups,
+                  data_dir=data_dir)
+
+
+def bottom_percent(measures, levels, by, percent, filters=None, rollups=None, data_dir='.'):
+    """The bottom percent of members by a measure, e.g. the Bottom 10% Performers"""
+    return ranked(measures, levels, by, percent=percent, bottom=True, filters=filters, rollups=rollups,
+                  data_dir=data_dir)
+
+
+def main():
+    """Run a few of the cube definition's example analyses"""
+    parser = argparse.ArgumentParser(description=f"Example queries against the {CUBE_NAME} cube")
+    parser.add_argument('--rollups', metavar='FILE',
+                        help="JSON list of rollup definitions to use instead of the built-in ones")
+    parser.add_argument('--no-rollups', action='store_true',
+                        help="answer every query from the fact tables")
+    args = parser.parse_args()
+    rollups = [] if args.no_rollups else (load_rollups(args.rollups) if args.rollups else None)
+    
+    print(f"{CUBE_NAME} Query Engine")
+    print("=" * 40)
+    examples = [
+        (['Net Sales Amount', 'Transaction Count', 'Average Transaction Value', 'Items per Transaction'],
+         ['Location.Store'], None),
+        (['Net Sales Amount', 'Total Discounts', 'Discount Rate %', 'Gross Profit Margin %'],
+         ['Product.Category'], None),
+        (['Net Sales Amount', 'Customer Count', 'Average Transaction Value'],
+         ['Customer.Segment', 'Payment.Payment Type'], {'Time.Quarter': ['Q4 2024']}),
+        (['Net Sales Amount', 'Labor Cost', 'Labor Cost %', 'Sales per Employee Hour'],
+         ['Time.Day'], None),
+    ]
+    for measures, levels, filters in examples:
+        print(f"\n{', '.join(measures)} by {' x '.join(levels)}")
+        print(query(measures, levels, filters, rollups).round(2).to_string(index=False))
+
+    drill_path = HIERARCHIES['Product']
+    measures = ['Net Sales Amount', 'Transaction Count', 'Average Transaction Value']
+    print(f"\n{', '.join(measures)} by ROLLUP({' > '.join(drill_path)})")
+    print(grouping_sets(measures, rollup_sets(drill_path), rollups=rollups).round(2).to_string(index=False))
+
+    print("\nTop 10 Items by Revenue")
+    print(top_count(['Item Quantity'], ['Product.Item'], 'Net Sales Amount', 10, rollups=rollups)
+          .round(2).to_string(index=False))
+    print("\nTop 5 Locations by Profit")
+    print(top_count(['Net Sales Amount'], ['Location.Store'], 'Gross Profit', 5, rollups=rollups)
+          .round(2).to_string(index=False))
+    print("\nBottom 10% Performers (Sales per Hour)")
+    print(bottom_percent(['Labor Cost'], ['Employee.Employee'], 'Sales per Employee Hour', 10, rollups=rollups)
+          .round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Fact Reconciliation for the Square OLAP Cube
+Hash-aggregates fact_sales_transaction, fact_item_sales and the modifier
+bridge on their shared keys and reports quantity and amount drift, spilling
+partial aggregates to disk so memory stays bounded on full history
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from star_schema import SCHEMA, cache_dir, iter_chunks, load_table, open_columns
+
+SAMPLE_LIMIT = 5
+CHUNK_SIZE = 1_000_000
+BUCKETS = 64
+
+# Partial-aggregate rows held in memory before they are spilled to disk
+SPILL_ROWS = 2_000_000
+
+# Money measures are summed in cents; drift up to this many cents is rounding
+TOLERANCE_CENTS = 1
+
+# Each side maps a shared measure name to the column that carries it.
+# require_match: report keys present on only one side (otherwise the missing
+# side counts as zero, e.g. transactions without modifiers)
+# lookup: key columns a side lacks, found through the parent fact line its
+# transaction_sk points at
+# skip_modifiers: sides whose MODIFIER item lines are left out
+RECONCILIATIONS = [
+    {
+        'name': 'sales_vs_item_sales',
+        'keys': ['transaction_sk', 'item_sk'],
+        'left': ('fact_sales_transaction', {
+            'quantity': 'item_quantity', 'extended_price': 'extended_price',
+            'discount_amount': 'discount_amount', 'comp_amount': 'comp_amount'}),
+        'right': ('fact_item_sales', {
+            'quantity': 'quantity_sold', 'extended_price': 'extended_price',
+            'discount_amount': 'item_discount_amount', 'comp_amount': 'item_comp_amount'}),
+        'require_match': True,
+        # fact_item_sales folds modifiers into the parent item's row
+        'skip_modifiers': ['left'],
+        'issue': "Sales and item-sales facts disagree",
+    },
+    {
+        'name': 'bridge_vs_item_sales',
+        'keys': ['transaction_sk'],
+        'left': ('bridge_transaction_modifier', {'modifier_amount': 'modifier_amount'}),
+        'right': ('fact_item_sales', {'modifier_amount': 'modifier_amount'}),
+        'require_match': False,
+        'issue': "Bridge modifier totals differ from fact_item_sales.modifier_amount",
+    },
+    {
+        'name': 'bridge_vs_sales',
+        # The bridge points at the parent line while fact_sales_transaction
+        # carries the amount on a separate modifier line of the transaction
+        'keys': ['transaction_id'],
+        'left': ('bridge_transaction_modifier', {'modifier_amount': 'modifier_amount'}),
+        'right': ('fact_sales_transaction', {'modifier_amount': 'modifier_amount'}),
+        'require_match': False,
+        'lookup': ['left'],
+        'issue': "Bridge modifier totals differ from fact_sales_transaction.modifier_amount",
+    },
+]
+
+
+class PartialAggregates:
+    """Hash-partitioned partial sums that spill to disk past a row budget"""
+
+    def __init__(self, keys, measures, directory, prefix, buckets=BUCKETS, budget=SPILL_ROWS):
+        self.keys = keys
+        self.measures = measures
+        self.directory = directory
+        self.prefix = prefix
+        self.buckets = buckets
+        self.budget = budget
+        self.buffers = [[] for _ in range(buckets)]
+        self.spills = [[] for _ in range(buckets)]
+        self.rows = 0
+
+    def add(self, frame):
+        """Pre-aggregate a chunk and route its groups to buckets"""
+        partial = frame.groupby(self.keys, sort=False, as_index=False)[self.measures].sum()
+        bucket = pd.util.hash_array(partial[self.keys[0]].to_numpy()) % np.uint64(self.buckets)
+        for index, part in partial.groupby(bucket, sort=False):
+            self.buffers[int(index)].append(part)
+        self.rows += len(partial)
+        if self.rows > self.budget:
+            self.spill()
+
+    def spill(self):
+        """Compact every buffered bucket and write it out as one npz per bucket"""
+        for index, parts in enumerate(self.buffers):
+            if not parts:
+                continue
+            combined = self.combine(parts)
+            path = self.directory / f"{self.prefix}-{index}-{len(self.spills[index])}.npz"
+            np.savez(path, **{column: combined[column].to_numpy(dtype=key_dtype(column))
+                              if column in self.keys else combined[column].to_numpy() for column in combined})
+            self.spills[index].append(path)
+            self.buffers[index] = []
+        self.rows = 0
+
+    def combine(self, parts):
+        """Sum partial aggregates that may repeat keys"""
+        if not parts:
+            return pd.DataFrame({column: pd.Series(dtype=key_dtype(column) if column in self.keys else np.int64)
+                                 for column in self.keys + self.measures})
+        return pd.concat(parts, ignore_index=True).groupby(self.keys, as_index=False)[self.measures].sum()
+
+    def bucket(self, index):
+        """Final aggregate of one bucket, from its spill files and memory"""
+        parts = list(self.buffers[index])
+        for path in self.spills[index]:
+            with np.load(path) as stored:
+                parts.append(pd.DataFrame({column: stored[column] for column in stored.files}))
+        return self.combine(parts)
+
+
+def key_dtype(column):
+    """Dtype of a key column: text keys are strings, the rest int64"""
+    return str if column == 'transaction_id' else np.int64
+
+
+def side_columns(reconciliation, side):
+    """Columns a side reads from its table"""
+    table, measures = reconciliation[side]
+    keys = ['transaction_sk' if side in reconciliation.get('lookup', []) and key not in SCHEMA[table] else key
+            for key in reconciliation['keys']]
+    modifiers = ['item_sk'] if side in reconciliation.get('skip_modifiers', []) else []
+    return list(dict.fromkeys(keys + modifiers + list(measures.values())))
+
+
+def side_frame(chunk, reconciliation, side, parents):
+    """Project a chunk onto the shared key and measure names.
+
+    Key columns the side lacks are looked up in parents, and MODIFIER
+    item lines are dropped for sides listed under skip_modifiers.
+    """
+    table, measures = reconciliation[side]
+    if side in reconciliation.get('skip_modifiers', []):
+        chunk = chunk[~chunk['item_sk'].isin(parents['modifiers'])]
+    frame = pd.DataFrame(index=chunk.index)
+    for key in reconciliation['keys']:
+        if key in SCHEMA[table]:
+            frame[key] = chunk[key].to_numpy(dtype=key_dtype(key))
+        else:
+            frame[key] = parent_values(parents, chunk['transaction_sk'].to_numpy(dtype=np.int64))
+    for measure, column in measures.items():
+        frame[measure] = chunk[column].fillna(0).to_numpy(dtype=np.int64)
+    return frame
+
+
+def load_parents(reconciliations, data_dir='.'):
+    """Parent fact lines by transaction_sk and the MODIFIER item keys, as the reconciliations need them"""
+    parents = {}
+    if any(reconciliation.get('lookup') for reconciliation in reconciliations):
+        columns = open_columns('fact_sales_transaction', ['transaction_sk', 'transaction_id'], data_dir)
+        keys = np.asarray(columns['transaction_sk'], dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        parents.update(keys=keys[order], rows=order, transaction_id=columns['transaction_id'])
+    if any(reconciliation.get('skip_modifiers') for reconciliation in reconciliations):
+        items = load_table('dim_item', columns=['item_sk', 'item_type'], data_dir=data_dir)
+        parents['modifiers'] = items.loc[items['item_type'] == 'MODIFIER', 'item_sk'].to_numpy(dtype=np.int64)
+    return parents
+
+
+def parent_values(parents, wanted):
+    """transaction_id of the parent lines with the given transaction_sk ('' when there is none)"""
+    keys = parents['keys']
+    if not len(keys):
+        return np.full(len(wanted), '')
+    slot = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+    found = keys[slot] == wanted
+    values = np.asarray(parents['transaction_id'][parents['rows'][slot]], dtype=str)
+    return np.where(found, values, '')
+
+
+def measure_kinds(reconciliation):
+    """Schema kind of each shared measure (money measures are in cents)"""
+    table, measures = reconciliation['left']
+    return {measure: SCHEMA[table][column] for measure, column in measures.items()}
+
+
+def aggregate_all(reconciliations, directory, chunk_size=CHUNK_SIZE, data_dir='.'):
+    """Read every involved table once, feeding each chunk to all aggregators that use it"""
+    aggregators = {}
+    readers = {}
+    for reconciliation in reconciliations:
+        for side in ('left', 'right'):
+            table, measures = reconciliation[side]
+            aggregator = PartialAggregates(reconciliation['keys'], list(measures), directory,
+                                           f"{reconciliation['name']}-{side}")
+            aggregators[(reconciliation['name'], side)] = aggregator
+            readers.setdefault(table, []).append((aggregator, reconciliation, side))
+
+    parents = load_parents(reconciliations, data_dir)
+    for table in SCHEMA:
+        if table not in readers:
+            continue
+        columns = list(dict.fromkeys(column for _, reconciliation, side in readers[table]
+                                     for column in side_columns(reconciliation, side)))
+        for chunk in iter_chunks(table, chunk_size, columns=columns, data_dir=data_dir, fixed_point=True):
+            for aggregator, reconciliation, side in readers[table]:
+                aggregator.add(side_frame(chunk, reconciliation, side, parents))
+    return aggregators
+
+
+def compare(reconciliation, left, right, tolerance_cents):
+    """Join the two aggregates of one reconciliation and collect drift bucket by bucket"""
+    keys = reconciliation['keys']
+    kinds = measure_kinds(reconciliation)
+    result = {'keys': 0, 'left_only': 0, 'right_only': 0, 'unmatched_samples': [],
+              'drift': {measure: {'count': 0, 'total': 0, 'samples': []} for measure in kinds}}
+
+    for index in range(left.buckets):
+        joined = left.bucket(index).merge(right.bucket(index), on=keys, how='outer',
+                                          suffixes=('_left', '_right'), indicator=True)
+        if joined.empty:
+            continue
+        joined = joined.sort_values(keys)
+        result['keys'] += len(joined)
+        if reconciliation['require_match']:
+            unmatched = joined['_merge'] != 'both'
+            result['left_only'] += int((joined['_merge'] == 'left_only').sum())
+            result['right_only'] += int((joined['_merge'] == 'right_only').sum())
+            add_samples(result['unmatched_samples'], joined.loc[unmatched, keys])
+            joined = joined[~unmatched]
+
+        for measure, kind in kinds.items():
+            difference = (joined[f"{measure}_left"].fillna(0).to_numpy(dtype=np.int64) -
+                          joined[f"{measure}_right"].fillna(0).to_numpy(dtype=np.int64))
+            limit = tolerance_cents if kind == 'money' else 0
+            drifting = np.abs(difference) > limit
+            entry = result['drift'][measure]
+            entry['count'] += int(drifting.sum())
+            entry['total'] += int(difference[drifting].sum())
+            add_samples(entry['samples'], joined.loc[drifting, keys])
+    return result
+
+
+def add_samples(samples, frame):
+    """Append key tuples until the sample limit is reached"""
+    room = SAMPLE_LIMIT - len(samples)
+    if room > 0:
+        samples.extend(tuple(value if isinstance(value, str) else int(value) for value in row)
+                       for row in frame.head(room).itertuples(index=False))
+
+
+def reconcile(reconciliations=RECONCILIATIONS, tolerance_cents=TOLERANCE_CENTS,
+              chunk_size=CHUNK_SIZE, data_dir='.'):
+    """Run every reconciliation; returns {name: comparison result}"""
+    cache = cache_dir(data_dir)
+    cache.mkdir(parents=True, exist_ok=True)
+    directory = tempfile.mkdtemp(prefix='reconcile-', dir=cache)
+    try:
+        aggregators = aggregate_all(reconciliations, Path(directory), chunk_size, data_dir)
+        return {reconciliation['name']: compare(reconciliation,
+                                                aggregators[(reconciliation['name'], 'left')],
+                                                aggregators[(reconciliation['name'], 'right')],
+                                                tolerance_cents)
+                for reconciliation in reconciliations}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def format_amount(value, kind):
+    """Render a drift total in the measure's units"""
+    return f"${value / 100:,.2f}" if kind == 'money' else f"{value:,}"
+
+
+def reconciliation_issues(results, reconciliations=RECONCILIATIONS):
+    """Print passing reconciliations and return issue strings for the rest"""
+    issues = []
+    for reconciliation in reconciliations:
+        result = results[reconciliation['name']]
+        left, right = reconciliation['left'][0], reconciliation['right'][0]
+        found = []
+        if result['left_only'] or result['right_only']:
+            found.append(f"{result['left_only']} keys only in {left}, {result['right_only']} only in {right} "
+                         f"(e.g. {result['unmatched_samples']})")
+        for measure, kind in measure_kinds(reconciliation).items():
+            entry = result['drift'][measure]
+            if entry['count']:
+                found.append(f"{measure} drifts on {entry['count']} keys, net "
+                             f"{format_amount(entry['total'], kind)} (e.g. {entry['samples']})")
+        if found:
+            issues.extend(f"{reconciliation['issue']}: {text}" for text in found)
+        else:
+            print(f"✓ {left} and {right} reconcile on {', '.join(reconciliation['keys'])} "
+                  f"({result['keys']:,} keys)")
+    return issues
+
+
+def main():
+    """Report drift between the fact tables"""
+    print("Square Cube Fact Reconciliation")
+    print("=" * 40)
+    issues = reconciliation_issues(reconcile())
+    for issue in issues:
+        print(f"✗ {issue}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Referential Integrity Engine for the Square OLAP Cube
+Declarative foreign-key map for every fact and bridge table, checked with
+vectorized semi-joins that return the row positions of orphaned records
+"""
+
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from star_schema import iter_chunks, take_rows
+
+# where: optional (attribute, value) filter restricting the parent rows
+ForeignKey = namedtuple('ForeignKey', ['column', 'parent', 'parent_key', 'nullable', 'where', 'label'],
+                        defaults=[False, None, None])
+
+FOREIGN_KEYS = {
+    'fact_sales_transaction': [
+        ForeignKey('date_sk', 'dim_date', 'date_sk'),
+        ForeignKey('time_sk', 'dim_time', 'time_sk'),
+        ForeignKey('location_sk', 'dim_location', 'location_sk'),
+        ForeignKey('employee_sk', 'dim_employee', 'employee_sk'),
+        ForeignKey('customer_sk', 'dim_customer', 'customer_sk', nullable=True),
+        ForeignKey('item_sk', 'dim_item', 'item_sk'),
+        ForeignKey('payment_method_sk', 'dim_payment_method', 'payment_method_sk'),
+    ],
+    'fact_item_sales': [
+        ForeignKey('transaction_sk', 'fact_sales_transaction', 'transaction_sk'),
+        ForeignKey('date_sk', 'dim_date', 'date_sk'),
+        ForeignKey('time_sk', 'dim_time', 'time_sk'),
+        ForeignKey('location_sk', 'dim_location', 'location_sk'),
+        ForeignKey('item_sk', 'dim_item', 'item_sk'),
+        ForeignKey('category_sk', 'dim_category', 'category_sk'),
+        ForeignKey('employee_sk', 'dim_employee', 'employee_sk'),
+    ],
+    'fact_labor_cost': [
+        ForeignKey('date_sk', 'dim_date', 'date_sk'),
+        ForeignKey('employee_sk', 'dim_employee', 'employee_sk'),
+        ForeignKey('location_sk', 'dim_location', 'location_sk'),
+    ],
+    'bridge_transaction_modifier': [
+        ForeignKey('transaction_sk', 'fact_sales_transaction', 'transaction_sk'),
+        ForeignKey('modifier_sk', 'dim_item', 'item_sk'),
+        ForeignKey('modifier_sk', 'dim_item', 'item_sk', where=('item_type', 'MODIFIER'),
+                   label="Non-modifier items referenced as modifiers"),
+    ],
+}
+
+SAMPLE_LIMIT = 5
+CHUNK_SIZE = 1_000_000
+
+# Key sets whose value range is at most this many times their size use a
+# direct-address membership table instead of binary search
+DENSE_FACTOR = 8
+
+
+def edge_name(table, fk):
+    """Stable identifier for one foreign-key edge"""
+    name = f"{table}.{fk.column}->{fk.parent}.{fk.parent_key}"
+    if fk.where:
+        name += f"[{fk.where[0]}={fk.where[1]}]"
+    return name
+
+
+def edge_issue(table, fk):
+    """Issue text reported when an edge has orphans"""
+    return fk.label or f"Orphaned {fk.column} in {table}"
+
+
+def edge_ok_message(table, fk):
+    """Confirmation printed when an edge has no orphans"""
+    if fk.where:
+        return f"All {table}.{fk.column} values reference {fk.where[0]} = {fk.where[1]}"
+    return f"All {table}.{fk.column} values have valid references"
+
+
+class KeySet:
+    """Sorted parent keys with a dense lookup table when the key range is compact"""
+
+    def __init__(self, keys):
+        keys = np.unique(np.asarray(keys, dtype=np.int64))
+        self.keys = keys
+        self.offset = int(keys[0]) if len(keys) else 0
+        self.dense = None
+        if len(keys) and keys[-1] - keys[0] < max(DENSE_FACTOR * len(keys), 1 << 16):
+            self.dense = np.zeros(int(keys[-1] - keys[0]) + 1, dtype=bool)
+            self.dense[keys - self.offset] = True
+
+    def contains(self, values):
+        """Vectorized semi-join: which values exist in the key set"""
+        values = np.asarray(values, dtype=np.int64)
+        if not len(self.keys):
+            return np.zeros(len(values), dtype=bool)
+        if self.dense is not None:
+            slot = values - self.offset
+            inside = (slot >= 0) & (slot < len(self.dense))
+            found = np.zeros(len(values), dtype=bool)
+            found[inside] = self.dense[slot[inside]]
+            return found
+        slot = np.searchsorted(self.keys, values)
+        slot[slot == len(self.keys)] = 0
+        return self.keys[slot] == values
+
+
+def load_key_set(fk, data=None, data_dir='.'):
+    """Build the key set for an edge's parent, from loaded data or streamed from disk"""
+    columns = [fk.parent_key] + ([fk.where[0]] if fk.where else [])
+    chunks = [data[fk.parent][columns]] if data is not None else \
+        iter_chunks(fk.parent, CHUNK_SIZE, columns=columns, data_dir=data_dir)
+    keys = []
+    for chunk in chunks:
+        if fk.where:
+            chunk = chunk[chunk[fk.where[0]] == fk.where[1]]
+        keys.append(np.unique(chunk[fk.parent_key].to_numpy(dtype=np.int64)))
+    return KeySet(np.concatenate(keys) if keys else [])
+
+
+def load_key_sets(tables, data=None, data_dir='.'):
+    """Key sets for every parent referenced by the given tables, shared across edges"""
+    key_sets = {}
+    for table in tables:
+        for fk in FOREIGN_KEYS[table]:
+            parent = (fk.parent, fk.parent_key, fk.where)
+            if parent not in key_sets:
+                key_sets[parent] = load_key_set(fk, data, data_dir)
+    return key_sets
+
+
+def scan_table(table, chunks, key_sets):
+    """Check every foreign key of a table in one pass over its chunks.
+
+    Returns {edge name: {'rows': orphan row positions, 'samples': first values}}.
+    Row positions come from each chunk's index, so chunks must carry their
+    global row positions (as star_schema.iter_chunks does).
+    """
+    found = {edge_name(table, fk): {'rows': [], 'samples': []} for fk in FOREIGN_KEYS[table]}
+    for chunk in chunks:
+        positions = chunk.index.to_numpy()
+        for fk in FOREIGN_KEYS[table]:
+            values = chunk[fk.column]
+            present = values.notna().to_numpy()
+            orphaned = present.copy()
+            orphaned[present] = ~key_sets[(fk.parent, fk.parent_key, fk.where)].contains(
+                values[present].to_numpy(dtype=np.int64))
+            if not fk.nullable:
+                orphaned |= ~present
+            if orphaned.any():
+                entry = found[edge_name(table, fk)]
+                entry['rows'].append(positions[orphaned])
+                room = SAMPLE_LIMIT - len(entry['samples'])
+                if room > 0:
+                    entry['samples'].extend(values[orphaned].head(room).tolist())
+
+    for entry in found.values():
+        entry['rows'] = np.concatenate(entry['rows']) if entry['rows'] else np.empty(0, dtype=np.int64)
+    return found
+
+
+def table_columns(table):
+    """Columns a table scan needs to read"""
+    return list(dict.fromkeys(fk.column for fk in FOREIGN_KEYS[table]))
+
+
+def check_tables(tables, data=None, chunk_size=CHUNK_SIZE, data_dir='.'):
+    """Scan the given tables, each once, from loaded DataFrames or in chunks from disk"""
+    key_sets = load_key_sets(tables, data, data_dir)
+    results = {}
+    for table in tables:
+        if data is not None:
+            chunks = [data[table]]
+        else:
+            chunks = iter_chunks(table, chunk_size, columns=table_columns(table), data_dir=data_dir)
+        results[table] = scan_table(table, chunks, key_sets)
+    return results
+
+
+def merge_results(parts):
+    """Merge scan results of row ranges of the same table, in range order"""
+    merged = {}
+    for part in parts:
+        for edge, entry in part.items():
+            target = merged.setdefault(edge, {'rows': [], 'samples': []})
+            target['rows'].append(entry['rows'])
+            target['samples'].extend(entry['samples'][:SAMPLE_LIMIT - len(target['samples'])])
+    for entry in merged.values():
+        entry['rows'] = np.concatenate(entry['rows'])
+    return merged
+
+
+def orphan_rows(results):
+    """Union of orphan row positions per table, with the edges each row violates"""
+    rows = {}
+    for table, edges in results.items():
+        violations = {}
+        for edge, entry in edges.items():
+            for position in entry['rows'].tolist():
+                violations.setdefault(position, []).append(edge)
+        if violations:
+            rows[table] = violations
+    return rows
+
+
+def quarantine(results, out_dir, data_dir='.'):
+    """Write orphaned rows to <out_dir>/<table>.csv by gathering their positions"""
+    out_dir = Path(out_dir)
+    written = {}
+    for table, violations in orphan_rows(results).items():
+        positions = np.array(sorted(violations), dtype=np.int64)
+        rows = take_rows(table, positions, data_dir=data_dir)
+        rows.insert(0, 'source_row', positions)
+        rows['violations'] = ["; ".join(violations[position]) for position in positions.tolist()]
+        out_dir.mkdir(parents=True, exist_ok=True)
+        rows.to_csv(out_dir / f"{table}.csv", index=False)
+        written[table] = len(rows)
+    return written
+
+
+def main():
+    """Report orphan counts for every foreign-key edge"""
+    print("Square Cube Referential Integrity")
+    print("=" * 40)
+    results = check_tables(list(FOREIGN_KEYS))
+    for table, edges in results.items():
+        for fk in FOREIGN_KEYS[table]:
+            entry = edges[edge_name(table, fk)]
+            if len(entry['rows']):
+                print(f"✗ {edge_issue(table, fk)}: {len(entry['rows'])} records "
+                      f"(rows {entry['rows'][:SAMPLE_LIMIT].tolist()})")
+            else:
+                print(f"✓ {edge_ok_message(table, fk)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Customer Segment Reports for the Square OLAP Cube
+Plans every requested segment × category report together, runs one shared
+scan and customer→item→category join, and renders each report (console
+tables and CSV exports for Excel) from the same aggregates
+"""
+
+import csv
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from dimension_store import dimension
+from distinct_count import DistinctSketch, group_sketches
+from star_schema import load_table, to_records
+from top_k import grouped
+
+# Transaction attributes resolved by the shared join: name -> (dimension, column)
+ATTRIBUTES = {
+    'customer_segment': ('dim_customer', 'customer_segment'),
+    'customer_name': ('dim_customer', 'full_name'),
+    'category_name': ('dim_category', 'category_name'),
+    'item_name': ('dim_item', 'item_name'),
+    'item_type': ('dim_item', 'item_type'),
+    'unit_price': ('dim_item', 'current_price'),
+    'profit_margin': ('dim_item', 'profit_margin_percent'),
+}
+
+FACT_COLUMNS = ['customer_sk', 'item_sk', 'gross_sales_amount']
+EXPORT_CHUNK_SIZE = 100_000
+
+
+def scan_transactions(attributes, fact_columns=()):
+    """Read the sales fact once and resolve the requested attributes with one gather each.
+
+    Transactions whose customer, item or category cannot be resolved are
+    dropped, matching the reports' inner-join semantics.
+    """
+    customers = dimension('dim_customer')
+    items = dimension('dim_item')
+    categories = dimension('dim_category')
+    transactions = load_table('fact_sales_transaction',
+                              columns=list(dict.fromkeys(FACT_COLUMNS + list(fact_columns))))
+
+    item_rows = items.rows(transactions['item_sk'])
+    rows = {
+        'dim_customer': customers.rows(transactions['customer_sk']),
+        'dim_item': item_rows,
+        'dim_category': categories.rows(items.take(item_rows, 'category_sk')),
+    }
+    stores = {'dim_customer': customers, 'dim_item': items, 'dim_category': categories}
+    resolved = transactions.assign(**{
+        name: stores[ATTRIBUTES[name][0]].take(rows[ATTRIBUTES[name][0]], ATTRIBUTES[name][1])
+        for name in attributes})
+    matched = (rows['dim_customer'] >= 0) & (rows['dim_item'] >= 0) & (rows['dim_category'] >= 0)
+    return resolved[matched].reset_index(drop=True)
+
+
+def bounded(lower, upper, spec=''):
+    """A Space-Saving total as text: exact when the bounds meet, else 'lower-upper'"""
+    if lower == upper:
+        return format(upper, spec)
+    return f"{format(lower, spec)}-{format(upper, spec)}"
+
+
+def aggregate(transactions):
+    """Every segment × category, segment and category aggregate the reports use.
+
+    Groups are numbered in first-seen order and reduced with bincount, whose
+    sums add rows in table order like a running total; distinct customers and
+    top items are grouped sketches and Space-Saving summaries.
+    """
+    sales = transactions['gross_sales_amount'].to_numpy(dtype=np.float64)
+    has_names = 'customer_name' in transactions
+    has_margins = 'profit_margin' in transactions
+
+    cell_keys = transactions[['customer_segment', 'category_name']]
+    cell = cell_keys.groupby(list(cell_keys), dropna=False, sort=False).ngroup().to_numpy()
+    gross = np.bincount(cell, weights=sales)
+    count = np.bincount(cell)
+    customer_sks = group_sketches(cell_keys, transactions['customer_sk'])['sketch']
+    customer_names = group_sketches(cell_keys, transactions['customer_name'])['sketch'] if has_names else None
+    margin_sum = np.bincount(cell, weights=transactions['profit_margin'].to_numpy(dtype=np.float64)) \
+        if has_margins else None
+    item_counts = grouped(cell, transactions['item_name'])
+    item_sales = grouped(cell, transactions['item_name'], sales)
+
+    segment_category = {}
+    firsts = cell_keys.drop_duplicates()
+    for position, (segment, category) in enumerate(firsts.itertuples(index=False)):
+        segment_category[(segment, category)] = {
+            'gross_sales': float(gross[position]),
+            'transaction_count': int(count[position]),
+            'customer_sks': customer_sks[position],
+            'customer_names': customer_names[position] if has_names else DistinctSketch(),
+            'item_counts': item_counts[position],
+            'item_sales': item_sales[position],
+            'average_margin': margin_sum[position] / count[position] if has_margins else 0,
+        }
+
+    segment_keys = transactions[['customer_segment']]
+    segment = segment_keys.groupby('customer_segment', dropna=False, sort=False).ngroup().to_numpy()
+    segment_sales = np.bincount(segment, weights=sales)
+    segment_sks = group_sketches(segment_keys, transactions['customer_sk'])['sketch']
+    segment_names = group_sketches(segment_keys, transactions['customer_name'])['sketch'] if has_names else None
+    segments = {name: {'gross_sales': float(segment_sales[position]), 'customer_sks': segment_sks[position],
+                       'customer_names': segment_names[position] if has_names else DistinctSketch()}
+                for position, name in enumerate(segment_keys['customer_segment'].drop_duplicates())}
+
+    category_keys = transactions['category_name']
+    category = category_keys.to_frame().groupby('category_name', dropna=False, sort=False).ngroup().to_numpy()
+    category_sales = np.bincount(category, weights=sales)
+    categories = {name: float(category_sales[position])
+                  for position, name in enumerate(category_keys.drop_duplicates())}
+
+    return {
+        'segment_category': segment_category,
+        'segments': segments,
+        'categories': categories,
+        'total_sales': float(np.bincount(np.zeros(len(sales), dtype=np.int64), weights=sales, minlength=1)[0]),
+        'total_customers': DistinctSketch.from_values(transactions['customer_sk']).count(),
+    }
+
+
+def segment_category_report(records, totals):
+    """Segments by category with gross sales percentages (customer_segment_analysis.py)"""
+    print("=== CUSTOMER SEGMENTS BY CATEGORY - GROSS SALES ANALYSIS ===")
+    print()
+
+    segment_category_data = totals['segment_category']
+    segment_totals = totals['segments']
+    total_sales = totals['total_sales']
+    total_customers = totals['total_customers']
+
+    print("DETAILED BREAKDOWN BY CUSTOMER SEGMENT & CATEGORY:")
+    print("=" * 90)
+    print(f"{'Customer Segment':<15} {'Category':<15} {'Gross Sales':<12} {'Sales %':<8} {'Customers':<10} {'Cust %':<8} {'Txns':<6} {'Top Items'}")
+    print("-" * 90)
+
+    # Sort by gross sales descending
+    sorted_data = sorted(segment_category_data.items(),
+                        key=lambda x: x[1]['gross_sales'],
+                        reverse=True)
+
+    for (segment, category), data in sorted_data:
+        sales_pct = (data['gross_sales'] / total_sales * 100) if total_sales > 0 else 0
+        cust_pct = (data['customer_sks'].count() / total_customers * 100) if total_customers > 0 else 0
+
+        # Get top items for this segment-category
+        top_items = data['item_counts'].bounds(2)
+        top_items_str = ", ".join([f"{item} ({bounded(lower, upper)})" for item, lower, upper in top_items])
+
+        print(f"{segment:<15} {category:<15} ${data['gross_sales']:<11.2f} {sales_pct:<7.1f}% "
+              f"{data['customer_sks'].count():<9} {cust_pct:<7.1f}% {data['transaction_count']:<6} {top_items_str}")
+
+    print()
+    print("CUSTOMER SEGMENT TOTALS:")
+    print("=" * 70)
+    print(f"{'Segment':<15} {'Gross Sales':<12} {'Sales %':<8} {'Customers':<10} {'Customer %':<10} {'Avg per Customer'}")
+    print("-" * 70)
+
+    # Sort segments by sales
+    sorted_segments = sorted(segment_totals.items(),
+                           key=lambda x: x[1]['gross_sales'],
+                           reverse=True)
+
+    for segment, data in sorted_segments:
+        sales_pct = (data['gross_sales'] / total_sales * 100) if total_sales > 0 else 0
+        cust_pct = (data['customer_sks'].count() / total_customers * 100) if total_customers > 0 else 0
+        avg_per_customer = data['gross_sales'] / data['customer_sks'].count() if data['customer_sks'].count() > 0 else 0
+
+        print(f"{segment:<15} ${data['gross_sales']:<11.2f} {sales_pct:<7.1f}% "
+              f"{data['customer_sks'].count():<9} {cust_pct:<9.1f}% ${avg_per_customer:<11.2f}")
+
+    print()
+    print("KEY INSIGHTS:")
+    print("=" * 50)
+
+    # Find VIP performance
+    vip_data = segment_totals.get('VIP', {'gross_sales': 0, 'customer_sks': DistinctSketch()})
+    vip_sales_pct = (vip_data['gross_sales'] / total_sales * 100) if total_sales > 0 else 0
+    vip_cust_pct = (vip_data['customer_sks'].count() / total_customers * 100) if total_customers > 0 else 0
+
+    print(f"• VIP customers represent {vip_cust_pct:.1f}% of customer base")
+    print(f"• VIP customers generate {vip_sales_pct:.1f}% of total revenue")
+    print(f"• Total Sales: ${total_sales:.2f}")
+    print(f"• Total Customers: {total_customers}")
+
+    # Category performance
+    print()
+    print("TOP CATEGORIES BY REVENUE:")
+    sorted_categories = sorted(totals['categories'].items(), key=lambda x: x[1], reverse=True)
+    for i, (category, sales) in enumerate(sorted_categories[:5], 1):
+        pct = (sales / total_sales * 100) if total_sales > 0 else 0
+        print(f"{i}. {category}: ${sales:.2f} ({pct:.1f}%)")
+
+
+def write_csv(path, rows):
+    """Write row dicts (any iterable) to a CSV whose header is the first row's keys"""
+    rows = iter(rows)
+    first = next(rows, None)
+    with open(path, 'w', newline='') as file:
+        if first is not None:
+            writer = csv.DictWriter(file, fieldnames=first.keys())
+            writer.writeheader()
+            writer.writerow(first)
+            writer.writerows(rows)
+
+
+def detailed_report(records, totals):
+    """Item-level table view and CSV exports for Excel (detailed_customer_analysis.py)"""
+    print("=== DETAILED CUSTOMER SEGMENT ANALYSIS WITH ITEM BREAKDOWN ===")
+    print()
+
+    summary_data = totals['segment_category']
+    segment_totals = totals['segments']
+    total_sales = totals['total_sales']
+    total_customers = totals['total_customers']
+
+    print("TABLE VIEW: CUSTOMER SEGMENTS BY CATEGORY WITH ITEM DETAILS")
+    print("=" * 120)
+    print(f"{'Segment':<12} {'Category':<15} {'Gross Sales':<12} {'Sales %':<8} {'Customers':<4} {'Cust %':<7} {'Txns':<5} {'Avg Margin':<11} {'Top Items'}")
+    print("-" * 120)
+
+    # Sort by gross sales descending
+    sorted_summary = sorted(summary_data.items(), key=lambda x: x[1]['gross_sales'], reverse=True)
+
+    export_data = []
+
+    for (segment, category), data in sorted_summary:
+        sales_pct = (data['gross_sales'] / total_sales * 100) if total_sales > 0 else 0
+        cust_pct = (data['customer_names'].count() / total_customers * 100) if total_customers > 0 else 0
+        avg_margin = data['average_margin']
+
+        # Get top 3 items
+        top_items = data['item_counts'].bounds(3)
+        top_items_str = ", ".join([f"{item}({bounded(lower, upper)})" for item, lower, upper in top_items])
+
+        print(f"{segment:<12} {category:<15} ${data['gross_sales']:<11.2f} {sales_pct:<7.1f}% "
+              f"{data['customer_names'].count():<4} {cust_pct:<6.1f}% {data['transaction_count']:<5} "
+              f"{avg_margin:<10.1f}% {top_items_str}")
+
+        # Add to export data
+        export_data.append({
+            'Customer_Segment': segment,
+            'Category': category,
+            'Gross_Sales': f"{data['gross_sales']:.2f}",
+            'Sales_Percentage': f"{sales_pct:.1f}%",
+            'Customer_Count': data['customer_names'].count(),
+            'Customer_Percentage': f"{cust_pct:.1f}%",
+            'Transaction_Count': data['transaction_count'],
+            'Average_Margin': f"{avg_margin:.1f}%",
+            'Top_Items': top_items_str
+        })
+
+    print()
+    print("CUSTOMER SEGMENT PERFORMANCE SUMMARY:")
+    print("=" * 80)
+    print(f"{'Segment':<12} {'Gross Sales':<12} {'Sales %':<8} {'Customers':<10} {'Cust %':<8} {'Avg/Customer':<12} {'Performance'}")
+    print("-" * 80)
+
+    segment_export = []
+    sorted_segments = sorted(segment_totals.items(), key=lambda x: x[1]['gross_sales'], reverse=True)
+
+    for segment, data in sorted_segments:
+        sales_pct = (data['gross_sales'] / total_sales * 100) if total_sales > 0 else 0
+        cust_pct = (data['customer_sks'].count() / total_customers * 100) if total_customers > 0 else 0
+        avg_per_customer = data['gross_sales'] / data['customer_sks'].count() if data['customer_sks'].count() > 0 else 0
+
+        # Performance indicator
+        if sales_pct > cust_pct * 1.2:
+            performance = "High Value"
+        elif sales_pct > cust_pct * 0.8:
+            performance = "Balanced"
+        else:
+            performance = "Low Value"
+
+        print(f"{segment:<12} ${data['gross_sales']:<11.2f} {sales_pct:<7.1f}% "
+              f"{data['customer_sks'].count():<9} {cust_pct:<7.1f}% ${avg_per_customer:<11.2f} {performance}")
+
+        segment_export.append({
+            'Customer_Segment': segment,
+            'Gross_Sales': f"{data['gross_sales']:.2f}",
+            'Sales_Percentage': f"{sales_pct:.1f}%",
+            'Customer_Count': data['customer_sks'].count(),
+            'Customer_Percentage': f"{cust_pct:.1f}%",
+            'Average_Per_Customer': f"{avg_per_customer:.2f}",
+            'Performance_Rating': performance
+        })
+
+    print()
+    print("KEY BUSINESS INSIGHTS:")
+    print("=" * 50)
+
+    # VIP Analysis
+    vip_data = segment_totals.get('VIP', {'gross_sales': 0, 'customer_sks': DistinctSketch()})
+    vip_sales_pct = (vip_data['gross_sales'] / total_sales * 100) if total_sales > 0 else 0
+    vip_cust_pct = (vip_data['customer_sks'].count() / total_customers * 100) if total_customers > 0 else 0
+
+    print(f"• VIP Segment: {vip_cust_pct:.1f}% of customers generate {vip_sales_pct:.1f}% of revenue")
+
+    # Regular customer analysis
+    regular_data = segment_totals.get('Regular', {'gross_sales': 0, 'customer_sks': DistinctSketch()})
+    regular_sales_pct = (regular_data['gross_sales'] / total_sales * 100) if total_sales > 0 else 0
+    regular_cust_pct = (regular_data['customer_sks'].count() / total_customers * 100) if total_customers > 0 else 0
+
+    print(f"• Regular Segment: {regular_cust_pct:.1f}% of customers generate {regular_sales_pct:.1f}% of revenue")
+
+    # Top category
+    top_category = max(totals['categories'].items(), key=lambda x: x[1])
+    top_cat_pct = (top_category[1] / total_sales * 100) if total_sales > 0 else 0
+    print(f"• Top Category: {top_category[0]} generates {top_cat_pct:.1f}% of total revenue")
+
+    print(f"• Total Revenue: ${total_sales:.2f} across {total_customers} customers")
+
+    # Export to CSV for Excel analysis
+    print()
+    print("EXPORTING DATA TO CSV FILES...")
+
+    details = records[['customer_segment', 'customer_name', 'category_name', 'item_name', 'item_type',
+                       'gross_sales_amount', 'unit_price', 'profit_margin', 'transaction_id']]
+    details = details.rename(columns={'gross_sales_amount': 'gross_sales'})
+    # Rows become dicts one export chunk at a time
+    detailed_data = (row for start in range(0, len(details), EXPORT_CHUNK_SIZE)
+                     for row in to_records(details.iloc[start:start + EXPORT_CHUNK_SIZE]))
+
+    write_csv('customer_segment_category_analysis.csv', export_data)
+    write_csv('customer_segment_summary.csv', segment_export)
+    write_csv('customer_transaction_details.csv', detailed_data)
+
+    print("✓ customer_segment_category_analysis.csv - Summary by segment & category")
+    print("✓ customer_segment_summary.csv - Segment performance summary")
+    print("✓ customer_transaction_details.csv - Detailed transaction data")
+    print()
+    print("Files ready for import into Excel, Power BI, or Tableau!")
+
+
+def excel_table_report(records, totals):
+    """Excel-style segment tables with ratings and recommendations (excel_table_analysis.py)"""
+    print("=" * 100)
+    print("SQUARE REPORTING CUBE - CUSTOMER SEGMENT ANALYSIS TABLE")
+    print("Insight: VIP customers represent 26.7% of customer base but generate only 19.4% of revenue")
+    print("=" * 100)
+    print()
+
+    segment_category = totals['segment_category']
+    segment_totals = totals['segments']
+    total_sales = totals['total_sales']
+    total_customers = totals['total_customers']
+
+    print("TABLE 1: CUSTOMER SEGMENT × CATEGORY BREAKDOWN")
+    print("=" * 120)
+    print(f"{'Customer':<12} {'Category':<15} {'Gross':<10} {'Sales':<6} {'Unique':<6} {'Cust':<5} {'Trans':<5} {'Avg':<6} {'Top Items (Revenue)':<35}")
+    print(f"{'Segment':<12} {'Name':<15} {'Sales':<10} {'%':<6} {'Custs':<6} {'%':<5} {'Count':<5} {'Margin':<6} {'':<35}")
+    print("-" * 120)
+
+    # Sort by gross sales descending
+    sorted_data = sorted(segment_category.items(), key=lambda x: x[1]['gross_sales'], reverse=True)
+
+    for (segment, category), data in sorted_data:
+        sales_pct = (data['gross_sales'] / total_sales * 100)
+        cust_pct = (data['customer_names'].count() / total_customers * 100)
+        avg_margin = data['average_margin']
+
+        # Top 2 items by revenue in this segment-category
+        top_items = data['item_sales'].bounds(2)
+        items_str = ", ".join([f"{item} (${bounded(lower, upper, '.2f')})" for item, lower, upper in top_items])
+
+        print(f"{segment:<12} {category:<15} ${data['gross_sales']:<9.2f} {sales_pct:<5.1f}% {data['customer_names'].count():<6} "
+              f"{cust_pct:<4.1f}% {data['transaction_count']:<5} {avg_margin:<5.1f}% {items_str:<35}")
+
+    print()
+    print("TABLE 2: CUSTOMER SEGMENT PERFORMANCE SUMMARY")
+    print("=" * 85)
+    print(f"{'Customer':<12} {'Gross Sales':<12} {'Sales %':<8} {'Customer':<8} {'Cust %':<7} {'Avg per':<10} {'Performance':<12}")
+    print(f"{'Segment':<12} {'Amount':<12} {'of Total':<8} {'Count':<8} {'of Base':<7} {'Customer':<10} {'Rating':<12}")
+    print("-" * 85)
+
+    sorted_segments = sorted(segment_totals.items(), key=lambda x: x[1]['gross_sales'], reverse=True)
+
+    for segment, data in sorted_segments:
+        sales_pct = (data['gross_sales'] / total_sales * 100)
+        cust_pct = (data['customer_names'].count() / total_customers * 100)
+        avg_per_customer = data['gross_sales'] / data['customer_names'].count()
+
+        # Performance rating based on sales % vs customer %
+        if sales_pct > cust_pct * 1.3:
+            rating = "⭐ Excellent"
+        elif sales_pct > cust_pct * 1.1:
+            rating = "✓ Good"
+        elif sales_pct > cust_pct * 0.9:
+            rating = "→ Average"
+        else:
+            rating = "⚠ Underperform"
+
+        print(f"{segment:<12} ${data['gross_sales']:<11.2f} {sales_pct:<7.1f}% {data['customer_names'].count():<8} "
+              f"{cust_pct:<6.1f}% ${avg_per_customer:<9.2f} {rating:<12}")
+
+    print()
+    print("TABLE 3: KEY INSIGHTS & RECOMMENDATIONS")
+    print("=" * 80)
+
+    # VIP Analysis
+    vip_data = segment_totals.get('VIP', {'gross_sales': 0, 'customer_names': DistinctSketch()})
+    vip_sales_pct = (vip_data['gross_sales'] / total_sales * 100)
+    vip_cust_pct = (vip_data['customer_names'].count() / total_customers * 100)
+
+    print("📊 VIP CUSTOMER ANALYSIS:")
+    print(f"   • Customer Base: {vip_data['customer_names'].count()} customers ({vip_cust_pct:.1f}% of total)")
+    print(f"   • Revenue Share: ${vip_data['gross_sales']:.2f} ({vip_sales_pct:.1f}% of total)")
+    print(f"   • Performance: UNDERPERFORMING (should generate ~{vip_cust_pct*1.5:.1f}% of revenue)")
+    print(f"   • Avg Spend: ${vip_data['gross_sales']/vip_data['customer_names'].count():.2f} per VIP customer")
+    print()
+
+    # Find VIP's favorite categories
+    vip_categories = defaultdict(float)
+    for (segment, category), data in segment_category.items():
+        if segment == 'VIP':
+            vip_categories[category] = data['gross_sales']
+
+    print("🎯 VIP CUSTOMER PREFERENCES:")
+    vip_sorted = sorted(vip_categories.items(), key=lambda x: x[1], reverse=True)
+    for i, (category, sales) in enumerate(vip_sorted, 1):
+        pct_of_vip = (sales / vip_data['gross_sales'] * 100) if vip_data['gross_sales'] > 0 else 0
+        print(f"   {i}. {category}: ${sales:.2f} ({pct_of_vip:.1f}% of VIP spending)")
+
+    print()
+    print("💡 BUSINESS RECOMMENDATIONS:")
+    print("   • VIP Engagement: Increase VIP customer value through targeted promotions")
+    print("   • Category Focus: Espresso products are top revenue driver (28.6% of total)")
+    print(f"   • New Customer: High value per customer (${segment_totals['New']['gross_sales']/segment_totals['New']['customer_names'].count():.2f} avg)")
+    print("   • Regular Customers: Largest segment (53.3%) - opportunity for upselling")
+
+    print()
+    print("=" * 100)
+    print(f"SUMMARY: ${total_sales:.2f} total revenue from {total_customers} customers")
+    print("Key Finding: VIP segment underperforming relative to customer count")
+    print("=" * 100)
+
+
+# Each report declares the transaction attributes and extra fact columns it
+# reads, so the shared scan resolves only what the requested reports need
+REPORTS = {
+    'segment_category': {
+        'attributes': ['customer_segment', 'category_name', 'item_name'],
+        'fact_columns': [],
+        'render': segment_category_report,
+    },
+    'detailed': {
+        'attributes': list(ATTRIBUTES),
+        'fact_columns': ['transaction_id'],
+        'render': detailed_report,
+    },
+    'excel_table': {
+        'attributes': ['customer_segment', 'customer_name', 'category_name', 'item_name',
+                       'profit_margin'],
+        'fact_columns': [],
+        'render': excel_table_report,
+    },
+}
+
+
+def run_reports(names=None):
+    """Plan the requested reports, run one shared scan and join, and render each"""
+    names = names or list(REPORTS)
+    attributes = list(dict.fromkeys(attribute for name in names for attribute in REPORTS[name]['attributes']))
+    fact_columns = list(dict.fromkeys(column for name in names for column in REPORTS[name]['fact_columns']))
+    records = scan_transactions(attributes, fact_columns)
+    totals = aggregate(records)
+    for position, name in enumerate(names):
+        if position:
+            print()
+        REPORTS[name]['render'](records, totals)
+
+
+def main():
+    """Render the named reports (default: all of them) from a single scan"""
+    run_reports(sys.argv[1:] or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Shift Attribution for the Square OLAP Cube
+Interval-joins sales (date_sk + time_sk) to the fact_labor_cost shifts on
+the clock at the same location by sweeping the sorted shift boundaries, so
+each sale's net sales and tip are split across the overlapping shifts
+without a shifts x transactions cross join, and reports per-shift and
+per-employee productivity and tip shares
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from dimension_store import dimension
+from star_schema import load_table
+
+# Sale and shift instants are keyed as location * LOCATION_SPAN + epoch
+# seconds, so one sorted array orders every location's timeline
+LOCATION_SPAN = 1 << 34
+
+SALE_COLUMNS = ['location_sk', 'employee_sk', 'date_sk', 'time_sk', 'net_sales_amount', 'tip_amount',
+                'is_void']
+SHIFT_COLUMNS = ['shift_sk', 'employee_sk', 'location_sk', 'date_sk', 'hours_worked', 'total_labor_cost',
+                 'clock_in_time', 'clock_out_time']
+
+
+def sale_instants(sales, data_dir='.'):
+    """Epoch seconds of each sale from its date and time dimensions (-1 when unresolved)"""
+    dates = dimension('dim_date', data_dir)
+    times = dimension('dim_time', data_dir)
+    day = pd.to_datetime(pd.Series(dates.labels(sales['date_sk'], 'date_value')))
+    rows = times.rows(sales['time_sk'])
+    seconds = sum(times.attribute(column)[np.maximum(rows, 0)].astype(np.int64) * scale
+                  for column, scale in (('hour_24', 3600), ('minute_number', 60), ('second_number', 1)))
+    known = day.notna().to_numpy() & (rows >= 0)
+    epoch = day.to_numpy().astype('datetime64[s]').astype(np.int64)
+    return np.where(known, epoch + seconds, -1)
+
+
+def timeline_keys(location, seconds):
+    return np.asarray(location, dtype=np.int64) * LOCATION_SPAN + np.asarray(seconds, dtype=np.int64)
+
+
+def shift_segments(shifts):
+    """Sweep the sorted shift boundaries into elementary segments.
+
+    Returns (boundaries, pairs): boundary i starts segment i, which ends at
+    boundary i + 1, and pairs holds one (segment, shift row) entry for every
+    shift on the clock throughout that segment.
+    """
+    start = timeline_keys(shifts['location_sk'], shifts['clock_in_time'].to_numpy(dtype='datetime64[s]')
+                          .astype(np.int64))
+    stop = timeline_keys(shifts['location_sk'], shifts['clock_out_time'].to_numpy(dtype='datetime64[s]')
+                         .astype(np.int64))
+    boundaries = np.unique(np.concatenate([start, stop]))
+    first = np.searchsorted(boundaries, start)
+    spans = np.maximum(np.searchsorted(boundaries, stop) - first, 0)
+    shift_rows = np.repeat(np.arange(len(shifts)), spans)
+    segment = np.repeat(first, spans) + np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    return boundaries, pd.DataFrame({'segment': segment, 'shift': shift_rows})
+
+
+def attribute_sales(sales, shifts, data_dir='.'):
+    """Split each sale across the shifts on the clock at its location and instant.
+
+    Sales are first totalled per segment, then each segment's totals are
+    divided equally among its active shifts, so the work is proportional to
+    sales plus (segment, shift) pairs. Returns (per-shift attribution frame
+    aligned to shifts, count of sales no shift covered).
+    """
+    boundaries, pairs = shift_segments(shifts)
+    seconds = sale_instants(sales, data_dir)
+    segment = np.searchsorted(boundaries, timeline_keys(sales['location_sk'], seconds), side='right') - 1
+    active = np.bincount(pairs['segment'], minlength=len(boundaries))
+    covered = (seconds >= 0) & (segment >= 0) & (active[np.maximum(segment, 0)] > 0)
+
+    segments = len(boundaries)
+    totals = {
+        'Sales': np.bincount(segment[covered], minlength=segments).astype(np.float64),
+        'Net Sales': np.bincount(segment[covered], weights=sales['net_sales_amount'].to_numpy()[covered],
+                                 minlength=segments),
+        'Tips': np.bincount(segment[covered], weights=sales['tip_amount'].to_numpy()[covered],
+                            minlength=segments),
+    }
+    share = 1.0 / active[pairs['segment']]
+    attributed = pd.DataFrame({
+        name: np.bincount(pairs['shift'], weights=values[pairs['segment']] * share, minlength=len(shifts))
+        for name, values in totals.items()})
+    return attributed, int((~covered).sum())
+
+
+def productivity(attributed, shifts, sales):
+    """Per-shift and per-employee sales per labor hour, labor cost % and tip shares"""
+    per_shift = pd.concat([shifts[['shift_sk', 'employee_sk', 'location_sk', 'date_sk', 'hours_worked',
+                                   'total_labor_cost']].reset_index(drop=True), attributed], axis=1)
+    per_employee = per_shift.groupby('employee_sk', as_index=False)[
+        ['hours_worked', 'total_labor_cost', 'Sales', 'Net Sales', 'Tips']].sum()
+    own = sales.groupby('employee_sk')['net_sales_amount'].sum()
+    per_employee['Own Net Sales'] = per_employee['employee_sk'].map(own).fillna(0.0)
+    for frame in (per_shift, per_employee):
+        hours = frame['hours_worked'].where(frame['hours_worked'] > 0)
+        frame['Sales per Labor Hour'] = frame['Net Sales'] / hours
+        frame['Labor Cost %'] = frame['total_labor_cost'] / frame['Net Sales'].where(frame['Net Sales'] > 0) * 100
+        frame['Tips per Hour'] = frame['Tips'] / hours
+    return per_shift, per_employee
+
+
+def shift_report(data_dir='.'):
+    """(per-shift frame, per-employee frame, uncovered sale count) for all non-void sales"""
+    sales = load_table('fact_sales_transaction', columns=SALE_COLUMNS, data_dir=data_dir)
+    sales = sales[~sales['is_void'].to_numpy()].reset_index(drop=True)
+    shifts = load_table('fact_labor_cost', columns=SHIFT_COLUMNS, data_dir=data_dir)
+    attributed, uncovered = attribute_sales(sales, shifts, data_dir)
+    per_shift, per_employee = productivity(attributed, shifts, sales)
+    return per_shift, per_employee, uncovered
+
+
+def main():
+    """Per-employee and per-shift productivity from the shift interval join"""
+    parser = argparse.ArgumentParser(description="Attribute sales and tips to overlapping shifts")
+    parser.add_argument('--shifts', action='store_true', help="also list every shift")
+    args = parser.parse_args()
+
+    per_shift, per_employee, uncovered = shift_report()
+    employees = dimension('dim_employee')
+    print("Shift Attribution")
+    print("=" * 40)
+    print(f"{per_shift['Sales'].sum():.0f} sales attributed to {len(per_shift)} shifts, "
+          f"{uncovered} outside every shift")
+
+    per_employee.insert(1, 'Employee', employees.labels(per_employee['employee_sk'], 'full_name'))
+    print("\nPer employee")
+    print(per_employee.drop(columns=['employee_sk']).round(2).to_string(index=False))
+    if args.shifts:
+        print("\nPer shift")
+        print(per_shift.round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
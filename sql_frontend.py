@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Embedded SQL Front-End for the Square Star Schema
+Bulk-loads every dim/fact/bridge CSV into a local SQLite database (batched
+executemany, one transaction per table, indexes created after the load),
+applies the cube enhancement DDL and runs SQL files with per-statement timing.
+The DDL and example files mostly target the Square API tables (Orders,
+CustomerSnapshots, ...), which are not part of the star schema: statements
+naming a table the database does not have are reported as skipped, not run
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from star_schema import SCHEMA, TABLES, cache_dir, iter_chunks, store_path
+
+# Rows bound per executemany call; each table still loads in one transaction
+BATCH_ROWS = 50_000
+
+DDL_FILE = 'Cube_Enhancement_DDL.sql'
+EXAMPLE_FILES = ['your_query_example.sql', 'Item_Enhancement_SQL_Examples.sql']
+
+# SQLite affinity of each star-schema column type (money is stored in dollars,
+# flags as 0/1 so TRUE/FALSE literals compare, dates as ISO-8601 text)
+SQL_TYPES = {
+    'key': 'INTEGER', 'nkey': 'INTEGER', 'int': 'INTEGER', 'flag': 'INTEGER',
+    'money': 'REAL', 'decimal': 'REAL',
+    'category': 'TEXT', 'text': 'TEXT', 'date': 'TEXT', 'timestamp': 'TEXT',
+}
+
+# Bumped when the database layout (e.g. the ddl_log table) changes
+DATABASE_FORMAT = 2
+
+# Table names a statement reads, writes or alters; CREATE TABLE/VIEW names
+# are what it defines. Function-style FROM (EXTRACT(YEAR FROM x)) is removed first
+TABLE_REFERENCES = re.compile(r'\b(?:FROM|JOIN|INTO|UPDATE|ALTER\s+TABLE|INDEX\s+\w+\s+ON)\s+([A-Za-z_]\w*)',
+                              re.IGNORECASE)
+TABLE_DEFINITIONS = re.compile(r'\bCREATE\s+(?:TEMP\w*\s+)?(?:TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?'
+                               r'([A-Za-z_]\w*)', re.IGNORECASE)
+COMMON_TABLES = re.compile(r'\b([A-Za-z_]\w*)\s+AS\s*\(', re.IGNORECASE)
+FUNCTION_FROM = re.compile(r'\b(?:EXTRACT|TRIM|SUBSTRING)\s*\([^()]*\)', re.IGNORECASE)
+
+# MySQL clauses in the DDL that SQLite has no equivalent for
+MYSQL_REWRITES = [
+    (re.compile(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP', re.IGNORECASE), ''),
+]
+
+# Star-schema queries run alongside the example files
+STAR_SCHEMA_EXAMPLES = {
+    'Net sales by store': """
+        SELECT l.location_name, COUNT(DISTINCT f.transaction_id) AS transactions,
+               ROUND(SUM(f.net_sales_amount), 2) AS net_sales
+        FROM fact_sales_transaction f
+        JOIN dim_location l ON l.location_sk = f.location_sk
+        GROUP BY l.location_name
+        ORDER BY net_sales DESC""",
+    'Gross profit by category and month': """
+        SELECT c.category_name, d.year_number, d.month_number,
+               ROUND(SUM(f.gross_profit), 2) AS gross_profit
+        FROM fact_item_sales f
+        JOIN dim_category c ON c.category_sk = f.category_sk
+        JOIN dim_date d ON d.date_sk = f.date_sk
+        GROUP BY c.category_name, d.year_number, d.month_number
+        ORDER BY d.year_number, d.month_number, gross_profit DESC""",
+    'Labor cost % by store and day': """
+        SELECT s.location_sk, s.date_sk, ROUND(s.net_sales, 2) AS net_sales,
+               ROUND(100.0 * l.labor_cost / s.net_sales, 2) AS labor_cost_percent
+        FROM (SELECT location_sk, date_sk, SUM(net_sales_amount) AS net_sales
+              FROM fact_sales_transaction GROUP BY location_sk, date_sk) s
+        JOIN (SELECT location_sk, date_sk, SUM(total_labor_cost) AS labor_cost
+              FROM fact_labor_cost GROUP BY location_sk, date_sk) l
+          ON l.location_sk = s.location_sk AND l.date_sk = s.date_sk
+        ORDER BY s.date_sk, s.location_sk""",
+}
+
+
+def database_path(data_dir='.'):
+    """Database file for the current table contents and DDL"""
+    ddl = Path(data_dir) / DDL_FILE
+    payload = json.dumps({'format': DATABASE_FORMAT,
+                          'stores': [store_path(table, data_dir).name for table in TABLES],
+                          'ddl': ddl.read_text() if ddl.exists() else None,
+                          'types': SQL_TYPES}, sort_keys=True)
+    digest = hashlib.sha256(payload.encode()).hexdigest()[:16]
+    return cache_dir(data_dir) / f"star_schema-{digest}.sqlite"
+
+
+def split_statements(text):
+    """Individual statements of a SQL script (comments and blank text dropped)"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    statements, buffer = [], ''
+    for line in text.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer)
+            buffer = ''
+    statements.append(buffer)
+    code = [re.sub(r'--[^\n]*', '', statement).strip() for statement in statements]
+    return [statement.strip() for statement, stripped in zip(statements, code) if stripped.rstrip(';')]
+
+
+def to_sqlite(statement):
+    """Rewrite the MySQL-only clauses of a statement for SQLite"""
+    for pattern, replacement in MYSQL_REWRITES:
+        statement = pattern.sub(replacement, statement)
+    return statement
+
+
+def sql_rows(chunk, schema):
+    """Rows of a typed chunk as tuples of SQLite values (blanks become None)"""
+    columns = []
+    for column, kind in schema.items():
+        values = chunk[column]
+        if kind == 'date':
+            values = values.dt.strftime('%Y-%m-%d')
+        elif kind == 'timestamp':
+            values = values.dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif kind == 'flag':
+            values = values.astype(np.int64)
+        values = values.astype(object)
+        columns.append(values.where(values.notna(), None).tolist())
+    return zip(*columns)
+
+
+def load_tables(connection, data_dir='.'):
+    """Create and bulk-load every table, then index its surrogate keys"""
+    for name in TABLES:
+        schema = SCHEMA[name]
+        definition = ', '.join(f"{column} {SQL_TYPES[kind]}" for column, kind in schema.items())
+        insert = f"INSERT INTO {name} VALUES ({', '.join('?' * len(schema))})"
+        connection.execute("BEGIN")
+        connection.execute(f"CREATE TABLE {name} ({definition})")
+        for chunk in iter_chunks(name, BATCH_ROWS, data_dir=data_dir):
+            connection.executemany(insert, sql_rows(chunk, schema))
+        connection.execute("COMMIT")
+    connection.execute("BEGIN")
+    for name in TABLES:
+        for column, kind in SCHEMA[name].items():
+            if kind in ('key', 'nkey'):
+                connection.execute(f"CREATE INDEX idx_{name}_{column} ON {name} ({column})")
+    connection.execute("COMMIT")
+    connection.execute("ANALYZE")
+
+
+def missing_tables(statement, tables):
+    """Tables a statement references that are not in tables (lower-case names)"""
+    code = FUNCTION_FROM.sub('', re.sub(r"'[^']*'", "''", re.sub(r'--[^\n]*', '', to_sqlite(statement))))
+    local = {name.lower() for name in COMMON_TABLES.findall(code) + TABLE_DEFINITIONS.findall(code)}
+    return sorted({name for name in TABLE_REFERENCES.findall(code)
+                   if name.lower() not in tables and name.lower() not in local}, key=str.lower)
+
+
+def run_statements(connection, statements):
+    """Execute statements one by one, timing each; failures are recorded, not raised.
+
+    Statements referencing a table the database does not have are skipped
+    with the missing names recorded under 'skipped'.
+    """
+    tables = {name.lower() for (name,) in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+    results = []
+    for statement in statements:
+        missing = missing_tables(statement, tables)
+        if missing:
+            results.append({'statement': statement, 'rows': None, 'error': None, 'skipped': missing,
+                            'seconds': 0.0})
+            continue
+        started = time.perf_counter()
+        try:
+            cursor = connection.execute(to_sqlite(statement))
+            rows = len(cursor.fetchall()) if cursor.description else None
+            error = None
+            tables.update(name.lower() for name in TABLE_DEFINITIONS.findall(statement))
+        except sqlite3.Error as exc:
+            rows, error = None, str(exc)
+        results.append({'statement': statement, 'rows': rows, 'error': error, 'skipped': None,
+                        'seconds': time.perf_counter() - started})
+    return results
+
+
+def build_database(path, data_dir='.'):
+    """Write the database to path: tables, indexes, then the enhancement DDL"""
+    # Autocommit mode: transactions are opened explicitly around each bulk load
+    connection = sqlite3.connect(path, isolation_level=None)
+    try:
+        # The file is built aside and published whole, so durability is not needed
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        load_tables(connection, data_dir)
+        ddl = Path(data_dir) / DDL_FILE
+        results = run_statements(connection, split_statements(ddl.read_text())) if ddl.exists() else []
+        connection.execute("CREATE TABLE ddl_log (statement TEXT, error TEXT, skipped TEXT, seconds REAL)")
+        connection.executemany("INSERT INTO ddl_log VALUES (?, ?, ?, ?)",
+                               [(result['statement'], result['error'],
+                                 ', '.join(result['skipped']) if result['skipped'] else None, result['seconds'])
+                                for result in results])
+    finally:
+        connection.close()
+
+
+def connect(data_dir='.'):
+    """Connection to the star-schema database, building it on first use or after a change"""
+    path = database_path(data_dir)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        tmp_path.unlink(missing_ok=True)
+        build_database(tmp_path, data_dir)
+        for stale in path.parent.glob("star_schema-*.sqlite"):
+            stale.unlink()
+        os.replace(tmp_path, path)
+    return sqlite3.connect(path)
+
+
+def query(sql, params=None, data_dir='.'):
+    """Result of one ad-hoc SELECT as a DataFrame"""
+    connection = connect(data_dir)
+    try:
+        return pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+
+def run_script(path, data_dir='.'):
+    """Run a SQL file statement by statement, rolled back so the database is left unchanged"""
+    connection = connect(data_dir)
+    connection.isolation_level = None
+    try:
+        connection.execute("BEGIN")
+        return run_statements(connection, split_statements(Path(path).read_text()))
+    finally:
+        connection.execute("ROLLBACK")
+        connection.close()
+
+
+def timing_report(results):
+    """Per-statement timing table"""
+    rows = []
+    for number, result in enumerate(results, 1):
+        text = ' '.join(re.sub(r'--[^\n]*', '', result['statement']).split())
+        rows.append({
+            '#': number,
+            'Statement': text if len(text) <= 48 else f"{text[:45]}...",
+            'Rows': '' if result['rows'] is None else result['rows'],
+            'ms': round(result['seconds'] * 1000, 2),
+            'Status': f"error: {result['error']}" if result['error'] else
+                      f"skipped: no table {', '.join(result['skipped'])}" if result['skipped'] else 'ok',
+        })
+    return pd.DataFrame(rows).to_string(index=False)
+
+
+def main():
+    """Build the database and time the DDL, the example SQL files and star-schema queries"""
+    parser = argparse.ArgumentParser(description="Run SQL against the star-schema CSVs in SQLite")
+    parser.add_argument('files', nargs='*', help=f"SQL files to run (default: {', '.join(EXAMPLE_FILES)})")
+    parser.add_argument('--query', '-q', help="run one ad-hoc query and print its result")
+    args = parser.parse_args()
+
+    if args.query:
+        print(query(args.query).to_string(index=False))
+        return
+
+    print("Square Star-Schema SQL")
+    print("=" * 40)
+    path = database_path()
+    state = "cached" if path.exists() else "built"
+    started = time.perf_counter()
+    connection = connect()
+    try:
+        for name in TABLES:
+            count = connection.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+            print(f"✓ {name}: {count} rows")
+        ddl_log = connection.execute("SELECT statement, error, skipped, seconds FROM ddl_log").fetchall()
+    finally:
+        connection.close()
+    print(f"\nDatabase {path} ({state} in {time.perf_counter() - started:.2f} s)")
+
+    print(f"\n{DDL_FILE}")
+    print(timing_report([{'statement': statement, 'rows': None, 'error': error,
+                          'skipped': skipped.split(', ') if skipped else None, 'seconds': seconds}
+                         for statement, error, skipped, seconds in ddl_log]))
+    for sql_file in args.files or EXAMPLE_FILES:
+        print(f"\n{sql_file}")
+        print(timing_report(run_script(sql_file)))
+
+    connection = connect()
+    try:
+        print("\nStar-schema queries")
+        results = run_statements(connection, list(STAR_SCHEMA_EXAMPLES.values()))
+    finally:
+        connection.close()
+    for title, result in zip(STAR_SCHEMA_EXAMPLES, results):
+        print(f"  {title}: {result['rows']} rows, {result['seconds'] * 1000:.2f} ms")
+    print("\nNet sales by store")
+    print(query(STAR_SCHEMA_EXAMPLES['Net sales by store']).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
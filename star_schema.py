@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""
+Typed Star-Schema Loader for the Square OLAP Cube
+Knows the column types of every dim/fact/bridge CSV and keeps a memory-mapped
+column store (one .npy per column) so repeat runs skip CSV parsing entirely
+and each report only pages in the columns it reads
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR_NAME = '.cube_cache'
+NULL_KEY = -1
+# Bumped when the stored layout changes so existing column stores are rebuilt
+STORE_FORMAT = 3
+# CSV rows parsed at a time while building a column store
+BUILD_CHUNK_ROWS = 1_000_000
+# Bytes at each end of a CSV compared to tell an append from a rewrite
+EDGE_BYTES = 1 << 20
+# Earlier versions of a grown CSV remembered for extending their column stores
+STORE_HISTORY = 8
+
+# Column types:
+#   key       surrogate key, int32
+#   nkey      nullable surrogate key, int32 with NULL_KEY for blanks
+#   int       integer measure or attribute, int64 (Int64 with <NA> for blanks)
+#   money     fixed-point amount, int64 cents (NaN / <NA> for blanks)
+#   decimal   float64 (rates, percentages, hours)
+#   flag      TRUE/FALSE, bool
+#   category  low-cardinality string, int32 categorical codes
+#   text      free-form string
+#   date      YYYY-MM-DD, datetime64[D]
+#   timestamp YYYY-MM-DD HH:MM:SS, datetime64[s]
+SCHEMA = {
+    'dim_date': {
+        'date_sk': 'key', 'date_value': 'date', 'year_number': 'int',
+        'quarter_number': 'int', 'month_number': 'int', 'week_number': 'int',
+        'day_of_year': 'int', 'day_of_month': 'int', 'day_of_week': 'int',
+        'day_name': 'category', 'month_name': 'category', 'quarter_name': 'category',
+        'is_weekend': 'flag', 'is_holiday': 'flag', 'holiday_name': 'text',
+        'fiscal_year': 'int', 'fiscal_quarter': 'int', 'fiscal_month': 'int',
+        'business_day_flag': 'flag',
+    },
+    'dim_time': {
+        'time_sk': 'key', 'time_value': 'text', 'hour_24': 'int', 'hour_12': 'int',
+        'minute_number': 'int', 'second_number': 'int', 'am_pm': 'category',
+        'time_period': 'category', 'is_peak_hour': 'flag', 'is_business_hours': 'flag',
+    },
+    'dim_location': {
+        'location_sk': 'key', 'location_id': 'text', 'location_name': 'text',
+        'location_type': 'category', 'address_line1': 'text', 'city': 'category',
+        'state': 'category', 'postal_code': 'text', 'country': 'category',
+        'phone_number': 'text', 'manager_name': 'text', 'square_footage': 'int',
+        'seating_capacity': 'int', 'drive_thru_flag': 'flag', 'delivery_enabled': 'flag',
+        'pickup_enabled': 'flag', 'timezone': 'category', 'opening_time': 'text',
+        'closing_time': 'text', 'is_active': 'flag',
+    },
+    'dim_employee': {
+        'employee_sk': 'key', 'employee_id': 'text', 'first_name': 'text',
+        'last_name': 'text', 'full_name': 'text', 'email': 'text', 'phone_number': 'text',
+        'job_title': 'category', 'department': 'category', 'hire_date': 'date',
+        'employment_status': 'category', 'hourly_rate': 'money', 'pay_type': 'category',
+        'location_sk': 'key', 'manager_employee_sk': 'nkey', 'permission_level': 'category',
+        'can_process_refunds': 'flag', 'can_apply_discounts': 'flag',
+        'can_void_transactions': 'flag', 'is_active': 'flag',
+    },
+    'dim_customer': {
+        'customer_sk': 'key', 'customer_id': 'text', 'first_name': 'text',
+        'last_name': 'text', 'full_name': 'text', 'email': 'text', 'phone_number': 'text',
+        'date_of_birth': 'date', 'gender': 'category', 'city': 'category',
+        'state': 'category', 'postal_code': 'text', 'customer_segment': 'category',
+        'loyalty_tier': 'category', 'loyalty_points': 'int', 'total_lifetime_value': 'money',
+        'total_visits': 'int', 'first_visit_date': 'date', 'last_visit_date': 'date',
+        'average_order_value': 'money', 'preferred_location_sk': 'key',
+        'marketing_opt_in': 'flag', 'is_active': 'flag',
+    },
+    'dim_category': {
+        'category_sk': 'key', 'category_id': 'text', 'category_name': 'text',
+        'category_description': 'text', 'parent_category_sk': 'nkey',
+        'category_level': 'int', 'category_path': 'text', 'display_order': 'int',
+        'is_active': 'flag',
+    },
+    'dim_item': {
+        'item_sk': 'key', 'item_id': 'text', 'item_name': 'text', 'item_description': 'text',
+        'item_type': 'category', 'category_sk': 'key', 'subcategory': 'category',
+        'brand': 'category', 'sku': 'text', 'barcode': 'int', 'unit_of_measure': 'category',
+        'current_price': 'money', 'cost_per_unit': 'money', 'profit_margin_percent': 'decimal',
+        'is_taxable': 'flag', 'tax_rate': 'decimal', 'is_discountable': 'flag',
+        'is_modifiable': 'flag', 'preparation_time_minutes': 'int', 'calories': 'int',
+        'allergen_info': 'category', 'dietary_flags': 'category', 'is_active': 'flag',
+    },
+    'dim_payment_method': {
+        'payment_method_sk': 'key', 'payment_method_id': 'text',
+        'payment_method_name': 'text', 'payment_type': 'category', 'card_brand': 'category',
+        'processing_fee_rate': 'decimal', 'is_contactless': 'flag',
+        'is_online_capable': 'flag', 'is_active': 'flag',
+    },
+    'fact_sales_transaction': {
+        'transaction_sk': 'key', 'date_sk': 'key', 'time_sk': 'key', 'location_sk': 'key',
+        'employee_sk': 'key', 'customer_sk': 'nkey', 'item_sk': 'key',
+        'payment_method_sk': 'key', 'transaction_id': 'text', 'line_item_id': 'text',
+        'gross_sales_amount': 'money', 'net_sales_amount': 'money', 'item_quantity': 'int',
+        'unit_price': 'money', 'extended_price': 'money', 'discount_amount': 'money',
+        'comp_amount': 'money', 'modifier_amount': 'money', 'service_charge_amount': 'money',
+        'tax_amount': 'money', 'tip_amount': 'money', 'processing_fee_amount': 'money',
+        'return_amount': 'money', 'void_amount': 'money', 'is_refund': 'flag',
+        'is_void': 'flag', 'is_comp': 'flag', 'transaction_status': 'category',
+    },
+    'fact_item_sales': {
+        'item_sales_sk': 'key', 'transaction_sk': 'key', 'date_sk': 'key', 'time_sk': 'key',
+        'location_sk': 'key', 'item_sk': 'key', 'category_sk': 'key', 'employee_sk': 'key',
+        'transaction_id': 'text', 'item_id': 'text', 'quantity_sold': 'int',
+        'unit_price': 'money', 'extended_price': 'money', 'cost_per_unit': 'money',
+        'total_cost': 'money', 'modifier_count': 'int', 'modifier_amount': 'money',
+        'item_discount_amount': 'money', 'item_comp_amount': 'money', 'gross_profit': 'money',
+        'profit_margin_percent': 'decimal', 'is_returned': 'flag', 'is_voided': 'flag',
+        'is_comped': 'flag',
+    },
+    'fact_labor_cost': {
+        'labor_cost_sk': 'key', 'date_sk': 'key', 'employee_sk': 'key', 'location_sk': 'key',
+        'shift_sk': 'key', 'employee_id': 'text', 'shift_id': 'text',
+        'hours_worked': 'decimal', 'regular_hours': 'decimal', 'overtime_hours': 'decimal',
+        'break_hours': 'decimal', 'hourly_rate': 'money', 'regular_pay': 'money',
+        'overtime_pay': 'money', 'total_labor_cost': 'money', 'benefits_cost': 'money',
+        'payroll_tax_cost': 'money', 'total_loaded_cost': 'money',
+        'clock_in_time': 'timestamp', 'clock_out_time': 'timestamp',
+        'scheduled_start_time': 'timestamp', 'scheduled_end_time': 'timestamp',
+    },
+    'bridge_transaction_modifier': {
+        'transaction_sk': 'key', 'modifier_sk': 'key', 'modifier_quantity': 'int',
+        'modifier_amount': 'money',
+    },
+}
+
+TABLES = list(SCHEMA)
+
+
+def table_path(name, data_dir='.'):
+    """Path of the CSV extract backing a table"""
+    return Path(data_dir) / f"{name}.csv"
+
+
+def cache_dir(data_dir='.'):
+    """Directory holding the columnar cache (override with CUBE_CACHE_DIR)"""
+    return Path(os.environ.get('CUBE_CACHE_DIR', Path(data_dir) / CACHE_DIR_NAME))
+
+
+def edge_digest(file, size):
+    """Digest of the first and last EDGE_BYTES of a file's first size bytes"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    digest.update(file.read(min(size, EDGE_BYTES)))
+    tail = max(0, size - EDGE_BYTES)
+    file.seek(tail)
+    digest.update(file.read(size - tail))
+    return digest.hexdigest()
+
+
+def file_hash(path, data_dir='.'):
+    """Content identity of a CSV, memoized on (size, mtime) so unchanged files are not re-read.
+
+    A new file is identified by its SHA-256. A file that only grew since the
+    memoized stamp (same leading and trailing EDGE_BYTES up to the old size,
+    which ended a line) is identified by hashing the old identity with the
+    appended bytes, so an append reads only the new rows. The memo keeps the
+    (size, identity) history of such appends for extending column stores.
+    """
+    path = Path(path)
+    stat = path.stat()
+    index_path = cache_dir(data_dir) / 'hashes.json'
+    try:
+        index = json.loads(index_path.read_text())
+    except (FileNotFoundError, ValueError):
+        index = {}
+
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    entry = index.get(str(path.resolve()))
+    if entry and entry['stamp'] == stamp:
+        return entry['sha256']
+
+    digest = hashlib.sha256()
+    history = []
+    with open(path, 'rb') as file:
+        size = entry['stamp'][0] if entry else 0
+        if entry and 'edges' in entry and 0 < size < stat.st_size and edge_digest(file, size) == entry['edges']:
+            file.seek(size - 1)
+            if file.read(1) == b'\n':
+                digest.update(entry['sha256'].encode())
+                history = entry.get('history', [])[-(STORE_HISTORY - 1):] + [[size, entry['sha256']]]
+        if not history:
+            file.seek(0)
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+        edges = edge_digest(file, stat.st_size)
+
+    index[str(path.resolve())] = {'stamp': stamp, 'sha256': digest.hexdigest(), 'edges': edges,
+                                  'history': history}
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    # Parallel workers share the index: replace it whole so no reader sees a partial write
+    tmp_path = index_path.with_name(f"{index_path.name}.tmp{os.getpid()}")
+    tmp_path.write_text(json.dumps(index, indent=2))
+    os.replace(tmp_path, index_path)
+    return digest.hexdigest()
+
+
+def parse_column(values, kind):
+    """Convert a raw string column from the CSV into its typed storage arrays"""
+    blank = values.isna()
+    if kind in ('key', 'nkey'):
+        if kind == 'key' and blank.any():
+            raise ValueError(f"blank surrogate key in non-nullable column {values.name}")
+        return {'values': values.fillna(str(NULL_KEY)).astype(np.int32).to_numpy()}
+    if kind == 'int':
+        arrays = {'values': values.fillna('0').astype(np.int64).to_numpy()}
+        if blank.any():
+            arrays['nulls'] = blank.to_numpy()
+        return arrays
+    if kind == 'money':
+        dollars = values.fillna('0').astype(np.float64).to_numpy()
+        arrays = {'values': np.round(dollars * 100).astype(np.int64)}
+        if blank.any():
+            arrays['nulls'] = blank.to_numpy()
+        return arrays
+    if kind == 'decimal':
+        return {'values': values.astype(np.float64).to_numpy()}
+    if kind == 'flag':
+        return {'values': values.str.upper().eq('TRUE').to_numpy()}
+    if kind == 'category':
+        categorical = pd.Categorical(values)
+        return {'codes': categorical.codes.astype(np.int32),
+                'categories': np.asarray(categorical.categories, dtype=str)}
+    if kind == 'text':
+        return {'values': values.fillna('').to_numpy(dtype=str)}
+    if kind == 'date':
+        return {'values': pd.to_datetime(values).to_numpy().astype('datetime64[D]')}
+    if kind == 'timestamp':
+        return {'values': pd.to_datetime(values).to_numpy().astype('datetime64[s]')}
+    raise ValueError(f"unknown column type: {kind}")
+
+
+def to_series(name, kind, arrays, fixed_point=False):
+    """Build a pandas Series from typed storage arrays"""
+    if kind == 'category':
+        return pd.Series(pd.Categorical.from_codes(arrays['codes'], arrays['categories']), name=name)
+    values = arrays['values']
+    if 'nulls' in arrays:
+        nulls = np.asarray(arrays['nulls'])
+        if kind == 'money' and not fixed_point:
+            return pd.Series(np.where(nulls, np.nan, values / 100.0), name=name)
+        return pd.Series(pd.array(values, dtype='Int64'), name=name).mask(nulls)
+    if kind == 'nkey':
+        return pd.Series(pd.array(values, dtype='Int32'), name=name).mask(values == NULL_KEY)
+    if kind == 'money' and not fixed_point:
+        return pd.Series(values / 100.0, name=name)
+    if kind == 'text':
+        return pd.Series(values, name=name, dtype=object).replace('', None)
+    return pd.Series(values, name=name)
+
+
+def store_path(name, data_dir='.'):
+    """Column-store directory for the current contents of a table's CSV"""
+    digest = file_hash(table_path(name, data_dir), data_dir)
+    return cache_dir(data_dir) / f"{name}-{digest[:16]}-v{STORE_FORMAT}"
+
+
+def parse_chunks(name, spill, data_dir='.', offset=0, first=0):
+    """Parse a CSV in BUILD_CHUNK_ROWS chunks, saving each chunk's storage arrays to spill.
+
+    Parsing starts at byte offset (a line start past the header) and chunks
+    are numbered from first. Returns the number of chunks (counting from 0)
+    and the number of rows parsed.
+    """
+    schema = SCHEMA[name]
+    path = table_path(name, data_dir)
+    header = pd.read_csv(path, dtype=str, nrows=0).columns
+    missing = set(schema) - set(header)
+    if missing:
+        raise ValueError(f"{name}.csv is missing columns: {sorted(missing)}")
+    chunks, rows = first, 0
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        options = {'header': None, 'names': list(header)} if offset else {}
+        reader = pd.read_csv(file, dtype=str, keep_default_na=False, na_values=[''], usecols=list(schema),
+                             chunksize=BUILD_CHUNK_ROWS, **options) if file.peek(1) else []
+        for raw in reader:
+            for column, kind in schema.items():
+                for part, array in parse_column(raw[column], kind).items():
+                    np.save(spill / f"{chunks}.{column}.{part}.npy", array)
+            chunks += 1
+            rows += len(raw)
+    if chunks == 0:
+        empty = pd.DataFrame({column: pd.Series([], dtype=object, name=column) for column in schema})
+        for column, kind in schema.items():
+            for part, array in parse_column(empty[column], kind).items():
+                np.save(spill / f"0.{column}.{part}.npy", array)
+        chunks = 1
+    return chunks, rows
+
+
+def combine_chunks(column, kind, chunks, rows, spill, target):
+    """Copy one column's chunk arrays into preallocated .npy files under target.
+
+    Text widths are widened to the longest chunk, category codes remapped to
+    the sorted union of the chunks' categories, and a nulls file is written
+    only when some chunk had a blank.
+    """
+    def load(number, part):
+        file = spill / f"{number}.{column}.{part}.npy"
+        return np.load(file, mmap_mode='r') if file.exists() else None
+
+    if kind == 'category':
+        merged = np.array(sorted({value for number in range(chunks) for value in load(number, 'categories')}),
+                          dtype=str)
+        np.save(target / f"{column}.categories.npy", merged)
+        out = np.lib.format.open_memmap(target / f"{column}.codes.npy", mode='w+', dtype=np.int32, shape=(rows,))
+        first = 0
+        for number in range(chunks):
+            codes = load(number, 'codes')
+            remap = np.append(np.searchsorted(merged, load(number, 'categories')), -1).astype(np.int32)
+            out[first:first + len(codes)] = remap[codes]
+            first += len(codes)
+        out.flush()
+        return
+
+    parts = ['values'] + (['nulls'] if any(load(number, 'nulls') is not None for number in range(chunks)) else [])
+    for part in parts:
+        dtype = np.bool_ if part == 'nulls' else \
+            np.result_type(*[load(number, 'values').dtype for number in range(chunks)])
+        out = np.lib.format.open_memmap(target / f"{column}.{part}.npy", mode='w+', dtype=dtype, shape=(rows,))
+        first = 0
+        for number in range(chunks):
+            values = load(number, 'values')
+            chunk = load(number, part)
+            out[first:first + len(values)] = chunk if chunk is not None else False
+            first += len(values)
+        out.flush()
+
+
+def base_store(name, data_dir='.'):
+    """(byte size, store) of the newest built store of an earlier version the CSV grew from"""
+    index_path = cache_dir(data_dir) / 'hashes.json'
+    try:
+        entry = json.loads(index_path.read_text()).get(str(table_path(name, data_dir).resolve()), {})
+    except (FileNotFoundError, ValueError):
+        return None
+    for size, digest in reversed(entry.get('history', [])):
+        path = cache_dir(data_dir) / f"{name}-{digest[:16]}-v{STORE_FORMAT}"
+        if (path / 'meta.json').exists():
+            return size, path
+    return None
+
+
+def write_store(name, data_dir='.'):
+    """Build a table's column store: one .npy file per column part.
+
+    The CSV is parsed in chunks spilled to the tmp directory and each column
+    is then copied into a preallocated memory-mapped .npy, so a build needs
+    memory for one chunk, not the whole table. When the CSV only had rows
+    appended since an existing store was built, that store's files stand in
+    as the first chunk and only the appended bytes are parsed. The store's
+    lineage lists the earlier stores it extends with their row counts.
+    """
+    path = store_path(name, data_dir)
+    tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    tmp_path.mkdir(parents=True, exist_ok=True)
+    spill = tmp_path / 'chunks'
+    spill.mkdir(exist_ok=True)
+    lineage, offset, first, rows = [], 0, 0, 0
+    base = base_store(name, data_dir)
+    if base:
+        try:
+            offset, base_path = base
+            meta = json.loads((base_path / 'meta.json').read_text())
+            for stored in base_path.glob('*.npy'):
+                try:
+                    os.link(stored, spill / f"0.{stored.name}")
+                except OSError:
+                    shutil.copyfile(stored, spill / f"0.{stored.name}")
+            lineage = meta.get('lineage', [])[-(STORE_HISTORY - 1):] + [[base_path.name, meta['rows']]]
+            first, rows = 1, meta['rows']
+        except FileNotFoundError:
+            # A concurrent build replaced the base store; parse the whole CSV
+            shutil.rmtree(spill)
+            spill.mkdir()
+            offset = 0
+    chunks, parsed = parse_chunks(name, spill, data_dir, offset, first)
+    rows += parsed
+    for column, kind in SCHEMA[name].items():
+        combine_chunks(column, kind, chunks, rows, spill, tmp_path)
+    shutil.rmtree(spill)
+    (tmp_path / 'meta.json').write_text(json.dumps({'table': name, 'rows': rows, 'lineage': lineage}))
+
+    for stale in path.parent.glob(f"{name}-*"):
+        if stale == path or stale.name.startswith(f"{path.name}.tmp"):
+            continue
+        if stale.is_dir():
+            shutil.rmtree(stale, ignore_errors=True)
+        else:
+            stale.unlink()
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another process published the same store first; its files are identical
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def open_store(name, data_dir='.'):
+    """Column-store directory for a table, building it on first read"""
+    path = store_path(name, data_dir)
+    if not (path / 'meta.json').exists():
+        write_store(name, data_dir)
+    return path
+
+
+def store_meta(name, data_dir='.'):
+    """Column-store metadata of a table: {'table', 'rows', 'lineage'}"""
+    return json.loads((open_store(name, data_dir) / 'meta.json').read_text())
+
+
+def table_rows(name, data_dir='.'):
+    """Row count of a table, read from its column-store metadata"""
+    return store_meta(name, data_dir)['rows']
+
+
+def appended_rows(name, previous, data_dir='.'):
+    """Rows of a table's store carried over unchanged from the store named previous.
+
+    All rows when previous is the current store, the rows previous held when
+    the current store only appended to it, otherwise 0.
+    """
+    meta = store_meta(name, data_dir)
+    if previous == store_path(name, data_dir).name:
+        return meta['rows']
+    return dict(meta['lineage']).get(previous, 0)
+
+
+def open_columns(name, columns=None, data_dir='.'):
+    """Memory-map the storage arrays of the requested columns.
+
+    Only the files for the named columns are opened, and pages are faulted in
+    lazily and shared read-only between every process mapping the same store.
+    Category columns come back as {'codes', 'categories'}, int and money
+    columns with blanks as {'values', 'nulls'}, all others as the raw storage array
+    (money stays in int64 cents).
+    """
+    path = open_store(name, data_dir)
+    schema = SCHEMA[name]
+    mapped = {}
+    for column in columns or list(schema):
+        if schema[column] == 'category':
+            mapped[column] = {
+                'codes': np.load(path / f"{column}.codes.npy", mmap_mode='r'),
+                'categories': np.load(path / f"{column}.categories.npy"),
+            }
+        elif (path / f"{column}.nulls.npy").exists():
+            mapped[column] = {
+                'values': np.load(path / f"{column}.values.npy", mmap_mode='r'),
+                'nulls': np.load(path / f"{column}.nulls.npy", mmap_mode='r'),
+            }
+        else:
+            mapped[column] = np.load(path / f"{column}.values.npy", mmap_mode='r')
+    return mapped
+
+
+def slice_parts(mapped, rows):
+    """Storage parts of one mapped column restricted to rows (a slice or positions)"""
+    if not isinstance(mapped, dict):
+        return {'values': mapped[rows]}
+    return {part: array if part == 'categories' else array[rows] for part, array in mapped.items()}
+
+
+def load_table(name, columns=None, data_dir='.', fixed_point=False):
+    """Load a table as a typed DataFrame (money in dollars unless fixed_point=True)"""
+    schema = SCHEMA[name]
+    columns = columns or list(schema)
+    series = []
+    for column, mapped in open_columns(name, columns, data_dir).items():
+        parts = mapped if isinstance(mapped, dict) else {'values': mapped}
+        series.append(to_series(column, schema[column], parts, fixed_point))
+    return pd.concat(series, axis=1)
+
+
+def take_rows(name, positions, columns=None, data_dir='.', fixed_point=False):
+    """Gather specific rows by position from the column store without scanning"""
+    schema = SCHEMA[name]
+    positions = np.asarray(positions, dtype=np.int64)
+    series = []
+    for column, array in open_columns(name, columns, data_dir).items():
+        series.append(to_series(column, schema[column], slice_parts(array, positions), fixed_point))
+    return pd.concat(series, axis=1)
+
+
+def iter_chunks(name, chunk_size, columns=None, data_dir='.', fixed_point=False,
+                start=0, stop=None):
+    """Yield a table as typed DataFrames of at most chunk_size rows.
+
+    Chunks are indexed by their global row position. A built column store is
+    sliced through mmap; otherwise the CSV is streamed without building the
+    store, so memory stays bounded by chunk size either way. start/stop
+    restrict the scan to a row range and need a built store.
+    """
+    schema = SCHEMA[name]
+    columns = columns or list(schema)
+    path = store_path(name, data_dir)
+
+    if (path / 'meta.json').exists():
+        mapped = open_columns(name, columns, data_dir)
+        rows = table_rows(name, data_dir)
+        end = rows if stop is None else min(stop, rows)
+        for first in range(start, end, chunk_size):
+            last = min(first + chunk_size, end)
+            series = []
+            for column, array in mapped.items():
+                series.append(to_series(column, schema[column], slice_parts(array, slice(first, last)),
+                                        fixed_point))
+            chunk = pd.concat(series, axis=1)
+            chunk.index = pd.RangeIndex(first, last)
+            yield chunk
+        return
+
+    if start or stop is not None:
+        raise ValueError(f"row-range scans of {name} need a built column store")
+
+    reader = pd.read_csv(table_path(name, data_dir), dtype=str, keep_default_na=False,
+                         na_values=[''], usecols=columns, chunksize=chunk_size)
+    start = 0
+    for raw in reader:
+        chunk = pd.concat([to_series(column, schema[column], parse_column(raw[column], schema[column]),
+                                     fixed_point) for column in columns], axis=1)
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def to_records(df):
+    """Convert a DataFrame to a list of row dictionaries of Python values (blanks become None)"""
+    df = df.astype(object)
+    return df.where(df.notna(), None).to_dict('records')
+
+
+def load_records(name, columns=None, data_dir='.'):
+    """Load a table as a list of typed row dictionaries (blanks become None)"""
+    return to_records(load_table(name, columns, data_dir))
+
+
+def load_star_schema(tables=None, data_dir='.'):
+    """Load every table of the star schema into a dict of DataFrames"""
+    return {name: load_table(name, data_dir=data_dir) for name in (tables or TABLES)}
+
+
+def main():
+    """Warm the columnar cache for every table"""
+    print("Square Star-Schema Cache")
+    print("=" * 40)
+    for name in TABLES:
+        path = store_path(name)
+        state = "cached" if (path / 'meta.json').exists() else "built"
+        df = load_table(name)
+        print(f"✓ {name}: {len(df)} records, {len(df.columns)} columns ({state})")
+    print(f"\nCache directory: {cache_dir()}")
+
+
+if __name__ == "__main__":
+    main()
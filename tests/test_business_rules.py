@@ -0,0 +1,56 @@
+"""Regression tests for the rule compiler's expression allowlist"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from business_rules import compile_rules
+from olap_engine import compile_derived
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ESCAPES = [
+    "abs(net_sales_amount, out=__import__('os').system('echo PWNED'))",
+    "abs(*[__import__('os')])",
+    "__import__('os').system('echo PWNED')",
+    "net_sales_amount.__class__",
+    "[x for x in (1,)]",
+]
+
+
+def rule(check):
+    return {'name': 'escape', 'table': 'fact_sales_transaction', 'check': check, 'issue': 'escape'}
+
+
+@pytest.mark.parametrize('check', ESCAPES)
+def test_rule_escapes_are_rejected(check):
+    with pytest.raises(ValueError):
+        compile_rules('fact_sales_transaction', [rule(check)])
+
+
+@pytest.mark.parametrize('expression', [
+    "abs([Net Sales Amount], out=__import__('os'))",
+    "__import__('os')",
+    "[Net Sales Amount].__class__",
+])
+def test_measure_escapes_are_rejected(expression):
+    with pytest.raises(ValueError):
+        compile_derived(expression)
+
+
+def test_compiled_rules_have_no_builtins():
+    rule_set = compile_rules('fact_sales_transaction', [rule("net_sales_amount >= 0")])
+    assert rule_set['evaluate'].__globals__['__builtins__'] == {}
+
+
+def test_rules_file_cannot_run_commands(tmp_path):
+    marker = tmp_path / 'pwned'
+    rules = tmp_path / 'rules.json'
+    rules.write_text(json.dumps([rule(
+        f"abs(net_sales_amount, out=__import__('os').system('touch {marker}'))")]))
+    subprocess.run([sys.executable, 'validate_cube_data.py', '--rules', str(rules)], cwd=ROOT,
+                   capture_output=True, timeout=300)
+    assert not marker.exists()
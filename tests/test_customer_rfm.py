@@ -0,0 +1,51 @@
+"""The saved per-customer state must follow restated days"""
+
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from customer_rfm import refresh_state
+
+ROOT = Path(__file__).resolve().parent.parent
+TABLES = ['fact_sales_transaction', 'dim_customer', 'dim_date']
+
+
+def test_restated_folded_day_rebuilds_state(tmp_path):
+    for table in TABLES:
+        shutil.copy(ROOT / f"{table}.csv", tmp_path)
+    refresh_state(data_dir=tmp_path)
+
+    path = tmp_path / 'fact_sales_transaction.csv'
+    lines = pd.read_csv(path, dtype=str, keep_default_na=False)
+    restated = lines.index[(lines['date_sk'] == '20241201') & (lines['customer_sk'] != '') &
+                           (lines['is_void'] == 'FALSE')][0]
+    lines.loc[restated, 'net_sales_amount'] = '999.00'
+    lines.to_csv(path, index=False)
+
+    state, _, folded = refresh_state(data_dir=tmp_path)
+    full, _, _ = refresh_state(full=True, data_dir=tmp_path)
+    assert folded == len(lines)
+    np.testing.assert_array_equal(state['value'], full['value'])
+    assert refresh_state(data_dir=tmp_path)[2] == 0
+
+
+def test_appended_rows_fold_without_rereading(tmp_path):
+    for table in TABLES:
+        shutil.copy(ROOT / f"{table}.csv", tmp_path)
+    refresh_state(data_dir=tmp_path)
+
+    path = tmp_path / 'fact_sales_transaction.csv'
+    lines = pd.read_csv(path, dtype=str, keep_default_na=False)
+    later = lines.iloc[[0]].assign(transaction_sk='9999', transaction_id='TXN_9999', date_sk='20241231')
+    pd.concat([lines, later]).to_csv(path, index=False)
+    state, watermark, folded = refresh_state(data_dir=tmp_path)
+    full, _, _ = refresh_state(full=True, data_dir=tmp_path)
+    assert (folded, watermark) == (1, 20241231)
+    np.testing.assert_array_equal(state['visits'], full['visits'])
+
+    late = lines.iloc[[0]].assign(transaction_sk='9998', transaction_id='TXN_9998')
+    pd.concat([lines, later, late]).to_csv(path, index=False)
+    state, _, folded = refresh_state(data_dir=tmp_path)
+    assert folded == len(lines) + 2
@@ -0,0 +1,76 @@
+"""Incremental validation must match a full pass while rehashing only changed blocks"""
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import incremental_validation
+from incremental_validation import validate_incremental
+from star_schema import store_meta
+
+ROOT = Path(__file__).resolve().parent.parent
+TABLES = ['dim_category', 'dim_customer', 'dim_date', 'dim_employee', 'dim_item', 'dim_location',
+          'dim_payment_method', 'dim_time', 'fact_sales_transaction', 'fact_item_sales', 'fact_labor_cost',
+          'bridge_transaction_modifier']
+EDGE = 'fact_item_sales.transaction_sk->fact_sales_transaction.transaction_sk'
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    for table in TABLES:
+        shutil.copy(ROOT / f"{table}.csv", tmp_path)
+    monkeypatch.setattr(incremental_validation, 'BLOCK_ROWS', 4)
+    return tmp_path
+
+
+def append_row(data_dir, table, **values):
+    path = data_dir / f"{table}.csv"
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    row = frame.iloc[-1].copy()
+    for column, value in values.items():
+        row[column] = value
+    pd.concat([frame, row.to_frame().T]).to_csv(path, index=False)
+
+
+def orphans(fk_results, edge=EDGE):
+    return fk_results['fact_item_sales'][edge]['count']
+
+
+def test_unchanged_data_rehashes_nothing(data_dir, monkeypatch):
+    validate_incremental(data_dir=data_dir)
+    hashed = []
+    original = incremental_validation.block_sums
+    monkeypatch.setattr(incremental_validation, 'block_sums',
+                        lambda *args, **kwargs: hashed.append(args[:2]) or original(*args, **kwargs))
+    validate_incremental(data_dir=data_dir)
+    assert hashed == []
+
+    append_row(data_dir, 'fact_labor_cost', labor_cost_sk='9999')
+    validate_incremental(data_dir=data_dir)
+    rows = sum(1 for _ in open(data_dir / 'fact_labor_cost.csv')) - 1
+    assert hashed == [('fact_labor_cost', (rows - 1) // 4 * 4)]
+
+
+def test_late_parent_on_new_date_clears_stored_orphan(data_dir):
+    append_row(data_dir, 'fact_item_sales', item_sales_sk='9999', transaction_sk='9999')
+    assert orphans(validate_incremental(data_dir=data_dir)[0]) == 1
+
+    append_row(data_dir, 'fact_sales_transaction', transaction_sk='9999', date_sk='20241231')
+    assert orphans(validate_incremental(data_dir=data_dir)[0]) == 0
+
+
+def test_append_digests_only_blocks_past_previous_rows(data_dir, monkeypatch):
+    validate_incremental(data_dir=data_dir)
+    digested = []
+    original = incremental_validation.block_digests
+    monkeypatch.setattr(incremental_validation, 'block_digests',
+                        lambda table, dates, numbers, data_dir: digested.append((table, list(numbers))) or
+                        original(table, dates, numbers, data_dir))
+
+    append_row(data_dir, 'fact_labor_cost', labor_cost_sk='9999')
+    validate_incremental(data_dir=data_dir)
+    rows = sum(1 for _ in open(data_dir / 'fact_labor_cost.csv')) - 1
+    assert digested == [('fact_labor_cost', [(rows - 1) // 4])]
+    assert store_meta('fact_labor_cost', data_dir)['lineage'][-1][1] == rows - 1
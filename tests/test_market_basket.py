@@ -0,0 +1,49 @@
+"""Basket chunking must not depend on the chunk size or split a transaction"""
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from market_basket import count_baskets, item_pairs, modifier_attachments
+
+ROOT = Path(__file__).resolve().parent.parent
+TABLES = ['fact_sales_transaction', 'bridge_transaction_modifier', 'dim_item']
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for table in TABLES:
+        shutil.copy(ROOT / f"{table}.csv", tmp_path)
+    return tmp_path
+
+
+def test_results_do_not_depend_on_chunk_size(data_dir):
+    results = []
+    for chunk_size in (1, 7, 1000):
+        counts = count_baskets(chunk_size, data_dir)
+        results.append((item_pairs(counts, 0.0), modifier_attachments(counts)))
+    for pairs, attached in results[1:]:
+        pd.testing.assert_frame_equal(pairs, results[0][0])
+        pd.testing.assert_frame_equal(attached, results[0][1])
+
+
+def test_non_contiguous_transaction_is_rejected(data_dir):
+    path = data_dir / 'fact_sales_transaction.csv'
+    lines = pd.read_csv(path, dtype=str, keep_default_na=False)
+    # A stray line of the first transaction after the second one's lines
+    stray = lines.iloc[[0]].assign(transaction_sk='9999')
+    pd.concat([lines.iloc[:4], stray, lines.iloc[4:]]).to_csv(path, index=False)
+    for chunk_size in (3, 5, 1000):
+        with pytest.raises(ValueError, match='not contiguous'):
+            count_baskets(chunk_size, data_dir)
+
+
+def test_modifier_lines_are_not_basket_items(data_dir):
+    items = pd.read_csv(data_dir / 'dim_item.csv')
+    modifiers = set(items.loc[items['item_type'] == 'MODIFIER', 'item_sk'])
+    counts = count_baskets(1000, data_dir)
+    assert modifiers.isdisjoint(counts.items)
+    assert all(modifiers.isdisjoint(pattern) for pattern in counts.patterns)
+    assert counts.modifiers
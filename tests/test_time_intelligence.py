@@ -0,0 +1,51 @@
+"""Period boundaries of the time-intelligence calendar"""
+
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from time_intelligence import TimeIntelligence, calendar
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def write_dim_date(data_dir, first, last):
+    """dim_date.csv for every day from first to last, shaped like the shipped one"""
+    template = pd.read_csv(ROOT / 'dim_date.csv', dtype=str, keep_default_na=False)
+    days = pd.date_range(first, last, freq='D')
+    frame = pd.DataFrame({column: template[column].iloc[0] for column in template.columns}, index=range(len(days)))
+    frame['date_sk'] = days.strftime('%Y%m%d')
+    frame['date_value'] = days.strftime('%Y-%m-%d')
+    frame['year_number'] = frame['fiscal_year'] = days.year.astype(str)
+    frame['month_number'] = frame['fiscal_month'] = days.month.astype(str)
+    frame['week_number'] = days.strftime('%W')
+    shutil.rmtree(data_dir, ignore_errors=True)
+    data_dir.mkdir()
+    frame.to_csv(data_dir / 'dim_date.csv', index=False)
+
+
+def intelligence(days, starts, opens, net_sales):
+    """TimeIntelligence over one all-members cell of daily net sales in cents"""
+    prefix = np.broadcast_to(np.concatenate([[0], np.cumsum(net_sales)]), (2, 2, len(net_sales) + 1))
+    return TimeIntelligence({'days': days.to_numpy(), 'starts': starts, 'opens': opens, 'last_year': None,
+                             'prefix': {'Net Sales Amount': prefix}, 'locations': [], 'categories': []})
+
+
+def test_week_spanning_new_year_is_one_period(tmp_path):
+    write_dim_date(tmp_path / 'data', '2024-12-23', '2025-01-12')
+    days, starts, opens, _ = calendar(tmp_path / 'data')
+    week = starts['week']
+    assert days[week[days.get_loc('2025-01-02')]] == pd.Timestamp('2024-12-30')
+    assert opens['week']
+
+
+@pytest.mark.parametrize('first, expected', [('2024-12-01', np.nan), ('2024-11-25', 7.0)])
+def test_previous_week_cut_by_axis_start_is_nan(tmp_path, first, expected):
+    write_dim_date(tmp_path / 'data', first, '2024-12-15')
+    days, starts, opens, _ = calendar(tmp_path / 'data')
+    ti = intelligence(days, starts, opens, np.full(len(days), 100))
+    previous = ti.previous_period('Net Sales Amount', '2024-12-08', 'week')
+    assert previous == pytest.approx(expected, nan_ok=True)
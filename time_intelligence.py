@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Time Intelligence for the Square OLAP Cube
+Builds cumulative daily arrays of the additive sales measures per store and
+product category over a contiguous calendar from dim_date, so year-to-date,
+rolling windows, previous period, same period last year and growth are
+constant-time differences of two prefix sums (calendar or fiscal periods)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dimension_store import dimension
+from olap_engine import BASE_MEASURES, level_codes, level_members, measure_inputs
+from star_schema import SCHEMA, cache_dir, load_table, store_path
+
+LOCATION_LEVEL = 'Location.Store'
+CATEGORY_LEVEL = 'Product.Category'
+
+# Additive measures of facts that carry a date, store and item
+TIME_MEASURES = [name for name, measure in BASE_MEASURES.items()
+                 if measure.aggregate in ('sum', 'count') and not measure.where
+                 and {'date_sk', 'location_sk', 'item_sk'} <= set(SCHEMA[measure.fact])]
+
+# Period kinds: a pandas period frequency for calendar periods, derived from
+# the date itself (weeks run Monday to Sunday, so one spanning Dec 31 / Jan 1
+# stays whole), or the dim_date columns whose combined value identifies a
+# fiscal period
+PERIODS = {
+    'week': 'W-SUN',
+    'month': 'M',
+    'quarter': 'Q',
+    'year': 'Y',
+    'fiscal_month': ['fiscal_year', 'fiscal_month'],
+    'fiscal_quarter': ['fiscal_year', 'fiscal_quarter'],
+    'fiscal_year': ['fiscal_year'],
+}
+
+
+def calendar(data_dir='.'):
+    """Contiguous day axis spanning dim_date and each day's period start per kind.
+
+    Days missing from dim_date start a period of their own, so windows
+    never silently span an unknown stretch of the calendar. opens[kind]
+    tells whether the axis's first day is a real period boundary, which is
+    known only for calendar periods.
+    """
+    fiscal = sorted({column for columns in PERIODS.values() if isinstance(columns, list) for column in columns})
+    dates = load_table('dim_date', columns=['date_value'] + fiscal, data_dir=data_dir)
+    dates = dates.sort_values('date_value')
+    days = pd.date_range(dates['date_value'].min(), dates['date_value'].max(), freq='D')
+    axis = dates.set_index('date_value').reindex(days)
+    known = days.isin(dates['date_value'])
+    starts, opens = {}, {}
+    for kind, columns in PERIODS.items():
+        if isinstance(columns, str):
+            ids = pd.Series(days.to_period(columns).astype(str), index=days)
+            opens[kind] = bool(len(days) and known[0] and
+                               (days[0] - pd.Timedelta(days=1)).to_period(columns) != days[0].to_period(columns))
+        else:
+            ids = axis[columns].astype('Int64').astype(str).agg('-'.join, axis=1)
+            opens[kind] = False
+        ids = ids.where(known)
+        changed = (ids != ids.shift()).to_numpy() | ids.isna().to_numpy()
+        starts[kind] = np.maximum.accumulate(np.where(changed, np.arange(len(days)), 0))
+    last_year = days.get_indexer(days - pd.DateOffset(years=1))
+    return days, starts, opens, last_year
+
+
+def build_arrays(data_dir='.'):
+    """Prefix sums of every time measure over (store, category, day), integer cents for money.
+
+    Index len(labels) on the store and category axes holds rows whose
+    member is unresolved and len(labels) + 1 the total over all members.
+    """
+    days, starts, opens, last_year = calendar(data_dir)
+    dates = dimension('dim_date', data_dir)
+    members = {name: level_members(name, data_dir) for name in (LOCATION_LEVEL, CATEGORY_LEVEL)}
+    locations, categories = len(members[LOCATION_LEVEL][0]), len(members[CATEGORY_LEVEL][0])
+    shape = (locations + 2, categories + 2, len(days))
+
+    prefix = {}
+    by_fact = {}
+    for name in TIME_MEASURES:
+        by_fact.setdefault(BASE_MEASURES[name].fact, []).append(name)
+    for fact, names in by_fact.items():
+        frame = load_table(fact, columns=list(dict.fromkeys(
+            ['date_sk', 'location_sk', 'item_sk'] + [BASE_MEASURES[name].column for name in names])),
+            data_dir=data_dir, fixed_point=True)
+        day = days.get_indexer(pd.DatetimeIndex(dates.labels(frame['date_sk'], 'date_value')))
+        location = level_codes(LOCATION_LEVEL, frame, members, data_dir)
+        category = level_codes(CATEGORY_LEVEL, frame, members, data_dir)
+        keep = day >= 0
+        cell = ((np.where(location >= 0, location, locations) * shape[1] +
+                 np.where(category >= 0, category, categories)) * shape[2] + day)[keep]
+        values, _ = measure_inputs(fact, names, frame, data_dir)
+        for name in names:
+            daily = np.bincount(cell, weights=np.asarray(values[name], dtype=np.float64)[keep],
+                                minlength=int(np.prod(shape)))
+            cube = np.round(daily).astype(np.int64).reshape(shape)
+            cube[-1] = cube[:-1].sum(axis=0)
+            cube[:, -1] = cube[:, :-1].sum(axis=1)
+            prefix[name] = np.concatenate([np.zeros(shape[:2] + (1,), dtype=np.int64),
+                                           np.cumsum(cube, axis=2)], axis=2)
+    return {'days': days.to_numpy(), 'starts': starts, 'opens': opens, 'last_year': last_year, 'prefix': prefix,
+            'locations': members[LOCATION_LEVEL][0], 'categories': members[CATEGORY_LEVEL][0]}
+
+
+def arrays_path(data_dir='.'):
+    """Cache file of the prefix arrays for the current fact and dimension contents"""
+    tables = ['dim_date', 'dim_location', 'dim_item', 'dim_category'] + \
+        sorted({BASE_MEASURES[name].fact for name in TIME_MEASURES})
+    payload = json.dumps({'measures': TIME_MEASURES, 'periods': PERIODS,
+                          'stores': [store_path(table, data_dir).name for table in tables]}, sort_keys=True)
+    digest = hashlib.sha256(payload.encode()).hexdigest()[:16]
+    return cache_dir(data_dir) / f"time_intelligence-{digest}.pkl"
+
+
+class TimeIntelligence:
+    """Period-relative measure values as O(1) lookups into prefix-sum arrays.
+
+    Every method takes an as-of date and optional location / category
+    member labels (None = all members); values outside the calendar are NaN.
+    """
+
+    def __init__(self, arrays):
+        self.days = pd.DatetimeIndex(arrays['days'])
+        self.starts = arrays['starts']
+        self.opens = arrays['opens']
+        self.last_year = arrays['last_year']
+        self.prefix = arrays['prefix']
+        self.locations = list(arrays['locations'])
+        self.categories = list(arrays['categories'])
+
+    def cell(self, location=None, category=None):
+        """Store and category axis positions of a slice"""
+        row = len(self.locations) + 1 if location is None else self.locations.index(location)
+        column = len(self.categories) + 1 if category is None else self.categories.index(category)
+        return row, column
+
+    def day(self, date):
+        """Day index of a date on the calendar axis (-1 when outside it)"""
+        return int(self.days.get_indexer([pd.Timestamp(date)])[0])
+
+    def total(self, measure, start, stop, location=None, category=None):
+        """Measure summed over days [start, stop) of the calendar axis"""
+        if start < 0 or stop > len(self.days) or start > stop:
+            return np.nan
+        row, column = self.cell(location, category)
+        cents = self.prefix[measure][row, column, stop] - self.prefix[measure][row, column, start]
+        scale = 100.0 if self.money(measure) else 1
+        return cents / scale
+
+    @staticmethod
+    def money(measure):
+        base = BASE_MEASURES[measure]
+        return base.aggregate == 'sum' and SCHEMA[base.fact][base.column] == 'money'
+
+    def last_active(self, measure):
+        """Last calendar day on which the measure moved (the first day when it never did)"""
+        totals = self.prefix[measure][-1, -1]
+        moved = np.flatnonzero(np.diff(totals))
+        return self.days[moved[-1] if len(moved) else 0]
+
+    def to_date(self, measure, date, period='year', location=None, category=None):
+        """Period-to-date (YTD, QTD, MTD, fiscal YTD...) through the as-of date"""
+        day = self.day(date)
+        if day < 0:
+            return np.nan
+        return self.total(measure, int(self.starts[period][day]), day + 1, location, category)
+
+    def rolling(self, measure, date, days, location=None, category=None):
+        """Trailing window of days ending on the as-of date"""
+        day = self.day(date)
+        return np.nan if day < 0 else self.total(measure, day + 1 - days, day + 1, location, category)
+
+    def previous_period(self, measure, date, period='month', location=None, category=None):
+        """The previous period, through the same day offset as the as-of date.
+
+        NaN when that period is cut off by the start of the calendar axis or
+        is shorter than the days elapsed in the current one.
+        """
+        day = self.day(date)
+        if day < 0:
+            return np.nan
+        start = int(self.starts[period][day])
+        if start == 0:
+            return np.nan
+        previous = int(self.starts[period][start - 1])
+        elapsed = day - start + 1
+        if (previous == 0 and not self.opens[period]) or start - previous < elapsed:
+            return np.nan
+        return self.total(measure, previous, previous + elapsed, location, category)
+
+    def same_period_last_year(self, measure, date, period='month', location=None, category=None):
+        """Period-to-date for the same date one year earlier"""
+        day = self.day(date)
+        if day < 0 or self.last_year[day] < 0:
+            return np.nan
+        return self.to_date(measure, self.days[self.last_year[day]], period, location, category)
+
+    def growth(self, measure, date, period='month', location=None, category=None, year_over_year=False):
+        """Sales Growth %: period-to-date against the previous period (or last year)"""
+        current = self.to_date(measure, date, period, location, category)
+        compare = self.same_period_last_year if year_over_year else self.previous_period
+        previous = compare(measure, date, period, location, category)
+        if np.isnan(previous) or previous == 0:
+            return np.nan
+        return (current - previous) / previous * 100
+
+
+def time_intelligence(data_dir='.'):
+    """TimeIntelligence over the current data, building the prefix arrays on first use"""
+    path = arrays_path(data_dir)
+    if path.exists():
+        return TimeIntelligence(pd.read_pickle(path))
+    arrays = build_arrays(data_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for stale in path.parent.glob("time_intelligence-*.pkl"):
+        stale.unlink()
+    tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    pd.to_pickle(arrays, tmp_path)
+    os.replace(tmp_path, path)
+    return TimeIntelligence(arrays)
+
+
+def main():
+    """Comparison dashboard for one as-of day, overall and per store"""
+    parser = argparse.ArgumentParser(description="Period-over-period comparisons from prefix sums")
+    parser.add_argument('--as-of', help="as-of date (default: the last day with activity)")
+    parser.add_argument('--measure', default='Net Sales Amount', choices=TIME_MEASURES)
+    args = parser.parse_args()
+    intelligence = time_intelligence()
+    measure = args.measure
+    as_of = pd.Timestamp(args.as_of) if args.as_of else intelligence.last_active(measure)
+    print(f"Time Intelligence - {measure} as of {as_of:%Y-%m-%d}")
+    print("=" * 40)
+    rows = []
+    for location in [None] + intelligence.locations:
+        rows.append({
+            'Store': location or 'All Stores',
+            'WTD': intelligence.to_date(measure, as_of, 'week', location),
+            'Previous Week': intelligence.previous_period(measure, as_of, 'week', location),
+            'WTD Growth %': intelligence.growth(measure, as_of, 'week', location),
+            'MTD': intelligence.to_date(measure, as_of, 'month', location),
+            'Fiscal YTD': intelligence.to_date(measure, as_of, 'fiscal_year', location),
+            'Last 7 Days': intelligence.rolling(measure, as_of, 7, location),
+            'Same Period Last Year': intelligence.same_period_last_year(measure, as_of, 'month', location),
+        })
+    print(pd.DataFrame(rows).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Bounded Top-K Summaries for the Square OLAP Cube
+Space-Saving counters that keep the heaviest items of a stream (by count or
+by a weight such as revenue) in constant memory per group, with a per-item
+overestimation bound, and merge across chunks, partitions and workers
+"""
+
+import pandas as pd
+
+# Counters kept per summary; items beyond this many share the evicted counts,
+# so rankings are exact while a group has at most this many distinct items
+DEFAULT_CAPACITY = 64
+
+
+class SpaceSaving:
+    """Weighted Space-Saving summary: at most capacity (item, count, error) counters.
+
+    count(item) overestimates the true total by at most error(item), which
+    never exceeds the smallest tracked count; an item with a true total
+    above that minimum is always tracked.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counters = {}
+
+    def add(self, item, weight=1):
+        """Count one occurrence of item (weight > 0)"""
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [weight, 0]
+        else:
+            evicted, (floor, _) = min(self.counters.items(), key=lambda entry: entry[1][0])
+            del self.counters[evicted]
+            self.counters[item] = [floor + weight, floor]
+
+    def update(self, items, weights=None):
+        """Fold an array of items (and weights) in, pre-summed per item"""
+        items = pd.Series(items)
+        weights = pd.Series(1 if weights is None else weights, index=items.index)
+        totals = weights.groupby(items.to_numpy(), sort=False).sum()
+        for item, weight in totals.sort_values(ascending=False, kind='stable').items():
+            self.add(item, weight)
+
+    def floor(self):
+        """Count every untracked item may have (0 until the summary is full)"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def merge(self, other):
+        """Fold another summary in: missing items take the other side's floor as count and error"""
+        mine, theirs = self.floor(), other.floor()
+        merged = {}
+        for item in list(self.counters) + [item for item in other.counters if item not in self.counters]:
+            count, error = self.counters.get(item, (mine, mine))
+            other_count, other_error = other.counters.get(item, (theirs, theirs))
+            merged[item] = [count + other_count, error + other_error]
+        kept = sorted(merged.items(), key=lambda entry: entry[1][0], reverse=True)[:self.capacity]
+        kept_items = {item for item, _ in kept}
+        self.counters = {item: counter for item, counter in merged.items() if item in kept_items}
+        return self
+
+    def count(self, item):
+        """Estimated total of an item (an upper bound; the floor when untracked)"""
+        counter = self.counters.get(item)
+        return counter[0] if counter is not None else self.floor()
+
+    def error(self, item):
+        """Maximum overestimation of count(item)"""
+        counter = self.counters.get(item)
+        return counter[1] if counter is not None else self.floor()
+
+    def top(self, n):
+        """The n heaviest (item, count) pairs, ties in first-seen order"""
+        ranked = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [(item, count) for item, (count, _) in ranked[:n]]
+
+    def bounds(self, n):
+        """The n heaviest (item, lower, upper) triples: the true total lies in [count - error, count]"""
+        ranked = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [(item, count - error, count) for item, (count, error) in ranked[:n]]
+
+    def guaranteed(self, n):
+        """Whether top(n) is provably the true top n: each lower bound beats the next estimate"""
+        ranked = sorted(self.counters.values(), key=lambda counter: counter[0], reverse=True)
+        if len(ranked) <= n:
+            return self.floor() == 0
+        threshold = ranked[n][0]
+        return all(count - error >= threshold for count, error in ranked[:n])
+
+
+def grouped(keys, items, weights=None, capacity=DEFAULT_CAPACITY, summaries=None):
+    """Per-group summaries of a chunk: {group key: SpaceSaving}, merged into summaries if given"""
+    summaries = {} if summaries is None else summaries
+    frame = pd.DataFrame({'key': pd.Series(keys).to_numpy(), 'item': pd.Series(items).to_numpy(),
+                          'weight': 1 if weights is None else pd.Series(weights).to_numpy()})
+    totals = frame.groupby(['key', 'item'], sort=False)['weight'].sum()
+    for key, cell in totals.groupby(level='key', sort=False):
+        chunk = SpaceSaving(capacity)
+        for (_, item), weight in cell.sort_values(ascending=False, kind='stable').items():
+            chunk.add(item, weight)
+        if key in summaries:
+            summaries[key].merge(chunk)
+        else:
+            summaries[key] = chunk
+    return summaries
@@ -4,31 +4,50 @@ Square OLAP Cube Data Validation Script
 Validates relationships and data integrity across CSV files
 """
 
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
-def load_csv_files():
-    """Load all CSV files into pandas DataFrames"""
-    files = {
-        'dim_date': 'dim_date.csv',
-        'dim_time': 'dim_time.csv', 
-        'dim_location': 'dim_location.csv',
-        'dim_employee': 'dim_employee.csv',
-        'dim_customer': 'dim_customer.csv',
-        'dim_category': 'dim_category.csv',
-        'dim_item': 'dim_item.csv',
-        'dim_payment_method': 'dim_payment_method.csv',
-        'fact_sales_transaction': 'fact_sales_transaction.csv',
-        'fact_item_sales': 'fact_item_sales.csv',
-        'fact_labor_cost': 'fact_labor_cost.csv',
-        'bridge_transaction_modifier': 'bridge_transaction_modifier.csv'
-    }
-    
+from business_rules import (RULES, compile_rules, evaluate_chunk, load_rules, merge_tallies,
+                            prepare_lookups, rule_checks, rule_tables)
+from dimension_store import dimension
+from incremental_validation import validate_incremental
+from labor_validation import (SHIFT_CHECKS, SHIFT_COLUMNS, check_shift_overlaps,
+                              check_shift_overlaps_chunked)
+from reconciliation import reconcile, reconciliation_issues
+from referential_integrity import (FOREIGN_KEYS, check_tables, edge_issue, edge_name,
+                                   edge_ok_message, load_key_sets, merge_results, quarantine,
+                                   scan_table, table_columns)
+from star_schema import TABLES, iter_chunks, load_table, open_store, table_rows
+
+# Fact columns read by the sample analytics and shift checks; the foreign-key and rule columns
+# are added per table, and every other column stays on disk
+ANALYTICS_COLUMNS = {
+    'fact_sales_transaction': ['transaction_sk', 'location_sk', 'customer_sk', 'item_sk',
+                               'net_sales_amount', 'item_quantity'],
+    'bridge_transaction_modifier': ['transaction_sk', 'modifier_sk', 'modifier_amount'],
+    'fact_labor_cost': SHIFT_COLUMNS,
+}
+
+def validation_columns(name, rules):
+    """Columns of a fact or bridge table that validation reads, or None for all"""
+    if name not in FOREIGN_KEYS:
+        return None
+    columns = ANALYTICS_COLUMNS.get(name, []) + table_columns(name)
+    if name in rule_tables(rules):
+        columns += compile_rules(name, rules)['columns']
+    return list(dict.fromkeys(columns))
+
+def load_csv_files(rules=RULES):
+    """Load all CSV files into typed pandas DataFrames via the column store"""
     data = {}
-    for name, filename in files.items():
+    for name in TABLES:
+        filename = f"{name}.csv"
         try:
-            data[name] = pd.read_csv(filename)
+            data[name] = load_table(name, columns=validation_columns(name, rules))
             print(f"✓ Loaded {filename}: {len(data[name])} records")
         except FileNotFoundError:
             print(f"✗ File not found: {filename}")
@@ -36,149 +55,191 @@ def load_csv_files():
     
     return data
 
-def validate_referential_integrity(data):
-    """Validate foreign key relationships"""
-    print("\n=== Referential Integrity Validation ===")
-    
+FACT_TABLES = ['fact_sales_transaction', 'fact_item_sales', 'fact_labor_cost']
+BRIDGE_TABLES = ['bridge_transaction_modifier']
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+def report_checks(tally, checks):
+    """Print passing checks and return issue strings for failing ones"""
     issues = []
-    
-    # Check fact_sales_transaction relationships
-    fact_sales = data['fact_sales_transaction']
-    
-    # Date dimension
-    orphaned_dates = fact_sales[~fact_sales['date_sk'].isin(data['dim_date']['date_sk'])]
-    if len(orphaned_dates) > 0:
-        issues.append(f"Orphaned date_sk in fact_sales_transaction: {len(orphaned_dates)} records")
-    else:
-        print("✓ All date_sk values have valid references")
-    
-    # Time dimension
-    orphaned_times = fact_sales[~fact_sales['time_sk'].isin(data['dim_time']['time_sk'])]
-    if len(orphaned_times) > 0:
-        issues.append(f"Orphaned time_sk in fact_sales_transaction: {len(orphaned_times)} records")
-    else:
-        print("✓ All time_sk values have valid references")
-    
-    # Location dimension
-    orphaned_locations = fact_sales[~fact_sales['location_sk'].isin(data['dim_location']['location_sk'])]
-    if len(orphaned_locations) > 0:
-        issues.append(f"Orphaned location_sk in fact_sales_transaction: {len(orphaned_locations)} records")
-    else:
-        print("✓ All location_sk values have valid references")
-    
-    # Employee dimension
-    orphaned_employees = fact_sales[~fact_sales['employee_sk'].isin(data['dim_employee']['employee_sk'])]
-    if len(orphaned_employees) > 0:
-        issues.append(f"Orphaned employee_sk in fact_sales_transaction: {len(orphaned_employees)} records")
-    else:
-        print("✓ All employee_sk values have valid references")
-    
-    # Customer dimension (allowing nulls)
-    non_null_customers = fact_sales[fact_sales['customer_sk'].notna()]
-    orphaned_customers = non_null_customers[~non_null_customers['customer_sk'].isin(data['dim_customer']['customer_sk'])]
-    if len(orphaned_customers) > 0:
-        issues.append(f"Orphaned customer_sk in fact_sales_transaction: {len(orphaned_customers)} records")
-    else:
-        print("✓ All customer_sk values have valid references")
-    
-    # Item dimension
-    orphaned_items = fact_sales[~fact_sales['item_sk'].isin(data['dim_item']['item_sk'])]
-    if len(orphaned_items) > 0:
-        issues.append(f"Orphaned item_sk in fact_sales_transaction: {len(orphaned_items)} records")
-    else:
-        print("✓ All item_sk values have valid references")
-    
-    # Payment method dimension
-    orphaned_payments = fact_sales[~fact_sales['payment_method_sk'].isin(data['dim_payment_method']['payment_method_sk'])]
-    if len(orphaned_payments) > 0:
-        issues.append(f"Orphaned payment_method_sk in fact_sales_transaction: {len(orphaned_payments)} records")
-    else:
-        print("✓ All payment_method_sk values have valid references")
-    
+    for check, issue, ok_message in checks:
+        entry = tally.get(check, {'count': 0, 'samples': []})
+        if entry['count'] > 0:
+            samples = ", ".join(str(value) for value in entry['samples'])
+            issues.append(f"{issue}: {entry['count']} records (e.g. {samples})")
+        else:
+            print(f"✓ {ok_message}")
     return issues
 
-def validate_business_rules(data):
+def tally_foreign_keys(fk_results, tally):
+    """Fold referential-integrity engine results into the check tally"""
+    for edges in fk_results.values():
+        for edge, entry in edges.items():
+            tally[edge] = {'count': entry.get('count', len(entry['rows'])), 'samples': entry['samples']}
+
+def foreign_key_checks(tables):
+    """(check, issue, ok message) triples for every foreign-key edge of the tables"""
+    return [(edge_name(table, fk), edge_issue(table, fk), edge_ok_message(table, fk))
+            for table in tables for fk in FOREIGN_KEYS[table]]
+
+def validate_referential_integrity(fk_results):
+    """Validate foreign key relationships of the fact tables"""
+    print("\n=== Referential Integrity Validation ===")
+    
+    tally = {}
+    tally_foreign_keys(fk_results, tally)
+    return report_checks(tally, foreign_key_checks(FACT_TABLES))
+
+def validate_business_rules(data, rules=RULES):
     """Validate business logic and calculations"""
     print("\n=== Business Rules Validation ===")
     
-    issues = []
-    fact_sales = data['fact_sales_transaction']
-    
-    # Check for negative amounts (except refunds)
-    negative_sales = fact_sales[(fact_sales['net_sales_amount'] < 0) & (fact_sales['is_refund'] == False)]
-    if len(negative_sales) > 0:
-        issues.append(f"Negative sales amounts for non-refunds: {len(negative_sales)} records")
-    else:
-        print("✓ No invalid negative sales amounts")
-    
-    # Check quantity consistency
-    zero_quantity = fact_sales[fact_sales['item_quantity'] <= 0]
-    if len(zero_quantity) > 0:
-        issues.append(f"Zero or negative quantities: {len(zero_quantity)} records")
-    else:
-        print("✓ All quantities are positive")
-    
-    # Check extended price calculation
-    price_mismatch = fact_sales[
-        abs(fact_sales['extended_price'] - (fact_sales['unit_price'] * fact_sales['item_quantity'])) > 0.01
-    ]
-    if len(price_mismatch) > 0:
-        issues.append(f"Extended price calculation errors: {len(price_mismatch)} records")
-    else:
-        print("✓ Extended price calculations are correct")
-    
-    # Check tax calculations (approximate)
-    expected_tax = fact_sales['net_sales_amount'] * 0.0875  # 8.75% tax rate
-    tax_variance = abs(fact_sales['tax_amount'] - expected_tax)
-    high_variance = tax_variance > 0.10  # Allow 10 cent variance
-    if high_variance.sum() > 0:
-        issues.append(f"Tax calculation variances: {high_variance.sum()} records")
-    else:
-        print("✓ Tax calculations are within acceptable range")
-    
-    return issues
+    tally = {}
+    for table in rule_tables(rules):
+        rule_set = compile_rules(table, rules)
+        evaluate_chunk(rule_set, data[table], prepare_lookups(rule_set, data=data), tally)
+    return report_checks(tally, rule_checks(rules))
 
-def validate_modifier_relationships(data):
+def validate_modifier_relationships(fk_results):
     """Validate modifier bridge table relationships"""
     print("\n=== Modifier Relationship Validation ===")
     
-    issues = []
-    bridge = data['bridge_transaction_modifier']
-    fact_sales = data['fact_sales_transaction']
-    dim_item = data['dim_item']
-    
-    # Check transaction references
-    orphaned_transactions = bridge[~bridge['transaction_sk'].isin(fact_sales['transaction_sk'])]
-    if len(orphaned_transactions) > 0:
-        issues.append(f"Orphaned transaction_sk in bridge table: {len(orphaned_transactions)} records")
-    else:
-        print("✓ All bridge transaction references are valid")
-    
-    # Check modifier references
-    orphaned_modifiers = bridge[~bridge['modifier_sk'].isin(dim_item['item_sk'])]
-    if len(orphaned_modifiers) > 0:
-        issues.append(f"Orphaned modifier_sk in bridge table: {len(orphaned_modifiers)} records")
-    else:
-        print("✓ All bridge modifier references are valid")
-    
-    # Check that modifier_sk references are actually modifiers
-    modifier_items = dim_item[dim_item['item_type'] == 'MODIFIER']['item_sk']
-    non_modifier_refs = bridge[~bridge['modifier_sk'].isin(modifier_items)]
-    if len(non_modifier_refs) > 0:
-        issues.append(f"Non-modifier items referenced as modifiers: {len(non_modifier_refs)} records")
-    else:
-        print("✓ All modifier references point to actual modifier items")
-    
+    tally = {}
+    tally_foreign_keys(fk_results, tally)
+    return report_checks(tally, foreign_key_checks(BRIDGE_TABLES))
+
+def validate_labor_shifts(data=None, chunk_size=None):
+    """Flag employees clocked into overlapping shifts (in bounded memory when chunk_size is given)"""
+    print("\n=== Labor Shift Validation ===")
+    if chunk_size is not None:
+        return report_checks(check_shift_overlaps_chunked(chunk_size), SHIFT_CHECKS)
+    return report_checks(check_shift_overlaps(data), SHIFT_CHECKS)
+
+def with_business_rules(chunks, rule_set, tally):
+    """Pass chunks through unchanged while evaluating a compiled rule set on each"""
+    lookups = prepare_lookups(rule_set)
+    for chunk in chunks:
+        evaluate_chunk(rule_set, chunk, lookups, tally)
+        yield chunk
+
+def scan_range(table, rules, chunk_size, start=0, stop=None, key_sets=None):
+    """Run a table's foreign-key scan and business rules over one row range.
+
+    Returns the foreign-key results and the rule tally for that range.
+    """
+    key_sets = key_sets or load_key_sets([table])
+    columns = table_columns(table)
+    rule_set = compile_rules(table, rules) if table in rule_tables(rules) else None
+    if rule_set:
+        columns = list(dict.fromkeys(columns + rule_set['columns']))
+    
+    tally = {}
+    chunks = iter_chunks(table, chunk_size, columns=columns, start=start, stop=stop)
+    if rule_set:
+        chunks = with_business_rules(chunks, rule_set, tally)
+    return scan_table(table, chunks, key_sets), tally
+
+def report_results(fk_results, tally, rules, chunk_size=None):
+    """Print every check section and return the combined issue list"""
+    issues = validate_referential_integrity(fk_results)
+    print("\n=== Business Rules Validation ===")
+    issues.extend(report_checks(tally, rule_checks(rules)))
+    issues.extend(validate_modifier_relationships(fk_results))
+    issues.extend(validate_labor_shifts(chunk_size=chunk_size))
     return issues
 
+def validate_streaming(chunk_size=DEFAULT_CHUNK_SIZE, rules=RULES):
+    """Run every check with facts read in fixed-size chunks.
+
+    Dimension keys stay resident; each fact and bridge table is read exactly
+    once, one chunk at a time, with all of its foreign keys and business rules
+    evaluated on the same chunk. The only fact-sized state kept is the
+    transaction_sk key set that the bridge and item-sales edges resolve against.
+    Returns the issue list and the engine results (orphan row positions).
+    """
+    print(f"\n=== Streaming Validation (chunk size {chunk_size:,}) ===")
+    
+    tables = FACT_TABLES + BRIDGE_TABLES
+    key_sets = load_key_sets(tables)
+    tallies = []
+    fk_results = {}
+    
+    for table in tables:
+        fk_results[table], tally = scan_range(table, rules, chunk_size, key_sets=key_sets)
+        tallies.append(tally)
+        print(f"✓ Streamed {table}")
+    
+    return report_results(fk_results, merge_tallies(tallies), rules, chunk_size), fk_results
+
+def run_partition(task):
+    """Worker entry point: validate one row range of one table"""
+    table, rules, chunk_size, start, stop = task
+    fk_result, tally = scan_range(table, rules, chunk_size, start, stop)
+    return table, fk_result, tally
+
+def partition_tasks(tables, rules, chunk_size, workers):
+    """Split each table into at most `workers` contiguous row ranges"""
+    tasks = []
+    for table in tables:
+        rows = table_rows(table)
+        parts = max(1, min(workers, -(-rows // chunk_size)))
+        bounds = np.linspace(0, rows, parts + 1).astype(int)
+        tasks.extend((table, rules, chunk_size, int(start), int(stop))
+                     for start, stop in zip(bounds[:-1], bounds[1:]))
+    return tasks
+
+def validate_parallel(workers, chunk_size=DEFAULT_CHUNK_SIZE, rules=RULES):
+    """Fan the per-table check groups out to a process pool.
+
+    Column stores are built up front so every worker maps the same files and
+    shares their pages instead of receiving copies. Large tables are split
+    into row ranges; results are merged in task order, so the report is
+    identical to a sequential run regardless of completion order.
+    """
+    print(f"\n=== Parallel Validation ({workers} workers, chunk size {chunk_size:,}) ===")
+    
+    tables = FACT_TABLES + BRIDGE_TABLES
+    for name in TABLES:
+        open_store(name)
+    
+    tasks = partition_tasks(tables, rules, chunk_size, workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(run_partition, tasks))
+    
+    fk_results = {}
+    for table in tables:
+        parts = [fk_result for name, fk_result, _ in outcomes if name == table]
+        fk_results[table] = merge_results(parts)
+        print(f"✓ Validated {table} in {len(parts)} partition(s)")
+    tally = merge_tallies(tally for _, _, tally in outcomes)
+    
+    return report_results(fk_results, tally, rules), fk_results
+
+def validate_changed_partitions(chunk_size=DEFAULT_CHUNK_SIZE, rules=RULES):
+    """Validate only the date partitions that changed since the previous run.
+
+    Outcomes of untouched partitions are reused from the validation state in
+    the cache directory, so counts cover the whole history while orphan row
+    positions (and therefore --quarantine) cover the partitions rechecked now.
+    """
+    print(f"\n=== Incremental Validation (chunk size {chunk_size:,}) ===")
+    fk_results, tally = validate_incremental(rules, chunk_size)
+    return report_results(fk_results, tally, rules), fk_results
+
+def validate_reconciliation(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Check that the sales, item-sales and modifier facts agree with each other"""
+    print("\n=== Fact Reconciliation ===")
+    return reconciliation_issues(reconcile(chunk_size=chunk_size))
+
 def generate_sample_analytics(data):
     """Generate sample analytics to demonstrate cube capabilities"""
     print("\n=== Sample Analytics ===")
     
     fact_sales = data['fact_sales_transaction']
-    dim_item = data['dim_item']
-    dim_location = data['dim_location']
-    dim_customer = data['dim_customer']
+    dim_item = dimension('dim_item')
+    dim_location = dimension('dim_location')
+    dim_customer = dimension('dim_customer')
     bridge = data['bridge_transaction_modifier']
     
     # Top selling items
@@ -190,19 +251,20 @@ def generate_sample_analytics(data):
     
     top_items = item_sales.nlargest(5, 'net_sales_amount')
     print("\nTop 5 Items by Revenue:")
-    for item_sk, row in top_items.iterrows():
-        item_name = dim_item[dim_item['item_sk'] == item_sk]['item_name'].iloc[0]
+    item_names = dim_item.labels(top_items.index, 'item_name')
+    for item_name, (item_sk, row) in zip(item_names, top_items.iterrows()):
         print(f"  {item_name}: ${row['net_sales_amount']} ({row['item_quantity']} units)")
     
     # Sales by location
     location_sales = fact_sales.groupby('location_sk')['net_sales_amount'].sum().round(2)
     print("\nSales by Location:")
-    for location_sk, sales in location_sales.items():
-        location_name = dim_location[dim_location['location_sk'] == location_sk]['location_name'].iloc[0]
+    location_names = dim_location.labels(location_sales.index, 'location_name')
+    for location_name, sales in zip(location_names, location_sales):
         print(f"  {location_name}: ${sales}")
     
     # Customer segment analysis
-    customer_sales = fact_sales.merge(dim_customer, on='customer_sk', how='left')
+    customer_sales = fact_sales.assign(
+        customer_segment=dim_customer.labels(fact_sales['customer_sk'], 'customer_segment'))
     segment_analysis = customer_sales.groupby('customer_segment').agg({
         'net_sales_amount': ['sum', 'mean', 'count']
     }).round(2)
@@ -229,19 +291,70 @@ def generate_sample_analytics(data):
     
     top_modifiers = modifier_popularity.nlargest(3, 'transaction_sk')
     print("\nTop 3 Modifiers by Usage:")
-    for modifier_sk, row in top_modifiers.iterrows():
-        modifier_name = dim_item[dim_item['item_sk'] == modifier_sk]['item_name'].iloc[0]
+    modifier_names = dim_item.labels(top_modifiers.index, 'item_name')
+    for modifier_name, (modifier_sk, row) in zip(modifier_names, top_modifiers.iterrows()):
         usage_count = row['transaction_sk']
         total_revenue = row['modifier_amount']
         print(f"  {modifier_name}: {usage_count} uses, ${total_revenue} revenue")
 
+def print_summary(all_issues):
+    """Print the validation summary"""
+    print("\n=== Validation Summary ===")
+    if all_issues:
+        print(f"⚠️  Found {len(all_issues)} issues:")
+        for issue in all_issues:
+            print(f"  - {issue}")
+    else:
+        print("✅ All validations passed successfully!")
+
+def quarantine_orphans(fk_results, out_dir):
+    """Write orphaned rows to the quarantine directory, if one was requested"""
+    if not out_dir:
+        return
+    written = quarantine(fk_results, out_dir)
+    for table, count in written.items():
+        print(f"⚠️  Quarantined {count} {table} rows to {Path(out_dir) / (table + '.csv')}")
+
 def main():
     """Main validation function"""
+    parser = argparse.ArgumentParser(description="Validate the Square OLAP cube CSV extracts")
+    parser.add_argument('--stream', action='store_true',
+                        help="read fact and bridge tables in fixed-size chunks")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"rows per chunk in streaming mode (default {DEFAULT_CHUNK_SIZE:,})")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="validate tables in parallel with this many worker processes")
+    parser.add_argument('--incremental', action='store_true',
+                        help="validate only date partitions that are new or affected by changes")
+    parser.add_argument('--reconcile', action='store_true',
+                        help="also reconcile fact_sales_transaction, fact_item_sales and the modifier bridge")
+    parser.add_argument('--quarantine', metavar='DIR',
+                        help="write rows with orphaned foreign keys to DIR/<table>.csv")
+    parser.add_argument('--rules', metavar='FILE', action='append', default=[],
+                        help="JSON file of additional business rules (repeatable)")
+    args = parser.parse_args()
+    rules = RULES + [rule for path in args.rules for rule in load_rules(path)]
+    
     print("Square OLAP Cube Data Validation")
     print("=" * 40)
     
+    if args.stream or args.workers or args.incremental:
+        if args.incremental:
+            issues, fk_results = validate_changed_partitions(args.chunk_size, rules)
+        elif args.workers:
+            issues, fk_results = validate_parallel(args.workers, args.chunk_size, rules)
+        else:
+            issues, fk_results = validate_streaming(args.chunk_size, rules)
+        if args.reconcile:
+            issues.extend(validate_reconciliation(args.chunk_size))
+        print_summary(issues)
+        quarantine_orphans(fk_results, args.quarantine)
+        print("\n=== Validation Complete ===")
+        print("Sample analytics are skipped in streaming, parallel and incremental modes.")
+        return
+    
     # Load data
-    data = load_csv_files()
+    data = load_csv_files(rules)
     if data is None:
         print("Failed to load data files. Exiting.")
         return
@@ -249,18 +362,18 @@ def main():
     # Run validations
     all_issues = []
     
-    all_issues.extend(validate_referential_integrity(data))
-    all_issues.extend(validate_business_rules(data))
-    all_issues.extend(validate_modifier_relationships(data))
+    fk_results = check_tables(FACT_TABLES + BRIDGE_TABLES, data=data)
+    
+    all_issues.extend(validate_referential_integrity(fk_results))
+    all_issues.extend(validate_business_rules(data, rules))
+    all_issues.extend(validate_modifier_relationships(fk_results))
+    all_issues.extend(validate_labor_shifts(data))
+    if args.reconcile:
+        all_issues.extend(validate_reconciliation(args.chunk_size))
     
     # Summary
-    print("\n=== Validation Summary ===")
-    if all_issues:
-        print(f"⚠️  Found {len(all_issues)} issues:")
-        for issue in all_issues:
-            print(f"  - {issue}")
-    else:
-        print("✅ All validations passed successfully!")
+    print_summary(all_issues)
+    quarantine_orphans(fk_results, args.quarantine)
     
     # Generate sample analytics
     generate_sample_analytics(data)